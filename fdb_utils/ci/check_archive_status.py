@@ -1,15 +1,25 @@
 import argparse
 import datetime as dt
 import logging
+import os
+import re
 import sys
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from enum import IntEnum
+from pathlib import Path
+from time import sleep
 
 import matplotlib.pyplot as plt
 from matplotlib.axes import Axes
 from matplotlib.colors import ListedColormap
 from matplotlib.figure import Figure
 
+from fdb_utils.fanout import fan_out
+from fdb_utils.grib_utils import is_complete_grib_file
+from fdb_utils.user.catalogue import TocCatalogue
+from fdb_utils.user.completeness import compress_ranges
 from fdb_utils.user.describe import list_all_values
 
 
@@ -87,49 +97,116 @@ def last_run_time(collection: Collection, from_time: dt.datetime) -> dt.datetime
     return dt.datetime.fromtimestamp(last_run_ts, tz=dt.timezone.utc)
 
 
-def get_param_status(
-    model: str, param: Parameter, date: str, time: str
-) -> list[list[int]]:
-    """Query FDB to determine the archival status for the parameter from the forecast at the provided time.
+def current_run_time(collection: Collection, from_time: dt.datetime) -> dt.datetime:
+    """Return the start time of the most recent run, without waiting for the expected archival delay."""
+    return last_run_time(collection, from_time + collection.delay)
 
-    Returns a 2d array with dimensions [member, step] containing 1 if the data is present and a 0 if not.
-    """
+
+def empty_param_status(model: str, param: Parameter) -> list[list[int]]:
+    """Return a [member, step] status for the parameter with all data marked as missing."""
     num_members = COLLECTIONS[model].members
     # Constant params are only defined on step 0, all others are defined for all steps.
     if param.is_constant:
         num_steps = 1
     else:
         num_steps = COLLECTIONS[model].steps
-    filter_values = {"param": param.id, "model": model, "date": date, "time": time}
-
-    status = []
-    for member in range(num_members):
-        param_filter = filter_values
-        param_filter["number"] = str(member)
-        param_filter |= param.field_filter
-        steps_present: set[str | int] = list_all_values(*["step"], **param_filter).get(
-            "step", set()
-        )
-        steps_status = [1 if str(s) in steps_present else 0 for s in range(num_steps)]
-        status.append(steps_status)
+    return [[0] * num_steps for _ in range(num_members)]
+
+
+def update_param_status(
+    model: str,
+    param: Parameter,
+    date: str,
+    time: str,
+    status: list[list[int]],
+    catalogue: TocCatalogue | None = None,
+) -> None:
+    """Query FDB for the cells of the [member, step] status which are still missing and mark those found as present.
+
+    Members which are complete are not queried again and the request of the others is narrowed to the missing steps.
+    """
+    filter_values: dict[str, str | list[str]] = {"param": param.id, "model": model, "date": date, "time": time}
+    filter_values |= param.field_filter
+
+    for member, steps_status in enumerate(status):
+        missing_steps = [s for s, success in enumerate(steps_status) if not success]
+        if not missing_steps:
+            continue
+        param_filter = filter_values | {"number": str(member)}
+        if len(missing_steps) < len(steps_status):
+            param_filter["step"] = [str(s) for s in missing_steps]
+        steps_present: set[str | int | float] = list_all_values(
+            *["step"], catalogue=catalogue, workers=1, **param_filter
+        ).get("step", set())
+        for s in missing_steps:
+            if str(s) in steps_present:
+                steps_status[s] = 1
+
 
+def get_param_status(
+    model: str, param: Parameter, date: str, time: str, catalogue: TocCatalogue | None = None
+) -> list[list[int]]:
+    """Query FDB to determine the archival status for the parameter from the forecast at the provided time.
+
+    Returns a 2d array with dimensions [member, step] containing 1 if the data is present and a 0 if not.
+    """
+    status = empty_param_status(model, param)
+    update_param_status(model, param, date, time, status, catalogue)
     return status
 
 
-def get_archive_status(
-    model: str, forecast_time: dt.datetime
-) -> dict[str, list[list[int]]]:
-    """Check if each file of the forecast has been archived."""
+def update_archive_status(
+    model: str,
+    forecast_time: dt.datetime,
+    archive_status: dict[str, list[list[int]]],
+    catalogue: TocCatalogue | None = None,
+) -> None:
+    """Check if the files of the forecast which were missing in the archive status have been archived since."""
     date_str = forecast_time.strftime("%Y%m%d")
     time_str = forecast_time.strftime("%H00")
 
-    archive_status = {}
     for p in PARAMS:
-        param_status = get_param_status(model, p, date_str, time_str)
-        archive_status[p.file_suffix] = param_status
+        update_param_status(model, p, date_str, time_str, archive_status[p.file_suffix], catalogue)
+
+
+def get_archive_status(
+    model: str, forecast_time: dt.datetime, catalogue: TocCatalogue | None = None
+) -> dict[str, list[list[int]]]:
+    """Check if each file of the forecast has been archived."""
+    archive_status = {p.file_suffix: empty_param_status(model, p) for p in PARAMS}
+    update_archive_status(model, forecast_time, archive_status, catalogue)
     return archive_status
 
 
+def get_archive_statuses(
+    model: str, forecast_times: list[dt.datetime], catalogue: TocCatalogue | None = None
+) -> list[dict[str, list[list[int]]]]:
+    return [get_archive_status(model, forecast_time, catalogue) for forecast_time in forecast_times]
+
+
+def merge_archive_status(
+    archive_statuses: Iterable[dict[str, list[list[int]]]]
+) -> dict[str, list[list[int]]]:
+    """Merge the archive status of a forecast in several FDBs, a file is archived if it is in any of them."""
+    merged: dict[str, list[list[int]]] = {}
+    for archive_status in archive_statuses:
+        for file_suffix, param_status in archive_status.items():
+            if file_suffix not in merged:
+                merged[file_suffix] = [list(steps_status) for steps_status in param_status]
+                continue
+            for merged_steps, steps_status in zip(merged[file_suffix], param_status):
+                merged_steps[:] = map(max, merged_steps, steps_status)
+    return merged
+
+
+def get_archive_statuses_from_configs(
+    model: str, forecast_times: list[dt.datetime], configs: list[str]
+) -> list[dict[str, list[list[int]]]]:
+    """Check the archive status of each forecast across the FDBs of several config files, queried concurrently."""
+    per_config = fan_out(get_archive_statuses, configs, model, forecast_times).values()
+    return [merge_archive_status(statuses) for statuses in zip(*per_config)]
+
+
 def fx_filename(suffix: str, member: int, step: int) -> str:
     """Construct the ICON fxshare filename for the provided parameters."""
     filename_template = "_FXINP_lfrf{dd:02}{hh:02}000_{mmm:03}"
@@ -139,14 +216,164 @@ def fx_filename(suffix: str, member: int, step: int) -> str:
     return filename
 
 
+# Accept lead times with both 3 and 4 trailing digits of minutes and seconds.
+_FX_FILENAME_RE = re.compile(r"_FXINP_lfrf(?P<days>\d{2})(?P<hours>\d{2})\d{3,4}_(?P<member>\d{3})(?P<suffix>\w*)")
+
+
+def parse_fx_filename(filename: str) -> tuple[str, int, int] | None:
+    """Return the suffix, member and step of an ICON fxshare filename, the reverse of `fx_filename`."""
+    match = _FX_FILENAME_RE.fullmatch(filename)
+    if match is None:
+        return None
+    step = int(match["days"]) * 24 + int(match["hours"])
+    return match["suffix"], int(match["member"]), step
+
+
+def get_local_status(
+    model: str, fxshare_dir: Path | str, check_grib: bool = True, max_workers: int = 8
+) -> dict[str, list[list[int]]]:
+    """Build the [member, step] status of each file type from the files of a forecast in the poller's fxshare directory.
+
+    Without querying FDB, a file is marked as present if it exists and, with check_grib, if it holds complete GRIB
+    messages, which is checked from the message headers only.
+    """
+    local_status = {p.file_suffix: empty_param_status(model, p) for p in PARAMS}
+
+    candidates = []
+    with os.scandir(fxshare_dir) as it:
+        for entry in it:
+            parsed = parse_fx_filename(entry.name)
+            if parsed is None:
+                continue
+            file_suffix, member, step = parsed
+            param_status = local_status.get(file_suffix)
+            if param_status is None or member >= len(param_status) or step >= len(param_status[member]):
+                continue
+            candidates.append((entry.path, file_suffix, member, step))
+
+    if check_grib:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            complete = list(executor.map(is_complete_grib_file, [c[0] for c in candidates]))
+    else:
+        complete = [True] * len(candidates)
+
+    for (path, file_suffix, member, step), is_complete in zip(candidates, complete):
+        if is_complete:
+            local_status[file_suffix][member][step] = 1
+        else:
+            logging.warning("Incomplete GRIB file %s", path)
+
+    return local_status
+
+
+def format_ranges(ranges: list[tuple[int, int]]) -> str:
+    return ",".join(str(first) if first == last else f"{first}-{last}" for first, last in ranges)
+
+
+@dataclass
+class FailedFiles:
+    """Files of a single type failed to archive for the same steps of consecutive members."""
+
+    file_suffix: str
+    members: tuple[int, int]
+    steps: list[tuple[int, int]]
+
+    def __len__(self) -> int:
+        num_members = self.members[1] - self.members[0] + 1
+        return num_members * sum(last - first + 1 for first, last in self.steps)
+
+    def __str__(self) -> str:
+        return f"suffix '{self.file_suffix}' members {format_ranges([self.members])} steps {format_ranges(self.steps)}"
+
+    def filenames(self) -> Iterator[str]:
+        for member in range(self.members[0], self.members[1] + 1):
+            for first, last in self.steps:
+                for step in range(first, last + 1):
+                    yield fx_filename(self.file_suffix, member, step)
+
+
+@dataclass
+class FailureReport:
+    """Compact report of the missing cells of an archive status.
+
+    The missing steps of each member are encoded as ranges, and consecutive members with the same missing steps are
+    grouped together. Filenames are only generated when iterating over `filenames`.
+    """
+
+    failed: list[FailedFiles]
+
+    @classmethod
+    def from_status(cls, archive_status: dict[str, list[list[int]]]) -> "FailureReport":
+        failed: list[FailedFiles] = []
+        for file_suffix, param_status in archive_status.items():
+            for member, steps_status in enumerate(param_status):
+                steps = compress_ranges(s for s, success in enumerate(steps_status) if not success)
+                if not steps:
+                    continue
+                last = failed[-1] if failed else None
+                if last and last.file_suffix == file_suffix and last.members[1] == member - 1 and last.steps == steps:
+                    last.members = (last.members[0], member)
+                else:
+                    failed.append(FailedFiles(file_suffix, (member, member), steps))
+        return cls(failed)
+
+    def __len__(self) -> int:
+        return sum(len(f) for f in self.failed)
+
+    def __bool__(self) -> bool:
+        return bool(self.failed)
+
+    def __str__(self) -> str:
+        return "; ".join(str(f) for f in self.failed)
+
+    def filenames(self) -> Iterator[str]:
+        for failed_files in self.failed:
+            yield from failed_files.filenames()
+
+
+@dataclass
+class StatusDiff:
+    """Missing files of a forecast, split by whether they were never produced or were produced but not archived."""
+
+    upstream: FailureReport
+    archiving: FailureReport
+
+
+def diff_status(
+    local_status: dict[str, list[list[int]]], archive_status: dict[str, list[list[int]]]
+) -> StatusDiff:
+    """Compare the status of the files in the fxshare directory with the status of the files archived to FDB."""
+    # A file is only an archiving failure if it was produced.
+    archived_if_produced = {
+        file_suffix: [
+            [int(not produced or archived) for produced, archived in zip(local_steps, archived_steps)]
+            for local_steps, archived_steps in zip(param_status, archive_status[file_suffix])
+        ]
+        for file_suffix, param_status in local_status.items()
+    }
+    return StatusDiff(
+        upstream=FailureReport.from_status(local_status),
+        archiving=FailureReport.from_status(archived_if_produced),
+    )
+
+
 def get_failed_files(archive_status: dict[str, list[list[int]]]) -> list[str]:
-    failed_files = []
+    return list(FailureReport.from_status(archive_status).filenames())
+
+
+def get_overtaken_files(archive_status: dict[str, list[list[int]]]) -> list[str]:
+    """Return the missing files for which a later step of the same member and file type has been archived.
+
+    The steps of a member are produced and archived in order, so these files have failed rather than being pending.
+    """
+    overtaken_files = []
     for file_suffix, param_status in archive_status.items():
         for member, steps_status in enumerate(param_status):
-            for step, success in enumerate(steps_status):
-                if not success:
-                    failed_files.append(fx_filename(file_suffix, member, step))
-    return failed_files
+            last_archived = max((s for s, success in enumerate(steps_status) if success), default=-1)
+            for step in range(last_archived):
+                if not steps_status[step]:
+                    overtaken_files.append(fx_filename(file_suffix, member, step))
+    return overtaken_files
 
 
 class ForecastStatus(IntEnum):
@@ -170,18 +397,57 @@ def summary_status(archive_status: dict[str, list[list[int]]]) -> ForecastStatus
     return ForecastStatus.MISSING
 
 
+def watch_archive_status(
+    model: str,
+    forecast_time: dt.datetime,
+    deadline: dt.datetime,
+    poll_interval: dt.timedelta,
+    catalogue: TocCatalogue | None = None,
+) -> dict[str, list[list[int]]]:
+    """Poll FDB until the forecast is completely archived or the deadline has passed.
+
+    Each poll only queries the files which are still missing. Files which are certain to have failed are reported as
+    soon as they are detected.
+    """
+    archive_status = {p.file_suffix: empty_param_status(model, p) for p in PARAMS}
+    reported_files: set[str] = set()
+
+    while True:
+        update_archive_status(model, forecast_time, archive_status, catalogue)
+        if summary_status(archive_status) == ForecastStatus.COMPLETE:
+            break
+
+        failed_files = [f for f in get_overtaken_files(archive_status) if f not in reported_files]
+        if failed_files:
+            logging.warning("The following files failed to archive: %s", failed_files)
+            reported_files.update(failed_files)
+
+        if dt.datetime.now(dt.timezone.utc) + poll_interval > deadline:
+            break
+        sleep(poll_interval.total_seconds())
+
+    return archive_status
+
+
+def past_run_times(last_run_start: dt.datetime, collection: Collection) -> list[dt.datetime]:
+    """Return the start times of all past forecasts that should still exist, most recent first."""
+    return [last_run_start - i * collection.interval for i in range(1, collection.forecasts)]
+
+
 def historical_summary_status(
-    last_run_start: dt.datetime, collection: Collection
+    last_run_start: dt.datetime,
+    collection: Collection,
+    catalogue: TocCatalogue | None = None,
+    configs: list[str] | None = None,
 ) -> tuple[list[ForecastStatus], list[str]]:
     """Return the summary status for all past forecasts that should still exist."""
-    history_status = []
-    history_datetime = []
-    past_start = last_run_start
-    for _ in range(1, collection.forecasts):
-        past_start = past_start - collection.interval
-        past_status = get_archive_status(collection.model, past_start)
-        history_status.append(summary_status(past_status))
-        history_datetime.append(past_start.strftime("%y%m%d%H00"))
+    past_starts = past_run_times(last_run_start, collection)
+    if configs:
+        past_statuses = get_archive_statuses_from_configs(collection.model, past_starts, configs)
+    else:
+        past_statuses = get_archive_statuses(collection.model, past_starts, catalogue)
+    history_status = [summary_status(past_status) for past_status in past_statuses]
+    history_datetime = [past_start.strftime("%y%m%d%H00") for past_start in past_starts]
     return history_status, history_datetime
 
 
@@ -250,15 +516,46 @@ def create_figure(collection: Collection) -> tuple[Figure, list[Axes]]:
     )
 
 
-def main(model: str) -> bool:
+def main(
+    model: str,
+    watch: bool = False,
+    poll_interval: dt.timedelta = dt.timedelta(minutes=5),
+    deadline: dt.timedelta | None = None,
+    catalogue: TocCatalogue | None = None,
+    configs: list[str] | None = None,
+    fxshare_dir: Path | None = None,
+    preflight: bool = False,
+) -> bool:
     collection = COLLECTIONS[model]
-    last_run_start = last_run_time(collection, dt.datetime.now(dt.timezone.utc))
-    latest_archive_status = get_archive_status(model, last_run_start)
+    now = dt.datetime.now(dt.timezone.utc)
+
+    if preflight:
+        # Only check the files produced for the forecast, without querying FDB.
+        if fxshare_dir is None:
+            raise ValueError("The fxshare directory is required for a preflight check.")
+        missing_files = FailureReport.from_status(get_local_status(model, fxshare_dir))
+        if missing_files:
+            logging.warning("%d files missing from %s: %s", len(missing_files), fxshare_dir, missing_files)
+            return False
+        return True
+    if watch:
+        # Follow the most recent run from its start, by default until it is expected to be fully archived.
+        last_run_start = current_run_time(collection, now)
+        watch_deadline = last_run_start + (collection.delay if deadline is None else deadline)
+        latest_archive_status = watch_archive_status(
+            model, last_run_start, watch_deadline, poll_interval, catalogue
+        )
+    elif configs:
+        last_run_start = last_run_time(collection, now)
+        [latest_archive_status] = get_archive_statuses_from_configs(model, [last_run_start], configs)
+    else:
+        last_run_start = last_run_time(collection, now)
+        latest_archive_status = get_archive_status(model, last_run_start, catalogue)
 
     # For past forecasts, we have the full details already in previous runs. We only want to detect and alert if a
     # forecast is deleted early.
     history_status, history_datetime = historical_summary_status(
-        last_run_start, collection
+        last_run_start, collection, catalogue, configs
     )
     history_status.insert(0, summary_status(latest_archive_status))
     history_datetime.insert(0, last_run_start.strftime("%y%m%d%H00"))
@@ -282,9 +579,18 @@ def main(model: str) -> bool:
 
     # If any files in the latest forecast failed, print the names and return failure.
     if history_status[0] != ForecastStatus.COMPLETE:
+        if fxshare_dir is not None:
+            status_diff = diff_status(get_local_status(model, fxshare_dir), latest_archive_status)
+            logging.warning(
+                "%d files were not produced: %s", len(status_diff.upstream), status_diff.upstream
+            )
+            logging.warning(
+                "%d files failed to archive: %s", len(status_diff.archiving), status_diff.archiving
+            )
+            return False
+        failure_report = FailureReport.from_status(latest_archive_status)
         logging.warning(
-            "The following files failed to archive: %s",
-            get_failed_files(latest_archive_status),
+            "%d files failed to archive: %s", len(failure_report), failure_report
         )
         return False
 
@@ -308,7 +614,62 @@ if __name__ == "__main__":
     parser.add_argument(
         "model", type=str.lower, choices=["icon-ch1-eps", "icon-ch2-eps"]
     )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Poll the archive of the most recent run from its start until it is complete or the deadline passes.",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=int,
+        default=5,
+        help="Minutes to wait between two polls in watch mode.",
+    )
+    parser.add_argument(
+        "--deadline",
+        type=int,
+        default=None,
+        help="Minutes after the run start at which watch mode gives up. Defaults to the expected archival delay.",
+    )
+    parser.add_argument(
+        "--toc",
+        action="store_true",
+        help="Read the local FDB directly, only opening the databases of the forecasts checked.",
+    )
+    parser.add_argument(
+        "--config",
+        action="append",
+        default=[],
+        help="FDB config file to check, instead of the FDB of the environment. Repeat to check a forecast archived "
+        "across several FDBs, which are queried concurrently.",
+    )
+    parser.add_argument(
+        "--fxshare",
+        type=Path,
+        default=None,
+        help="fxshare directory of the poller for the run checked. Missing files are reported as not produced or "
+        "failed to archive by comparing with the files found there.",
+    )
+    parser.add_argument(
+        "--preflight",
+        action="store_true",
+        help="Only check that all files of the run are in the fxshare directory, without querying FDB.",
+    )
     args = parser.parse_args()
-
-    if not main(args.model):
+    if args.config and (args.watch or args.toc):
+        parser.error("--config cannot be combined with --watch or --toc")
+    if args.preflight and args.fxshare is None:
+        parser.error("--preflight requires --fxshare")
+
+    deadline_delta = None if args.deadline is None else dt.timedelta(minutes=args.deadline)
+    if not main(
+        args.model,
+        watch=args.watch,
+        poll_interval=dt.timedelta(minutes=args.poll_interval),
+        deadline=deadline_delta,
+        catalogue=TocCatalogue.from_config() if args.toc else None,
+        configs=args.config,
+        fxshare_dir=args.fxshare,
+        preflight=args.preflight,
+    ):
         sys.exit(1)
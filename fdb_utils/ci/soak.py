@@ -0,0 +1,433 @@
+"""
+Soak test of a local FDB, archiving and listing concurrently to measure how the operations slow each other down.
+
+The test runs in three phases of the same duration: the writers alone, the readers alone, and both together. Each
+writer archives the messages of a template GRIB file for its own member, cycling through the steps, while the readers
+list or describe the forecast being archived. The latency of each operation is recorded in histograms, and the
+number of operations and bytes over time, and regressions are flagged against the isolated phases and a previous
+report.
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import yaml
+
+from fdb_utils.env import fdb_schema_path
+
+_logger = logging.getLogger(__name__)
+
+# Upper bound of the first bucket of the latency histograms, each following bucket is twice as wide.
+MIN_LATENCY = 1e-4
+LATENCY_BUCKETS = 24
+
+PHASES = ("archive", "read", "mixed")
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Time given to the worker processes to start, import pyfdb and prepare their data before a phase starts.
+STARTUP_SECONDS = 5.0
+
+
+@dataclass
+class LatencyHistogram:
+    """Histogram of latencies in buckets growing by powers of two, the last bucket holding all larger latencies."""
+
+    counts: list[int] = field(default_factory=lambda: [0] * LATENCY_BUCKETS)
+    total: float = 0.0
+
+    @staticmethod
+    def bucket_bound(bucket: int) -> float:
+        """Return the upper bound of the bucket in seconds."""
+        return MIN_LATENCY * 2 ** bucket
+
+    def record(self, seconds: float) -> None:
+        bucket = 0
+        while bucket < LATENCY_BUCKETS - 1 and seconds > self.bucket_bound(bucket):
+            bucket += 1
+        self.counts[bucket] += 1
+        self.total += seconds
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.total += other.total
+
+    def __len__(self) -> int:
+        return sum(self.counts)
+
+    @property
+    def mean(self) -> float:
+        return self.total / len(self) if len(self) else 0.0
+
+    def quantile(self, q: float) -> float:
+        """Return the upper bound of the bucket holding the quantile, or 0 if nothing was recorded."""
+        rank = q * len(self)
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return self.bucket_bound(bucket)
+        return 0.0
+
+
+def _add_series(a: list[int], b: list[int]) -> list[int]:
+    """Add two series of counts per interval, the shorter being padded with zeros."""
+    if len(a) < len(b):
+        a, b = b, a
+    return [x + (b[i] if i < len(b) else 0) for i, x in enumerate(a)]
+
+
+@dataclass
+class OperationStats:
+    """Latencies of an operation, and the operations and bytes completed in each interval of a phase."""
+
+    latencies: LatencyHistogram = field(default_factory=LatencyHistogram)
+    operations: list[int] = field(default_factory=list)
+    bytes: list[int] = field(default_factory=list)
+    errors: int = 0
+
+    def record(self, interval: int, seconds: float, size: int = 0) -> None:
+        if interval >= len(self.operations):
+            self.operations += [0] * (interval + 1 - len(self.operations))
+            self.bytes += [0] * (interval + 1 - len(self.bytes))
+        self.latencies.record(seconds)
+        self.operations[interval] += 1
+        self.bytes[interval] += size
+
+    def merge(self, other: "OperationStats") -> None:
+        self.latencies.merge(other.latencies)
+        self.operations = _add_series(self.operations, other.operations)
+        self.bytes = _add_series(self.bytes, other.bytes)
+        self.errors += other.errors
+
+    def throughput(self, seconds: float) -> float:
+        """Operations per second over a phase of the given duration."""
+        return sum(self.operations) / seconds if seconds else 0.0
+
+    def summary(self, seconds: float) -> dict[str, float]:
+        summary = {f"p{round(q * 100)}": self.latencies.quantile(q) for q in QUANTILES}
+        summary |= {
+            "mean": self.latencies.mean,
+            "operations": len(self.latencies),
+            "errors": self.errors,
+            "ops_per_second": self.throughput(seconds),
+            "bytes_per_second": sum(self.bytes) / seconds if seconds else 0.0,
+        }
+        return summary
+
+
+@dataclass
+class SoakConfig:
+    template: Path
+    writers: int = 2
+    listers: int = 2
+    describers: int = 1
+    # Duration of each phase in seconds.
+    seconds: float = 60.0
+    # Length of the intervals the throughput is recorded in, in seconds.
+    interval: float = 1.0
+    steps: int = 33
+    date: str = "20240101"
+    time: str = "0000"
+
+
+def write_fdb_config(root: Path, schema: Path) -> Path:
+    """Write the config of a local FDB with the TOC engine on the root directory, as used in the tests."""
+    root.mkdir(parents=True, exist_ok=True)
+    config = {
+        "type": "local",
+        "engine": "toc",
+        "schema": str(schema),
+        "spaces": [{"handler": "Default", "roots": [{"path": str(root)}]}],
+    }
+    config_file = root.parent / f"{root.name}-config.yaml"
+    with open(config_file, "w", encoding="utf-8") as f:
+        yaml.dump(config, f, default_flow_style=False)
+    return config_file
+
+
+def _wait_until(start: float) -> None:
+    delay = start - time.time()
+    if delay > 0:
+        time.sleep(delay)
+
+
+def _run_until(
+    prepare: Callable[[int], Any],
+    execute: Callable[[Any], int],
+    start: float,
+    deadline: float,
+    interval: float,
+) -> OperationStats:
+    """
+    Run an operation from the start until the deadline, timing only its execution, not its preparation.
+
+    The preparation is given the iteration and returns the input of the execution, which returns the bytes handled.
+    """
+    stats = OperationStats()
+    _wait_until(start)
+    iteration = 0
+    while time.time() < deadline:
+        payload = prepare(iteration)
+        begin = time.time()
+        try:
+            size = execute(payload)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            _logger.error("Operation failed: %s", e)
+            stats.errors += 1
+        else:
+            end = time.time()
+            stats.record(int((end - start) / interval), end - begin, size)
+        iteration += 1
+    return stats
+
+
+def _write(writer: int, config: SoakConfig, start: float, deadline: float) -> OperationStats:
+    import eccodes
+    import pyfdb
+
+    fdb = pyfdb.FDB()
+
+    with open(config.template, "rb") as f:
+        templates = []
+        while (gid := eccodes.codes_grib_new_from_file(f)) is not None:
+            templates.append(gid)
+
+    def prepare(iteration: int) -> bytes:
+        # Each writer archives its own member, so that the writers archive to different databases.
+        data = []
+        for template in templates:
+            gid = eccodes.codes_clone(template)
+            eccodes.codes_set_key_vals(
+                gid,
+                f"dataDate={config.date},dataTime={config.time},number={writer + 1},step={iteration % config.steps}",
+            )
+            data.append(eccodes.codes_get_message(gid))
+            eccodes.codes_release(gid)
+        return b"".join(data)
+
+    def archive(message: bytes) -> int:
+        fdb.archive(message)
+        fdb.flush()
+        return len(message)
+
+    try:
+        return _run_until(prepare, archive, start, deadline, config.interval)
+    finally:
+        for template in templates:
+            eccodes.codes_release(template)
+
+
+def _read(kind: str, config: SoakConfig, start: float, deadline: float) -> OperationStats:
+    import pyfdb
+
+    from fdb_utils.user.describe import get_all_values
+
+    fdb = pyfdb.FDB()
+    request = {"date": config.date, "time": config.time}
+
+    def list_fields(_: None) -> int:
+        for _ in fdb.list(request, True, True):
+            pass
+        return 0
+
+    def describe(_: None) -> int:
+        get_all_values("number", "step", date=config.date, time=config.time)
+        return 0
+
+    return _run_until(lambda _: None, list_fields if kind == "list" else describe, start, deadline, config.interval)
+
+
+def run_phase(config: SoakConfig, writers: int, listers: int, describers: int) -> dict[str, OperationStats]:
+    """Run the writers and readers concurrently for the duration of a phase, returning the stats per operation."""
+
+    stats: dict[str, OperationStats] = {}
+    workers = writers + listers + describers
+    # Processes are spawned, not forked, as FDB handles must not be shared between processes.
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        start = time.time() + STARTUP_SECONDS
+        deadline = start + config.seconds
+        futures = [("archive", executor.submit(_write, i, config, start, deadline)) for i in range(writers)]
+        futures += [("list", executor.submit(_read, "list", config, start, deadline)) for _ in range(listers)]
+        futures += [
+            ("describe", executor.submit(_read, "describe", config, start, deadline)) for _ in range(describers)
+        ]
+        for operation, future in futures:
+            stats.setdefault(operation, OperationStats()).merge(future.result())
+    return stats
+
+
+def run_soak(config: SoakConfig) -> dict:
+    """Run the phases of the soak test against the FDB of the environment, returning the report."""
+
+    report: dict = {"config": {k: str(v) for k, v in config.__dict__.items()}, "phases": {}}
+    for phase in PHASES:
+        writers = config.writers if phase != "read" else 0
+        listers, describers = (config.listers, config.describers) if phase != "archive" else (0, 0)
+        _logger.info(
+            "Running phase %s for %.0fs with %d writers, %d listers and %d describers",
+            phase, config.seconds, writers, listers, describers,
+        )
+        stats = run_phase(config, writers, listers, describers)
+        report["phases"][phase] = {
+            operation: op_stats.summary(config.seconds) | {"operations_per_interval": op_stats.operations}
+            for operation, op_stats in stats.items()
+        }
+    return report
+
+
+def find_regressions(report: dict, baseline: dict | None = None, max_slowdown: float = 2.0) -> list[str]:
+    """
+    Return the regressions found in a soak report.
+
+    The 95th percentile latency of each operation when archiving and reading concurrently is compared with the phase
+    running the operation alone, and with the same phase of the baseline report if given, which also compares the
+    throughput. Latencies are only known up to the width of the histogram buckets, a factor of 2.
+    """
+
+    regressions = []
+    phases = report["phases"]
+    for phase, operations in phases.items():
+        for operation, summary in operations.items():
+            if summary["errors"]:
+                regressions.append(f"{summary['errors']} {operation} operations failed in phase {phase}")
+
+    isolated = {"archive": "archive", "list": "read", "describe": "read"}
+    for operation, summary in phases.get("mixed", {}).items():
+        alone = phases.get(isolated[operation], {}).get(operation)
+        if alone and alone["p95"] and summary["p95"] > max_slowdown * alone["p95"]:
+            regressions.append(
+                f"p95 latency of {operation} is {summary['p95']:.4f}s while archiving and reading concurrently, "
+                f"{summary['p95'] / alone['p95']:.0f} times the {alone['p95']:.4f}s in phase {isolated[operation]}"
+            )
+
+    for phase, operations in (baseline or {}).get("phases", {}).items():
+        for operation, previous in operations.items():
+            summary = phases.get(phase, {}).get(operation)
+            if summary is None:
+                continue
+            if previous["p95"] and summary["p95"] > max_slowdown * previous["p95"]:
+                regressions.append(
+                    f"p95 latency of {operation} in phase {phase} is {summary['p95']:.4f}s, "
+                    f"up from {previous['p95']:.4f}s in the baseline"
+                )
+            if summary["ops_per_second"] * max_slowdown < previous["ops_per_second"]:
+                regressions.append(
+                    f"Throughput of {operation} in phase {phase} is {summary['ops_per_second']:.1f} ops/s, "
+                    f"down from {previous['ops_per_second']:.1f} ops/s in the baseline"
+                )
+    return regressions
+
+
+def main(
+    config: SoakConfig,
+    schema: Path | None = None,
+    root: Path | None = None,
+    output: Path | None = None,
+    baseline: Path | None = None,
+    max_slowdown: float = 2.0,
+) -> bool:
+    schema = fdb_schema_path() if schema is None else schema
+    # The data of a previous run would be listed by the readers, and skew the comparison with its report.
+    if root is not None and (root / "fdb-root").is_dir() and any((root / "fdb-root").iterdir()):
+        raise ValueError(f"The FDB root {root / 'fdb-root'} of a previous run is not empty, remove it first.")
+
+    with tempfile.TemporaryDirectory(prefix="fdb-soak-") as tmp_dir:
+        # The workers inherit the environment, and with it the config of the FDB on the scratch root.
+        os.environ.pop("FDB5_CONFIG", None)
+        os.environ["FDB5_CONFIG_FILE"] = str(
+            write_fdb_config((Path(tmp_dir) if root is None else root) / "fdb-root", schema)
+        )
+        report = run_soak(config)
+
+    for phase, operations in report["phases"].items():
+        for operation, summary in operations.items():
+            _logger.info(
+                "%-8s %-8s p50 %.4fs p95 %.4fs p99 %.4fs %8.1f ops/s %8.1f MiB/s (%d ops, %d errors)",
+                phase, operation, summary["p50"], summary["p95"], summary["p99"], summary["ops_per_second"],
+                summary["bytes_per_second"] / 1024 ** 2, summary["operations"], summary["errors"],
+            )
+
+    if output is not None:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    previous = None
+    if baseline is not None:
+        with open(baseline, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+
+    regressions = find_regressions(report, previous, max_slowdown)
+    for regression in regressions:
+        _logger.warning("%s", regression)
+    return not regressions
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("template", type=Path, help="GRIB file archived by each writer, for its member and each step.")
+    parser.add_argument("--writers", type=int, default=2, help="Number of processes archiving concurrently.")
+    parser.add_argument("--listers", type=int, default=2, help="Number of processes listing the forecast.")
+    parser.add_argument(
+        "--describers", type=int, default=1, help="Number of processes listing the distinct values of the forecast."
+    )
+    parser.add_argument("--seconds", type=float, default=60.0, help="Duration of each phase in seconds.")
+    parser.add_argument(
+        "--interval", type=float, default=1.0, help="Length of the intervals the throughput is recorded in, in seconds."
+    )
+    parser.add_argument("--steps", type=int, default=33, help="Number of steps the writers cycle through.")
+    parser.add_argument(
+        "--schema",
+        type=Path,
+        default=None,
+        help="FDB schema to archive with. Defaults to the schema of the FDB of the environment.",
+    )
+    parser.add_argument(
+        "--root",
+        type=Path,
+        default=None,
+        help="Directory to create the FDB root in, eg. on the file system of the realtime FDB. Its fdb-root directory "
+        "is kept and must be removed before the next run. Defaults to a temporary directory, which is removed "
+        "afterwards.",
+    )
+    parser.add_argument("--output", type=Path, default=None, help="JSON file to write the report to.")
+    parser.add_argument(
+        "--baseline", type=Path, default=None, help="JSON report of a previous run to flag regressions against."
+    )
+    parser.add_argument(
+        "--max-slowdown",
+        type=float,
+        default=2.0,
+        help="Factor by which latencies may grow, and throughputs shrink, before they are flagged as regressions.",
+    )
+    args = parser.parse_args()
+
+    if not main(
+        SoakConfig(
+            template=args.template,
+            writers=args.writers,
+            listers=args.listers,
+            describers=args.describers,
+            seconds=args.seconds,
+            interval=args.interval,
+            steps=args.steps,
+        ),
+        schema=args.schema,
+        root=args.root,
+        output=args.output,
+        baseline=args.baseline,
+        max_slowdown=args.max_slowdown,
+    ):
+        sys.exit(1)
@@ -1,8 +1,10 @@
 import logging
 import os
 import subprocess
+from pathlib import Path
 
 import cffi
+import yaml
 from packaging.version import parse
 
 
@@ -42,3 +44,37 @@ def fdb_info() -> None:
         ], stdout=subprocess.PIPE, check=False)
 
     print(output.stdout.decode('utf-8'))
+
+
+def load_fdb_config() -> dict:
+    """Load the FDB configuration set by FDB5_CONFIG, or the file set by FDB5_CONFIG_FILE."""
+
+    if 'FDB5_CONFIG' in os.environ:
+        return yaml.safe_load(os.environ['FDB5_CONFIG'])
+    if 'FDB5_CONFIG_FILE' in os.environ:
+        with open(os.environ['FDB5_CONFIG_FILE'], 'r', encoding='utf-8') as f:
+            return yaml.safe_load(f)
+    raise RuntimeError("FDB config is unset, set either FDB5_CONFIG_FILE or FDB5_CONFIG.")
+
+
+def fdb_roots(config: dict | None = None) -> list[Path]:
+    """Return the root directories of the spaces of a local FDB with the TOC engine."""
+
+    if config is None:
+        config = load_fdb_config()
+
+    if config.get('type', 'local') != 'local' or config.get('engine', 'toc') != 'toc':
+        raise RuntimeError(f"Only local FDBs with the TOC engine have root directories, got {config}")
+
+    return [Path(root['path']) for space in config.get('spaces', []) for root in space.get('roots', [])]
+
+
+def fdb_schema_path(config: dict | None = None) -> Path:
+    """Return the path to the schema of FDB used when archiving new data."""
+
+    if config is None:
+        config = load_fdb_config()
+
+    if 'schema' in config:
+        return Path(config['schema'])
+    return Path(os.getenv('FDB5_HOME', 'unset')) / 'etc' / 'fdb' / 'schema'
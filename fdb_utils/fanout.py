@@ -0,0 +1,89 @@
+"""This module provides a way to run the same query against several FDB instances concurrently."""
+
+import logging
+import multiprocessing
+import os
+from collections.abc import Callable, Iterable
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, TypeVar
+
+_logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+def use_config(config_file: str) -> None:
+    """Point libFDB5 of the current process to the config file, before any FDB handle is created."""
+    os.environ.pop('FDB5_CONFIG', None)
+    os.environ['FDB5_CONFIG_FILE'] = config_file
+
+
+def run_with_config(config_file: str, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Point libFDB5 of the current process to the config file, then call the function."""
+    use_config(config_file)
+    return func(*args, **kwargs)
+
+
+def config_executor(config_file: Path | str, max_workers: int) -> ProcessPoolExecutor:
+    """
+    Return a pool of spawned processes all using the FDB config file, to run many calls against the same FDB.
+
+    Unlike `fan_out`, the processes are reused from one call to the next, so they can keep their FDB handle.
+    """
+    if not Path(config_file).exists():
+        raise RuntimeError(f"FDB config file does not exist: {config_file}")
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=use_config,
+        initargs=(str(config_file),),
+    )
+
+
+def fan_out(
+    func: Callable[..., T], config_files: Iterable[Path | str], *args: Any, max_workers: int | None = None,
+    **kwargs: Any
+) -> dict[str, T]:
+    """
+    Call the function with the arguments once for each FDB config file, and return the results by config file.
+
+    The configuration of libFDB5 is global to a process, so each call runs in a freshly spawned process of its own
+    with FDB5_CONFIG_FILE set to the config file. The function and its arguments must therefore be picklable, ie.
+    defined at the top level of a module, and should return rather than print their results.
+    """
+
+    configs = list(dict.fromkeys(str(c) for c in config_files))
+    if not configs:
+        return {}
+
+    for config_file in configs:
+        if not Path(config_file).exists():
+            raise RuntimeError(f"FDB config file does not exist: {config_file}")
+
+    # Processes are spawned, not forked, so that no FDB handle or config of the parent is inherited, and each runs a
+    # single call so that no state is carried over from one config to the next.
+    with ProcessPoolExecutor(
+        max_workers=min(len(configs), max_workers or len(configs)),
+        mp_context=multiprocessing.get_context('spawn'),
+        max_tasks_per_child=1,
+    ) as executor:
+        futures = {
+            config_file: executor.submit(run_with_config, config_file, func, *args, **kwargs)
+            for config_file in configs
+        }
+
+    results: dict[str, T] = {}
+    failed = []
+    for config_file, future in futures.items():
+        error = future.exception()
+        if error is not None:
+            _logger.error("Query of FDB with config %s failed: %s", config_file, error)
+            failed.append(config_file)
+        else:
+            results[config_file] = future.result()
+
+    if failed:
+        raise RuntimeError(f"Query failed for {len(failed)} of {len(configs)} FDB configs: {failed}")
+
+    return results
@@ -1,14 +1,23 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
 
-def is_directory_larger_than(directory: Path | str, size_limit_human_readable: str) -> bool:
-    # Convert human-readable size to bytes
-    size_limit_bytes = {
+from fdb_utils.schema import Schema, load_schema
+
+def parse_size(size_human_readable: str) -> float:
+    """Convert a human-readable size, eg. '1.5TB', to bytes."""
+    return {
         'KB': 1024,
         'MB': 1024 ** 2,
         'GB': 1024 ** 3,
         'TB': 1024 ** 4
-    }[size_limit_human_readable[-2:]] * float(size_limit_human_readable[:-2])
+    }[size_human_readable[-2:]] * float(size_human_readable[:-2])
+
+
+def is_directory_larger_than(directory: Path | str, size_limit_human_readable: str) -> bool:
+    # Convert human-readable size to bytes
+    size_limit_bytes = parse_size(size_limit_human_readable)
 
     # Get the size of the directory
     size_in_bytes = get_directory_size(directory)
@@ -27,3 +36,65 @@ def get_directory_size(directory: Path | str) -> int:
             elif entry.is_dir():
                 total_size += get_directory_size(entry.path)
     return total_size
+
+
+@dataclass
+class SizeByKey:
+    """Bytes used by each database directory under an FDB root, with the database key parsed from its name."""
+
+    databases: dict[str, int]
+    keys: dict[str, dict[str, str]]
+
+    @property
+    def total(self) -> int:
+        return sum(self.databases.values())
+
+    @property
+    def unmatched(self) -> dict[str, int]:
+        """Bytes of the entries of the root which do not match any rule of the schema."""
+        return {name: size for name, size in self.databases.items() if name not in self.keys}
+
+    def group_by(self, *names: str) -> dict[tuple[str, ...], int]:
+        """Sum the bytes of the databases sharing the same values of the given keys."""
+        grouped: dict[tuple[str, ...], int] = {}
+        for db_name, key in self.keys.items():
+            group = tuple(key.get(name, '') for name in names)
+            grouped[group] = grouped.get(group, 0) + self.databases[db_name]
+        return grouped
+
+    def per_forecast(self) -> dict[tuple[str, str, str], int]:
+        return self.group_by('model', 'date', 'time')  # type: ignore[return-value]
+
+    def per_model(self) -> dict[str, int]:
+        return {model: size for (model,), size in self.group_by('model').items()}
+
+
+def _entry_size(entry: os.DirEntry) -> int:
+    if entry.is_dir(follow_symlinks=False):
+        return get_directory_size(entry.path)
+    return entry.stat(follow_symlinks=False).st_size
+
+
+def get_size_by_key(fdb_root: Path | str, schema: Schema | None = None, max_workers: int = 8) -> SizeByKey:
+    """
+    Walk the FDB root once, sizing the database directories in parallel and mapping them back to their keys.
+
+    If no schema is given, the copy stored in the databases under the root is used.
+    """
+    if schema is None:
+        schema = load_schema(fdb_root)
+
+    with os.scandir(fdb_root) as it:
+        entries = list(it)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        sizes = list(executor.map(_entry_size, entries))
+
+    databases = {entry.name: size for entry, size in zip(entries, sizes)}
+    keys = {}
+    for entry in entries:
+        key = schema.parse_database_name(entry.name) if entry.is_dir() else None
+        if key is not None:
+            keys[entry.name] = key
+
+    return SizeByKey(databases, keys)
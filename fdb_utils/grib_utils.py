@@ -1,6 +1,10 @@
-"""This module provides a function for reading GRIB files."""
+"""This module provides functions for reading GRIB files."""
 
 import logging
+import mmap
+import os
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
 from pathlib import Path
 
 import eccodes
@@ -29,3 +33,164 @@ def extract_metadata_from_grib_file(path: Path) -> dict:
         'step': int(step),
         'number': int(number),
     }
+
+
+@dataclass
+class GribMessage:
+    """Position of a GRIB message in a file, and the values of its MARS keys."""
+
+    path: Path
+    offset: int
+    length: int
+    metadata: dict[str, str]
+
+
+def scan_grib_messages(path: Path, keys: Iterable[str]) -> Iterator[GribMessage]:
+    """
+    Yield the offset, length and MARS keys of each message of a GRIB file, only decoding the message headers.
+
+    Keys which are not defined for a message are set to an empty string.
+    """
+    keys = tuple(keys)
+    with open(path, "rb") as f:
+        while (gid := eccodes.codes_grib_new_from_file(f, headers_only=True)) is not None:
+            try:
+                metadata = {}
+                for key in keys:
+                    try:
+                        metadata[key] = eccodes.codes_get_string(gid, f'mars.{key}')
+                    except eccodes.KeyValueNotFoundError:
+                        metadata[key] = ''
+                yield GribMessage(
+                    path=Path(path),
+                    offset=eccodes.codes_get_long(gid, 'offset'),
+                    length=eccodes.codes_get_long(gid, 'totalLength'),
+                    metadata=metadata,
+                )
+            finally:
+                eccodes.codes_release(gid)
+
+
+# Section 0 of a GRIB message holds the edition and total length of the message, in its first 8 (edition 1) or 16
+# (edition 2) bytes. Messages end with the end marker '7777'.
+GRIB_HEADER_SIZE = 16
+GRIB_END_MARKER = b'7777'
+# GRIB1 messages over 8 MiB set the top bit of their 24 bit length, and give it in units of 120 bytes.
+GRIB1_LARGE_FLAG = 0x800000
+GRIB1_LARGE_UNIT = 120
+
+
+def _uint24(buffer: bytes | mmap.mmap, offset: int) -> int:
+    field = buffer[offset:offset + 3]
+    if len(field) < 3:
+        raise ValueError(f"GRIB message is truncated at offset {offset}")
+    return int.from_bytes(field, 'big')
+
+
+def _grib1_large_length(buffer: bytes | mmap.mmap, start: int, length: int) -> int:
+    """
+    Return the length of a GRIB1 message with the top bit of its length set, as ecCodes decodes it.
+
+    The length of a large message is given in units of 120 bytes, and the length of its section 4, which is then
+    less than 120, is the number of bytes to remove from it. Otherwise the message is between 8 and 16 MiB and its
+    length is given as is.
+    """
+    section_1 = start + 8
+    # Octet 8 of section 1 flags which of the optional sections 2 and 3 are present.
+    flags = buffer[section_1 + 7:section_1 + 8]
+    if not flags:
+        raise ValueError(f"GRIB message at offset {start} is truncated")
+    offset = section_1 + _uint24(buffer, section_1)
+    if flags[0] & 0x80:
+        offset += _uint24(buffer, offset)
+    if flags[0] & 0x40:
+        offset += _uint24(buffer, offset)
+    section_4_length = _uint24(buffer, offset)
+    if section_4_length >= GRIB1_LARGE_UNIT:
+        return length
+    return (length & ~GRIB1_LARGE_FLAG) * GRIB1_LARGE_UNIT - section_4_length + len(GRIB_END_MARKER)
+
+
+def grib_message_length(buffer: bytes | mmap.mmap, start: int = 0) -> int:
+    """
+    Return the total length of the GRIB message at offset start of the buffer, from its section 0.
+
+    Only the first 16 bytes of the message are read, except for GRIB1 messages over 8 MiB whose length is decoded
+    from the headers of their sections.
+    """
+    header = buffer[start:start + GRIB_HEADER_SIZE]
+    if header[:4] != b'GRIB' or len(header) < 8:
+        raise ValueError("Not the start of a GRIB message")
+    edition = header[7]
+    if edition == 1:
+        length = int.from_bytes(header[4:7], 'big')
+        if length & GRIB1_LARGE_FLAG:
+            return _grib1_large_length(buffer, start, length)
+        return length
+    if edition == 2 and len(header) >= GRIB_HEADER_SIZE:
+        return int.from_bytes(header[8:16], 'big')
+    raise ValueError(f"Unsupported GRIB edition {edition}")
+
+
+def is_complete_grib_file(path: Path | str) -> bool:
+    """
+    Check that a file is a sequence of complete GRIB messages, from their headers and end markers only.
+
+    The file is memory mapped and only the pages holding the headers and end markers are read, so that files can be
+    checked without decoding them.
+    """
+    size = os.path.getsize(path)
+    if not size:
+        return False
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        offset = 0
+        while offset < size:
+            try:
+                length = grib_message_length(mm, offset)
+            except ValueError:
+                return False
+            if offset + length > size:
+                return False
+            if mm[offset + length - len(GRIB_END_MARKER):offset + length] != GRIB_END_MARKER:
+                return False
+            offset += length
+    return True
+
+
+def grib_message_bounds(buffer: bytes | mmap.mmap) -> Iterator[tuple[int, int]]:
+    """
+    Yield the start and end offsets of the GRIB messages of a buffer, from their section 0 lengths and end markers.
+
+    Bytes between messages, eg. padding, are skipped. Raises ValueError on a message which is truncated or does not
+    end with the end marker.
+    """
+    size = len(buffer)
+    start = buffer.find(b'GRIB')
+    while start != -1:
+        length = grib_message_length(buffer, start)
+        end = start + length
+        if end > size:
+            raise ValueError(f"GRIB message at offset {start} is truncated, {length} bytes expected")
+        if buffer[end - len(GRIB_END_MARKER):end] != GRIB_END_MARKER:
+            raise ValueError(f"GRIB message at offset {start} does not end with {GRIB_END_MARKER!r}")
+        yield start, end
+        start = buffer.find(b'GRIB', end)
+
+
+def split_grib_messages(path: Path | str) -> Iterator[memoryview]:
+    """
+    Yield each GRIB message of a file as a memoryview of the memory mapped file, without copying or decoding it.
+
+    Each message is only valid until the next one is requested, as its pages are then released from memory, so that
+    the memory used stays at about one message whatever the size of the file. Copy it with bytes() to keep it.
+    """
+    if not os.path.getsize(path):
+        return
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        with memoryview(mm) as view:
+            for start, end in grib_message_bounds(mm):
+                with view[start:end] as message:
+                    yield message
+                # The pages are read again from the file if a later message shares them.
+                page_start = start - start % mmap.PAGESIZE
+                mm.madvise(mmap.MADV_DONTNEED, page_start, end - page_start)
@@ -1,12 +1,30 @@
 import logging
-from typing import Annotated
+from collections.abc import Iterator
+from contextlib import nullcontext
+from datetime import timedelta
+from typing import Annotated, Optional, TextIO
 import sys
 import os
+import time
+from pathlib import Path
 
 import typer
 
-from fdb_utils.user.describe import list_all_values
-from fdb_utils.env import validate_environment, fdb_info
+from fdb_utils.user.batch import read_batch, run_batch, write_batch_results
+from fdb_utils.user.catalogue import TocCatalogue
+from fdb_utils.user.completeness import check_completeness
+from fdb_utils.user.describe import count_values, list_all_values, list_entries
+from fdb_utils.user.output import FORMATS, write_listing
+from fdb_utils.user.request import parse_filter, request_size
+from fdb_utils.user.retrieve import retrieve_split, retrieve_to_file
+from fdb_utils.user.stats import parse_pairs
+from fdb_utils.env import validate_environment, fdb_info, fdb_roots
+from fdb_utils.fs_utils import parse_size
+from fdb_utils.management.archive import archive_files, archive_files_parallel
+from fdb_utils.management.mirror import LEFT, RIGHT, diff_fdbs, sync_fields
+from fdb_utils.management.orphans import scan_root
+from fdb_utils.management.retention import RetentionPolicy, run_retention
+from fdb_utils.management.verify import verify_databases
 
 logging.basicConfig(stream=sys.stdout, level=logging.INFO, format='%(message)s')
 
@@ -19,13 +37,99 @@ app = typer.Typer(
 
 validate_environment()
 
+def _parse_filter(
+    filter_values: str, catalogue: TocCatalogue | None, max_request_size: int, param_hint: str = "--filter"
+) -> dict[str, str | list[str]]:
+    """Parse the filter into a request, and ask for confirmation if it expands to too many combinations of values."""
+
+    try:
+        request = parse_filter(filter_values, catalogue.schema.types if catalogue is not None else None)
+    except ValueError as e:
+        raise typer.BadParameter(str(e), param_hint=param_hint) from e
+
+    _confirm_request_size(request, catalogue, max_request_size)
+    return request
+
+
+def _confirm_request_size(
+    request: dict[str, str | list[str]], catalogue: TocCatalogue | None, max_request_size: int
+) -> None:
+    size = request_size(request)
+    if size > max_request_size:
+        databases_msg = f" over {len(catalogue.databases(request))} databases" if catalogue is not None else ''
+        run_request = typer.confirm(
+            f"The filter expands to {size} combinations of values{databases_msg}. Are you sure you want to run it?"
+        )
+        if not run_request:
+            raise typer.Abort()
+
+
 @app.command("list")
 def list_metadata(
     show: Annotated[str, typer.Option(help='The keys to print, eg. "step,number,param"')] = "",
-    filter_values: Annotated[str, typer.Option("--filter", help='The metadata to filter results by, eg "date=20240624,time=0600".')] = ""
+    filter_values: Annotated[
+        str,
+        typer.Option(
+            "--filter",
+            help='The metadata to filter results by, eg "date=20240624,time=0600". Several values or ranges of values '
+            'are separated by "/", eg "date=20240601/to/20240607,step=0/to/48/by/6,number=1/2/3".',
+        ),
+    ] = "",
+    toc: Annotated[
+        bool,
+        typer.Option(help='Read the local FDB directly, only opening the databases matching the filter.'),
+    ] = False,
+    output_format: Annotated[
+        str,
+        typer.Option("--format", help=f'Output format, one of {", ".join(FORMATS)}.'),
+    ] = "text",
+    output: Annotated[str, typer.Option(help='File to write the output to instead of stdout.')] = "",
+    entries: Annotated[
+        bool,
+        typer.Option(help='Write every listed entry instead of the distinct values of each key.'),
+    ] = False,
+    configs: Annotated[
+        Optional[list[Path]],
+        typer.Option(
+            "--config",
+            help='FDB config file to query instead of the FDB of the environment. Repeat to query several FDBs '
+            'concurrently and merge the results.',
+            exists=True,
+            dir_okay=False,
+        ),
+    ] = None,
+    max_request_size: Annotated[
+        int,
+        typer.Option(
+            help='Ask for confirmation before running a request expanding to more combinations of filter values.',
+        ),
+    ] = 10000,
+    workers: Annotated[
+        int,
+        typer.Option(help='Number of databases to list concurrently, with the default text output.'),
+    ] = 1,
+    batch: Annotated[
+        Optional[Path],
+        typer.Option(
+            help='File of requests to list in one go instead of --filter and --show, one JSON object per line, eg. '
+            '{"id": "eps", "filter": "date=20240624,time=0600", "show": "number,step"}. One JSON object is '
+            'written per request.',
+            exists=True,
+            dir_okay=False,
+        ),
+    ] = None,
     ) -> None:
     """List a union of metadata key/value pairs of GRIB messages archived to FDB."""
 
+    if output_format not in FORMATS:
+        raise typer.BadParameter(f"Format must be one of {', '.join(FORMATS)}.", param_hint="--format")
+    _check_configs(configs, toc)
+
+    if batch is not None:
+        conflicting = filter_values or show or configs or entries or workers != 1 or output_format != 'text'
+        _list_batch(batch, toc, output, max_request_size, conflicting)
+        return
+
     if not filter_values:
         list_all = typer.confirm("Are you sure you want list everything in FDB? (may take some time).")
         if not list_all:
@@ -33,12 +137,480 @@ def list_metadata(
 
     show_keys = show.split(',') if show else []
 
-    filter_key_value_pairs = filter_values.split(',')
-    filter_by_values = dict(pair.split('=') for pair in filter_key_value_pairs) if filter_values else {}
+    os.environ['METKIT_RAW_PARAM']='1'
+
+    catalogue = TocCatalogue.from_config() if toc else None
+
+    filter_by_values = _parse_filter(filter_values, catalogue, max_request_size)
+
+    if output_format == 'text' and not entries and not output:
+        list_all_values(
+            *show_keys, catalogue=catalogue, configs=_config_files(configs), workers=workers, **filter_by_values
+        )
+        return
+
+    if configs:
+        raise typer.BadParameter("Several FDB configs can only be listed with the default text output.")
+
+    listed = list_entries(*show_keys, catalogue=catalogue, **filter_by_values)
+    key_types = catalogue.schema.types if catalogue is not None else None
+
+    if output:
+        with open(output, 'w', encoding='utf-8', buffering=1024 ** 2) as stream:
+            write_listing(listed, stream, output_format, show_keys, distinct=not entries, key_types=key_types)
+    else:
+        write_listing(listed, sys.stdout, output_format, show_keys, distinct=not entries, key_types=key_types)
+
+
+def _list_batch(batch: Path, toc: bool, output: str, max_request_size: int, conflicting: object) -> None:
+    if conflicting:
+        raise typer.BadParameter(
+            "--batch cannot be combined with --filter, --show, --config, --format, --entries or --workers."
+        )
+
+    os.environ['METKIT_RAW_PARAM']='1'
+
+    catalogue = TocCatalogue.from_config() if toc else None
+    key_types = catalogue.schema.types if catalogue is not None else None
+
+    with open(batch, 'r', encoding='utf-8') as f:
+        requests = read_batch(f, key_types, max_request_size)
+
+    results = run_batch(requests, catalogue=catalogue)
+    if output:
+        with open(output, 'w', encoding='utf-8') as stream:
+            failed = write_batch_results(results, stream, key_types)
+    else:
+        failed = write_batch_results(results, sys.stdout, key_types)
+
+    if failed:
+        # The results are written to stdout, only report the failure on stderr.
+        typer.echo(f"{failed} of {len(requests)} requests failed", err=True)
+        raise typer.Exit(code=1)
+
+
+def _check_configs(configs: list[Path] | None, toc: bool) -> None:
+    if configs and toc:
+        raise typer.BadParameter("Cannot be combined with --toc, which reads the local FDB.", param_hint="--config")
+
+
+def _config_files(configs: list[Path] | None) -> list[str] | None:
+    return [str(config) for config in configs] if configs else None
+
+
+@app.command()
+def count(
+    show: Annotated[str, typer.Option(help='The keys to count entries by, eg. "step,param". All keys if empty.')] = "",
+    pairs: Annotated[
+        str,
+        typer.Option(help='The pairs of keys to count entries by, eg. "step:param,number:step".'),
+    ] = "",
+    filter_values: Annotated[
+        str,
+        typer.Option(
+            "--filter",
+            help='The metadata to filter results by, eg "date=20240624,time=0600". Several values or ranges of values '
+            'are separated by "/", eg "date=20240601/to/20240607,step=0/to/48/by/6,number=1/2/3".',
+        ),
+    ] = "",
+    approximate: Annotated[
+        bool,
+        typer.Option(help='Only estimate the number of distinct values, in bounded memory.'),
+    ] = False,
+    toc: Annotated[
+        bool,
+        typer.Option(help='Read the local FDB directly, only opening the databases matching the filter.'),
+    ] = False,
+    configs: Annotated[
+        Optional[list[Path]],
+        typer.Option(
+            "--config",
+            help='FDB config file to query instead of the FDB of the environment. Repeat to query several FDBs '
+            'concurrently and merge the results.',
+            exists=True,
+            dir_okay=False,
+        ),
+    ] = None,
+    max_request_size: Annotated[
+        int,
+        typer.Option(
+            help='Ask for confirmation before running a request expanding to more combinations of filter values.',
+        ),
+    ] = 10000,
+    ) -> None:
+    """Count the GRIB messages archived to FDB per value of metadata keys and pairs of keys."""
+
+    try:
+        key_pairs = parse_pairs(pairs.split(',')) if pairs else []
+    except ValueError as e:
+        raise typer.BadParameter(str(e), param_hint="--pairs") from e
+    _check_configs(configs, toc)
+
+    if not filter_values:
+        count_all = typer.confirm("Are you sure you want count everything in FDB? (may take some time).")
+        if not count_all:
+            raise typer.Abort()
+
+    show_keys = show.split(',') if show else []
+
+    os.environ['METKIT_RAW_PARAM']='1'
+
+    catalogue = TocCatalogue.from_config() if toc else None
+
+    filter_by_values = _parse_filter(filter_values, catalogue, max_request_size)
+
+    count_values(
+        *show_keys, pairs=key_pairs, approximate=approximate, catalogue=catalogue, configs=_config_files(configs),
+        **filter_by_values
+    )
+
+
+@app.command()
+def completeness(
+    filter_values: Annotated[
+        str,
+        typer.Option(
+            "--filter",
+            help='The metadata of the run to check, eg "date=20240624,time=0600,model=icon-ch1-eps".',
+        ),
+    ],
+    expect: Annotated[
+        str,
+        typer.Option(
+            help='The expected values of each key of the hypercube, params by their numeric id, eg '
+            '"param=500001/500004,levelist=1/to/80,step=0/to/33,number=0/to/10".',
+        ),
+    ],
+    toc: Annotated[
+        bool,
+        typer.Option(help='Read the local FDB directly, only opening the databases matching the filter.'),
+    ] = False,
+    wait: Annotated[int, typer.Option(help='Seconds to keep checking the missing cells for before giving up.')] = 0,
+    interval: Annotated[int, typer.Option(help='Seconds between two checks of the missing cells with --wait.')] = 60,
+    max_request_size: Annotated[
+        int,
+        typer.Option(
+            help='Ask for confirmation before running a request expanding to more combinations of filter and expected '
+            'values.',
+        ),
+    ] = 10000,
+    ) -> None:
+    """Check that all cells of a hypercube of metadata values are archived to FDB, and print the missing ones."""
+
+    os.environ['METKIT_RAW_PARAM']='1'
+
+    catalogue = TocCatalogue.from_config() if toc else None
+
+    # The hypercube is listed at once, so only confirm the size of the request with the expected values.
+    filter_by_values = _parse_filter(filter_values, catalogue, max_request_size=sys.maxsize)
+    expected = _parse_filter(expect, catalogue, max_request_size=sys.maxsize, param_hint="--expect")
+    if not expected:
+        raise typer.BadParameter("The expected values of at least one key are required.", param_hint="--expect")
+    _confirm_request_size(filter_by_values | expected, catalogue, max_request_size)
+
+    deadline = time.monotonic() + wait
+    status = None
+    while True:
+        status = check_completeness(expected, catalogue=catalogue, status=status, **filter_by_values)
+        if status.complete or time.monotonic() + interval > deadline:
+            break
+        _logger.info(
+            "%d of %d cells missing, checking again in %d seconds", len(status.missing), status.cube.size, interval
+        )
+        time.sleep(interval)
+
+    if status.complete:
+        _logger.info("All %d cells are archived", status.cube.size)
+        return
+
+    for block in status.missing_blocks():
+        _logger.info("Missing %d cells: %s", block.size, block)
+    _logger.info("%d of %d cells missing", len(status.missing), status.cube.size)
+    raise typer.Exit(code=1)
+
+
+@app.command()
+def retrieve(
+    filter_values: Annotated[
+        str,
+        typer.Option(
+            "--filter",
+            help='The metadata of the GRIB messages to retrieve, with values of all keys of the FDB schema, eg '
+            '"date=20240624,time=0600,model=icon-ch1-eps,number=0/to/20,levtype=ml,levelist=1/to/80,param=500001,'
+            'step=0/to/33".',
+        ),
+    ],
+    output: Annotated[str, typer.Option(help='File to write the GRIB messages to.')],
+    split_by: Annotated[
+        str,
+        typer.Option(
+            help='Retrieve the messages of each value of this key, eg. "number", concurrently into a file of its own.',
+        ),
+    ] = "",
+    workers: Annotated[int, typer.Option(help='Number of parts retrieved concurrently with --split-by.')] = 4,
+    chunk_size: Annotated[str, typer.Option(help='Size of the chunks the data is read in, eg. "16MB".')] = "16MB",
+    max_request_size: Annotated[
+        int,
+        typer.Option(
+            help='Ask for confirmation before running a request expanding to more combinations of filter values.',
+        ),
+    ] = 10000,
+    ) -> None:
+    """Retrieve GRIB messages archived to FDB into a file, in fixed-size chunks."""
+
+    os.environ['METKIT_RAW_PARAM']='1'
+
+    request = _parse_filter(filter_values, None, max_request_size)
+    chunk_bytes = int(parse_size(chunk_size))
+
+    if split_by:
+        sizes = retrieve_split(request, output, split_by, workers=workers, chunk_size=chunk_bytes)
+        _logger.info("Retrieved %d bytes into %d files", sum(sizes.values()), len(sizes))
+        if not sizes:
+            _logger.error("No values of %s match the request", split_by)
+            raise typer.Exit(code=1)
+    else:
+        sizes = {Path(output): retrieve_to_file(request, output, chunk_size=chunk_bytes)}
+        _logger.info("Retrieved %d bytes into %s", sizes[Path(output)], output)
+
+    # FDB retrieves nothing, rather than failing, for a request matching no data or missing keys of the schema.
+    empty = [path for path, size in sizes.items() if not size]
+    if empty:
+        for path in empty:
+            path.unlink(missing_ok=True)
+        _logger.error("Nothing retrieved into %s, check that the request is complete", ", ".join(map(str, empty)))
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def archive(
+    files: Annotated[list[Path], typer.Argument(help='GRIB files to archive.', exists=True, dir_okay=False)],
+    max_batch_size: Annotated[
+        str,
+        typer.Option(help='Maximum size of the data archived at once, eg. "256MB".'),
+    ] = "256MB",
+    workers: Annotated[int, typer.Option(help='Number of processes archiving different databases concurrently.')] = 1,
+    dedup_index: Annotated[
+        Optional[Path],
+        typer.Option(
+            help='Index file of the messages archived, to skip messages already archived with the same content, eg. '
+            'when retrying. Pass it to retention as well, so that wiped forecasts are archived again.',
+            dir_okay=False,
+        ),
+    ] = None,
+    ) -> None:
+    """Archive GRIB files to FDB, grouping their messages by database and index."""
+
+    os.environ['METKIT_RAW_PARAM']='1'
+
+    if workers > 1:
+        report = archive_files_parallel(
+            files, workers=workers, max_batch_bytes=int(parse_size(max_batch_size)), dedup_index=dedup_index
+        )
+        _logger.info("%s", report)
+        if report.failed or report.failed_files:
+            raise typer.Exit(code=1)
+        return
+
+    stats = archive_files(files, max_batch_bytes=int(parse_size(max_batch_size)), dedup_index=dedup_index)
+    _logger.info(
+        "Archived %d messages (%d bytes) of %d files in %d groups, skipped %d already archived",
+        stats.messages, stats.bytes, stats.files, stats.groups, stats.skipped,
+    )
+
+
+@app.command()
+def diff(
+    left: Annotated[
+        Path,
+        typer.Argument(
+            help='Config file of the FDB to compare, the source of the fields copied by --sync.',
+            exists=True,
+            dir_okay=False,
+        ),
+    ],
+    right: Annotated[
+        Path,
+        typer.Argument(
+            help='Config file of the FDB to compare with, eg. the mirror of the first.',
+            exists=True,
+            dir_okay=False,
+        ),
+    ],
+    filter_values: Annotated[
+        str,
+        typer.Option("--filter", help='The metadata of the fields to compare, eg "date=20240624,time=0600".'),
+    ] = "",
+    output: Annotated[str, typer.Option(help='File to write the differences to instead of stdout.')] = "",
+    sync: Annotated[bool, typer.Option(help='Copy the fields missing from the second FDB from the first one.')] = False,
+    workers: Annotated[
+        int,
+        typer.Option(help='Number of processes retrieving, and archiving, the fields copied with --sync.'),
+    ] = 4,
+    max_request_size: Annotated[
+        int,
+        typer.Option(
+            help='Ask for confirmation before running a request expanding to more combinations of filter values.',
+        ),
+    ] = 10000,
+    ) -> None:
+    """
+    Print the fields archived to only one of two FDBs, '-' for the first and '+' for the second.
+
+    With --sync, the fields only archived to the first FDB are copied to the second.
+    """
+
+    if not filter_values:
+        diff_all = typer.confirm("Are you sure you want compare everything in both FDBs? (may take some time).")
+        if not diff_all:
+            raise typer.Abort()
 
     os.environ['METKIT_RAW_PARAM']='1'
 
-    list_all_values(*show_keys, **filter_by_values)
+    request = _parse_filter(filter_values, None, max_request_size)
+    counts = {LEFT: 0, RIGHT: 0}
+    common = 0
+
+    def differences(stream: TextIO) -> Iterator[dict[str, str]]:
+        nonlocal common
+        for side, keys in diff_fdbs(left, right, request):
+            if side not in counts:
+                common += 1
+                continue
+            counts[side] += 1
+            stream.write(f"{'-' if side == LEFT else '+'} {','.join(f'{k}={v}' for k, v in keys.items())}\n")
+            if side == LEFT:
+                yield keys
+
+    with open(output, 'w', encoding='utf-8') if output else nullcontext(sys.stdout) as stream:
+        if sync:
+            stats = sync_fields(differences(stream), left, right, workers=workers)
+        else:
+            for _ in differences(stream):
+                pass
+
+    # The differences may be written to stdout, only report the summary on stderr.
+    typer.echo(
+        f"{common} fields in both FDBs, {counts[LEFT]} only in {left}, {counts[RIGHT]} only in {right}", err=True
+    )
+    if sync:
+        typer.echo(f"Copied {stats.fields} fields ({stats.bytes} bytes) to {right}, {stats.failed} failed", err=True)
+        if stats.failed:
+            raise typer.Exit(code=1)
+    elif counts[LEFT] or counts[RIGHT]:
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def verify(
+    filter_values: Annotated[
+        str,
+        typer.Option(
+            "--filter",
+            help='The first level keys of the databases to check, eg "date=20240624,time=0600". All databases if '
+            'empty.',
+        ),
+    ] = "",
+    workers: Annotated[
+        Optional[int],
+        typer.Option(help='Number of databases checked concurrently. Defaults to the number of CPUs.'),
+    ] = None,
+    index: Annotated[
+        bool,
+        typer.Option(help='Check that the entries of the indexes point to complete GRIB messages.'),
+    ] = True,
+    ) -> None:
+    """Check the GRIB messages of the data files of the local FDB are complete, and match the entries of the indexes."""
+
+    catalogue = TocCatalogue.from_config()
+    request = _parse_filter(filter_values, catalogue, max_request_size=10000)
+    databases = [(path, db_key if index else None) for path, db_key in catalogue.databases(request)]
+    _logger.info("Checking %d databases", len(databases))
+
+    reports = verify_databases(databases, workers=workers)
+    for report in reports:
+        _logger.info("%s", report)
+
+    failed = [report for report in reports if not report.ok]
+    _logger.info("%d of %d databases passed", len(reports) - len(failed), len(reports))
+    if failed:
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def orphans(
+    fdb_root: Annotated[
+        Optional[list[Path]],
+        typer.Option(
+            help='Root directory of FDB to scan. Defaults to the roots of the FDB config.',
+            exists=True,
+            file_okay=False,
+        ),
+    ] = None,
+    workers: Annotated[int, typer.Option(help='Number of databases scanned at once.')] = 8,
+    ) -> None:
+    """
+    Find unclean databases, with files not owned by their catalogue or leftover locks, and the bytes reclaimable.
+
+    Databases locked with fdb-lock, eg. for maintenance, are reported too, but are not unclean.
+    """
+
+    reclaimable = 0
+    unclean = 0
+    locked = 0
+    for root in fdb_root or fdb_roots():
+        scans = scan_root(root, max_workers=workers)
+        for scan in scans:
+            if not scan.clean:
+                unclean += 1
+                reclaimable += scan.reclaimable
+                _logger.info("%s", scan)
+            elif scan.control_locks:
+                locked += 1
+                _logger.info("%s", scan)
+        _logger.info("%d databases scanned under %s", len(scans), root)
+
+    _logger.info("%d unclean databases, %d bytes reclaimable, %d databases locked", unclean, reclaimable, locked)
+    if unclean:
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def retention(
+    keep_last: Annotated[int | None, typer.Option(help='Number of most recent runs to keep per model.')] = None,
+    max_age: Annotated[int | None, typer.Option(help='Wipe runs which started more than this many hours ago.')] = None,
+    max_size: Annotated[str, typer.Option(help='Maximum size of the runs of each model, eg. "10TB".')] = "",
+    protect_oldest: Annotated[int, typer.Option(help='Number of oldest runs which are never wiped.')] = 0,
+    model: Annotated[str, typer.Option(help='Only apply the policy to this model.')] = "",
+    fdb_root: Annotated[str, typer.Option(help='Root directory of FDB, required by --max-size.')] = "",
+    workers: Annotated[int, typer.Option(help='Number of forecasts wiped at once.')] = 4,
+    dry_run: Annotated[bool, typer.Option(help='Only print the forecasts which would be wiped.')] = False,
+    yes: Annotated[bool, typer.Option("--yes", help='Do not ask for confirmation.')] = False,
+    dedup_index: Annotated[
+        Optional[Path],
+        typer.Option(
+            help='Dedup index file of fdb-utils archive, to remove the forecasts wiped from, so that they are archived '
+            'again.',
+            dir_okay=False,
+        ),
+    ] = None,
+    ) -> None:
+    """Wipe the forecasts which are not covered by the retention policy from FDB."""
+
+    policy = RetentionPolicy(
+        keep_last=keep_last,
+        max_age=timedelta(hours=max_age) if max_age is not None else None,
+        max_bytes=parse_size(max_size) if max_size else None,
+        protect_oldest=protect_oldest,
+    )
+
+    if not dry_run and not yes:
+        if not typer.confirm("Are you sure you want to wipe the forecasts not covered by the policy from FDB?"):
+            raise typer.Abort()
+
+    run_retention(
+        policy, model=model, fdb_root=fdb_root or None, dry_run=dry_run, max_workers=workers, dedup_index=dedup_index
+    )
 
 
 @app.command()
@@ -0,0 +1,332 @@
+"""This module provides functions for archiving GRIB files to FDB, grouped by database and index."""
+
+import logging
+import mmap
+import multiprocessing
+import time
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from fdb_utils.env import fdb_schema_path
+from fdb_utils.grib_utils import GribMessage, scan_grib_messages
+from fdb_utils.management.dedup import DedupIndex
+from fdb_utils.schema import Schema
+
+_logger = logging.getLogger(__name__)
+
+# Upper bound of the data handed to FDB at once, larger groups are archived in several parts.
+DEFAULT_MAX_BATCH_BYTES = 256 * 1024 ** 2
+
+
+@dataclass
+class ArchiveStats:
+    files: int = 0
+    messages: int = 0
+    bytes: int = 0
+    # Number of groups of messages of the same database and index.
+    groups: int = 0
+    # Number of calls to archive.
+    batches: int = 0
+    # Number of messages skipped as they were already archived.
+    skipped: int = 0
+
+    def add(self, other: "ArchiveStats") -> None:
+        self.files += other.files
+        self.messages += other.messages
+        self.bytes += other.bytes
+        self.groups += other.groups
+        self.batches += other.batches
+        self.skipped += other.skipped
+
+
+@dataclass
+class ArchiveReport:
+    """Combined report of an archive run over several databases."""
+
+    stats: ArchiveStats
+    seconds: float
+    databases: int
+    # Error of each database which failed to archive, by database key.
+    failed: dict[tuple[str, ...], str] = field(default_factory=dict)
+    # Error of each file which failed to be scanned, and whose messages were not archived, by path.
+    failed_files: dict[str, str] = field(default_factory=dict)
+
+    @property
+    def throughput(self) -> float:
+        """Bytes archived per second."""
+        return self.stats.bytes / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        report = (
+            f"Archived {self.stats.messages} messages ({self.stats.bytes / 1024 ** 2:.1f} MiB) of {self.stats.files} "
+            f"files to {self.databases - len(self.failed)} of {self.databases} databases in {self.seconds:.1f}s "
+            f"({self.throughput / 1024 ** 2:.1f} MiB/s)"
+        )
+        if self.stats.skipped:
+            report += f", skipped {self.stats.skipped} messages already archived"
+        if self.failed:
+            report += f", failed for {len(self.failed)} databases: {self.failed}"
+        if self.failed_files:
+            report += f", failed to read {len(self.failed_files)} files: {self.failed_files}"
+        return report
+
+
+def grouping_keys(schema: Schema) -> list[str]:
+    """Return the keys of the first (database) and second (index) levels of the schema."""
+    return list(dict.fromkeys([*schema.database_keys, *schema.index_keys]))
+
+
+def group_messages(messages: Iterable[GribMessage], keys: Iterable[str]) -> dict[tuple[str, ...], list[GribMessage]]:
+    """
+    Group messages by the values of the keys, eg. by database and index.
+
+    Groups are ordered by their first message, and the messages of a group keep their order.
+    """
+    keys = tuple(keys)
+    groups: dict[tuple[str, ...], list[GribMessage]] = {}
+    for message in messages:
+        groups.setdefault(tuple(message.metadata[k] for k in keys), []).append(message)
+    return groups
+
+
+def contiguous_runs(messages: list[GribMessage]) -> list[tuple[Path, int, int]]:
+    """Coalesce messages which follow each other in the same file into (path, start, end) byte ranges."""
+    runs: list[tuple[Path, int, int]] = []
+    for message in messages:
+        end = message.offset + message.length
+        if runs and runs[-1][0] == message.path and runs[-1][2] == message.offset:
+            runs[-1] = (message.path, runs[-1][1], end)
+        else:
+            runs.append((message.path, message.offset, end))
+    return runs
+
+
+def _batches(messages: list[GribMessage], max_bytes: int) -> Iterable[list[GribMessage]]:
+    batch: list[GribMessage] = []
+    size = 0
+    for message in messages:
+        if batch and size + message.length > max_bytes:
+            yield batch
+            batch, size = [], 0
+        batch.append(message)
+        size += message.length
+    if batch:
+        yield batch
+
+
+def archive_messages(
+    messages: list[GribMessage],
+    fdb: Any,
+    keys: Iterable[str],
+    max_batch_bytes: int = DEFAULT_MAX_BATCH_BYTES,
+    dedup: DedupIndex | None = None,
+) -> ArchiveStats:
+    """
+    Archive the messages to FDB grouped by the values of the keys, without flushing.
+
+    The messages of each group are handed to FDB together, straight from the memory mapped files when they are
+    contiguous, rather than in the order of the files, which makes FDB switch between database and index writers on
+    files mixing members or level types.
+
+    With a dedup index, messages whose metadata and content are already in the index are skipped, and the others are
+    left pending in the index, to be committed once FDB was flushed.
+    """
+
+    stats = ArchiveStats()
+
+    with ExitStack() as stack:
+        mapped: dict[Path, mmap.mmap] = {}
+        for path in dict.fromkeys(m.path for m in messages):
+            f = stack.enter_context(open(path, 'rb'))
+            mapped[path] = stack.enter_context(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+        if dedup is not None:
+            new_messages = []
+            for message in messages:
+                with memoryview(mapped[message.path])[message.offset:message.offset + message.length] as data:
+                    if not dedup.is_archived(message.metadata, data):
+                        new_messages.append(message)
+            stats.skipped = len(messages) - len(new_messages)
+            messages = new_messages
+
+        groups = group_messages(messages, keys)
+        stats.groups = len(groups)
+
+        for group in groups.values():
+            for batch in _batches(group, max_batch_bytes):
+                runs = contiguous_runs(batch)
+                if len(runs) == 1:
+                    path, start, end = runs[0]
+                    with memoryview(mapped[path])[start:end] as data:
+                        fdb.archive(data)
+                else:
+                    fdb.archive(b''.join(mapped[path][start:end] for path, start, end in runs))
+                stats.messages += len(batch)
+                stats.bytes += sum(m.length for m in batch)
+                stats.batches += 1
+
+    return stats
+
+
+def _scan_keys(
+    keys: Iterable[str] | None, dedup_keys: Iterable[str] | None, dedup: bool
+) -> tuple[list[str], list[str]]:
+    """Return the grouping keys, and the keys to scan, which identify each message when deduplicating."""
+    if keys is None or (dedup and dedup_keys is None):
+        schema = Schema.from_file(fdb_schema_path())
+        keys = grouping_keys(schema) if keys is None else keys
+        dedup_keys = schema.datum_keys if dedup_keys is None else dedup_keys
+    keys = list(keys)
+    if dedup and dedup_keys is not None:
+        return keys, list(dict.fromkeys([*keys, *dedup_keys]))
+    return keys, keys
+
+
+def archive_files(
+    paths: Iterable[Path | str],
+    fdb: Any = None,
+    keys: Iterable[str] | None = None,
+    max_batch_bytes: int = DEFAULT_MAX_BATCH_BYTES,
+    dedup_index: Path | str | None = None,
+    dedup_keys: Iterable[str] | None = None,
+) -> ArchiveStats:
+    """
+    Archive the messages of GRIB files to FDB, grouped so that each database and index is written to in one go.
+
+    The headers of all messages are scanned first, then the messages are grouped by the values of the keys, by
+    default the first and second level keys of the schema used to archive, and archived with `archive_messages`.
+
+    With a dedup index file, messages already archived with the same content are skipped, eg. when retrying files
+    which were partially archived. Messages are identified by the grouping keys and the dedup keys, by default the
+    third level keys of the schema, and only added to the index once FDB was flushed.
+    """
+
+    if fdb is None:
+        import pyfdb
+
+        fdb = pyfdb.FDB()
+    keys, scan_keys = _scan_keys(keys, dedup_keys, dedup_index is not None)
+
+    files = [Path(p) for p in paths]
+
+    messages = [message for path in files for message in scan_grib_messages(path, scan_keys)]
+    with ExitStack() as stack:
+        dedup = stack.enter_context(DedupIndex(dedup_index)) if dedup_index is not None else None
+        stats = archive_messages(messages, fdb, keys, max_batch_bytes, dedup)
+        stats.files = len(files)
+        _logger.info(
+            "Archived %d messages of %d files in %d groups, skipped %d",
+            stats.messages, stats.files, stats.groups, stats.skipped,
+        )
+
+        fdb.flush()
+        if dedup is not None:
+            dedup.commit()
+    return stats
+
+
+# FDB handle of a worker process, reused by all the partitions it archives.
+_worker_fdb: Any = None
+
+
+def _scan_file(path: Path, keys: list[str]) -> list[GribMessage]:
+    return list(scan_grib_messages(path, keys))
+
+
+def _archive_partition(
+    messages: list[GribMessage], keys: list[str], max_batch_bytes: int, dedup_index: Path | None
+) -> tuple[ArchiveStats, dict[bytes, bytes]]:
+    global _worker_fdb  # pylint: disable=global-statement
+    if _worker_fdb is None:
+        import pyfdb
+
+        _worker_fdb = pyfdb.FDB()
+    # Workers only read the index, the messages they archived are returned to be committed by the parent.
+    with ExitStack() as stack:
+        dedup = stack.enter_context(DedupIndex(dedup_index, readonly=True)) if dedup_index is not None else None
+        stats = archive_messages(messages, _worker_fdb, keys, max_batch_bytes, dedup)
+        # Flush before reporting, so that the partition is only reported as archived once it is visible in FDB.
+        _worker_fdb.flush()
+        return stats, dedup.pending if dedup is not None else {}
+
+
+def archive_files_parallel(
+    paths: Iterable[Path | str],
+    workers: int = 4,
+    keys: Iterable[str] | None = None,
+    database_keys: Iterable[str] | None = None,
+    max_batch_bytes: int = DEFAULT_MAX_BATCH_BYTES,
+    dedup_index: Path | str | None = None,
+    dedup_keys: Iterable[str] | None = None,
+) -> ArchiveReport:
+    """
+    Archive the messages of GRIB files to FDB with several worker processes, each with its own FDB handle.
+
+    The messages are partitioned by database key, by default the first level keys of the schema, eg. per member, so
+    that no two workers write to the same database. Each partition is archived by a single worker, grouped as with
+    `archive_files`, and flushed before it is reported as archived. The headers of the files are scanned by the
+    workers as well. Returns a combined report, which lists the databases which failed to archive, and the files
+    which failed to be scanned, whose messages are not archived.
+
+    With a dedup index file, messages are skipped as with `archive_files`. The workers only read the index, and the
+    messages of the databases which were archived are added to it once all workers are done.
+    """
+
+    start = time.monotonic()
+
+    if database_keys is None:
+        database_keys = Schema.from_file(fdb_schema_path()).database_keys
+    database_keys = list(database_keys)
+    keys, scan_keys = _scan_keys(keys, dedup_keys, dedup_index is not None)
+    # The partitions must be known from the scanned keys.
+    scan_keys = list(dict.fromkeys([*database_keys, *scan_keys]))
+
+    if dedup_index is not None:
+        dedup_index = Path(dedup_index)
+        # Create the index, so that the workers can open it read-only.
+        DedupIndex(dedup_index).close()
+
+    files = [Path(p) for p in paths]
+    stats = ArchiveStats(files=len(files))
+    failed: dict[tuple[str, ...], str] = {}
+    failed_files: dict[str, str] = {}
+    archived: list[dict[bytes, bytes]] = []
+
+    # Processes are spawned, not forked, so that no FDB handle of the parent is inherited.
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        scans = [executor.submit(_scan_file, path, scan_keys) for path in files]
+        messages: list[GribMessage] = []
+        for path, scan in zip(files, scans):
+            error = scan.exception()
+            if error is not None:
+                _logger.error("Failed to read file %s: %s", path, error)
+                failed_files[str(path)] = str(error)
+            else:
+                messages += scan.result()
+        partitions = group_messages(messages, database_keys)
+        _logger.info("Archiving %d files to %d databases with %d workers", len(files), len(partitions), workers)
+
+        futures = {
+            database_key: executor.submit(_archive_partition, partition, keys, max_batch_bytes, dedup_index)
+            for database_key, partition in partitions.items()
+        }
+        for database_key, future in futures.items():
+            error = future.exception()
+            if error is not None:
+                _logger.error("Failed to archive database %s: %s", database_key, error)
+                failed[database_key] = str(error)
+            else:
+                partition_stats, pending = future.result()
+                stats.add(partition_stats)
+                archived.append(pending)
+
+    if dedup_index is not None:
+        with DedupIndex(dedup_index) as dedup:
+            for pending in archived:
+                dedup.commit(pending)
+
+    return ArchiveReport(stats, time.monotonic() - start, len(partitions), failed, failed_files)
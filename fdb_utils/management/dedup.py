@@ -0,0 +1,98 @@
+"""This module provides an on-disk index of the messages archived to FDB, to skip archiving them again on retries."""
+
+import dbm
+import logging
+import struct
+import zlib
+from collections.abc import Mapping
+from pathlib import Path
+
+from fdb_utils.schema import DEFAULT_TYPES
+from fdb_utils.user.request import normalize_value
+
+_logger = logging.getLogger(__name__)
+
+
+def content_hash(data: bytes | memoryview) -> bytes:
+    """Return a fast, non-cryptographic hash of the bytes of a message: its CRC-32, Adler-32 and length."""
+    return struct.pack('>IIQ', zlib.crc32(data), zlib.adler32(data), memoryview(data).nbytes)
+
+
+def message_key(metadata: Mapping[str, str]) -> bytes:
+    """Return the key of a message in the index, its MARS keys and values sorted by key, eg. b'date=20240601,...'."""
+    return ','.join(f"{k}={v}" for k, v in sorted(metadata.items())).encode()
+
+
+def _matches(key: bytes, selection: Mapping[str, str | int | float]) -> bool:
+    values = dict(pair.partition('=')[::2] for pair in key.decode().split(','))
+    return all(
+        k not in values or normalize_value(DEFAULT_TYPES.get(k, ''), values[k]) == v for k, v in selection.items()
+    )
+
+
+class DedupIndex:
+    """
+    Index of the content hash of the messages archived to FDB by their MARS keys, stored in a dbm file.
+
+    Messages are only added to the index once `commit` is called, which must be done after FDB was flushed, so that a
+    message is never skipped unless it is visible in FDB. Messages of forecasts wiped from FDB must be removed from
+    the index with `remove`, as `wipe_forecast` and `apply_retention` do, or they would not be archived again.
+    """
+
+    def __init__(self, path: Path | str, readonly: bool = False) -> None:
+        self.path = Path(path)
+        self._db = dbm.open(str(self.path), 'r' if readonly else 'c')
+        self._pending: dict[bytes, bytes] = {}
+
+    def is_archived(self, metadata: Mapping[str, str], data: bytes | memoryview) -> bool:
+        """
+        Return whether a message of the same key and content was already archived, otherwise mark it as pending.
+        """
+        key = message_key(metadata)
+        digest = content_hash(data)
+        if self._db.get(key) == digest:
+            return True
+        self._pending[key] = digest
+        return False
+
+    @property
+    def pending(self) -> dict[bytes, bytes]:
+        """The hash of the messages checked but not yet committed, by key."""
+        return self._pending
+
+    def commit(self, pending: Mapping[bytes, bytes] | None = None) -> int:
+        """Add the pending messages, or the given ones, eg. checked by another process, to the index."""
+        pending = self._pending if pending is None else pending
+        for key, digest in pending.items():
+            self._db[key] = digest
+        count = len(pending)
+        if hasattr(self._db, 'sync'):
+            self._db.sync()
+        self._pending = {}
+        _logger.debug("Added %d messages to the dedup index %s", count, self.path)
+        return count
+
+    def remove(self, **values: str) -> int:
+        """
+        Remove the messages matching all the values, eg. of a wiped forecast, from the index.
+
+        Values are compared by the type of their key, eg. time '600' matches '0600'. Messages not identified by one of
+        the keys, eg. model, are removed too, since they may belong to the wiped data.
+        """
+        selection = {k: normalize_value(DEFAULT_TYPES.get(k, ''), v) for k, v in values.items()}
+        keys = [key for key in self._db if _matches(key, selection)]
+        for key in keys:
+            del self._db[key]
+        return len(keys)
+
+    def __len__(self) -> int:
+        return len(self._db)
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __enter__(self) -> "DedupIndex":
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.close()
@@ -0,0 +1,265 @@
+"""This module provides the comparison of the fields archived to two FDBs, and the copy of fields between them."""
+
+import heapq
+import io
+import logging
+import multiprocessing
+import pickle
+import queue
+import tempfile
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, wait
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import ExitStack
+from dataclasses import dataclass
+from itertools import islice
+from multiprocessing.process import BaseProcess
+from pathlib import Path
+from typing import IO, Any
+
+from fdb_utils.fanout import config_executor, run_with_config
+from fdb_utils.user.retrieve import retrieve_to_stream
+
+_logger = logging.getLogger(__name__)
+
+# Full key of a field, its keys and values sorted by key, so that the fields of two FDBs can be ordered alike.
+FieldKey = tuple[tuple[str, str], ...]
+
+LEFT = 'left'
+RIGHT = 'right'
+BOTH = 'both'
+
+
+def field_key(keys: dict[str, str]) -> FieldKey:
+    return tuple(sorted(keys.items()))
+
+
+def _spill_run(keys: list[FieldKey], block_size: int) -> IO[bytes]:
+    run = tempfile.TemporaryFile()
+    keys.sort()
+    for start in range(0, len(keys), block_size):
+        pickle.dump(keys[start:start + block_size], run)
+    run.seek(0)
+    return run
+
+
+def _read_run(run: IO[bytes]) -> Iterator[FieldKey]:
+    while True:
+        try:
+            block = pickle.load(run)
+        except EOFError:
+            return
+        yield from block
+
+
+def external_sort(keys: Iterable[FieldKey], run_size: int, block_size: int) -> Iterator[FieldKey]:
+    """
+    Sort field keys holding at most run_size of them in memory at once.
+
+    The keys are sorted in runs of run_size keys, spilled to temporary files and merged, reading blocks of block_size
+    keys from each run. Keys fitting in a single run are sorted in memory.
+    """
+    keys = iter(keys)
+    with ExitStack() as stack:
+        runs: list[Iterator[FieldKey]] = []
+        while chunk := list(islice(keys, run_size)):
+            if not runs and len(chunk) < run_size:
+                yield from sorted(chunk)
+                return
+            runs.append(_read_run(stack.enter_context(_spill_run(chunk, block_size))))
+        yield from heapq.merge(*runs)
+
+
+def _list_sorted_into(request: dict, results: Any, batch_size: int, run_size: int) -> None:
+    # Runs in a process of its own, as the FDB listed depends on its config.
+    try:
+        import pyfdb
+
+        keys = external_sort((field_key(el['keys']) for el in pyfdb.list(request, False, True)), run_size, batch_size)
+        while batch := list(islice(keys, batch_size)):
+            results.put(batch)
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        results.put(f"{type(e).__name__}: {e}")
+    results.put(None)
+
+
+def _iter_batches(config_file: str, results: Any, process: BaseProcess) -> Iterator[FieldKey]:
+    try:
+        while True:
+            try:
+                batch = results.get(timeout=1)
+            except queue.Empty:
+                if not process.is_alive():
+                    raise RuntimeError(  # pylint: disable=raise-missing-from
+                        f"Listing of FDB with config {config_file} exited with code {process.exitcode}"
+                    )
+                continue
+            if batch is None:
+                return
+            if isinstance(batch, str):
+                raise RuntimeError(f"Listing of FDB with config {config_file} failed: {batch}")
+            yield from batch
+    finally:
+        if process.is_alive():
+            process.kill()
+        process.join()
+
+
+def list_sorted(
+    config_file: Path | str, request: dict, batch_size: int = 10000, max_batches: int = 8, run_size: int = 100000
+) -> Iterator[FieldKey]:
+    """
+    Start listing the FDB of the config file in a spawned process, and return an iterator over the sorted field keys.
+
+    The process sorts the keys of the fields matching the request with `external_sort`, holding at most run_size keys
+    in memory, then streams them in batches through a queue of at most max_batches batches, so the parent only holds
+    a few batches at a time. The listing starts right away, not when the iterator is first used, so that several FDBs
+    are listed concurrently.
+    """
+    config_file = str(config_file)
+    if not Path(config_file).exists():
+        raise RuntimeError(f"FDB config file does not exist: {config_file}")
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue(maxsize=max_batches)
+    process = context.Process(
+        target=run_with_config,
+        args=(config_file, _list_sorted_into, request, results, batch_size, run_size),
+        daemon=True,
+    )
+    process.start()
+    return _iter_batches(config_file, results, process)
+
+
+def merge_join(left: Iterable[FieldKey], right: Iterable[FieldKey]) -> Iterator[tuple[str, FieldKey]]:
+    """
+    Join two sorted iterables of field keys, yielding each key with the side it is found on, LEFT, RIGHT or BOTH.
+    """
+    left, right = iter(left), iter(right)
+    left_key, right_key = next(left, None), next(right, None)
+    while left_key is not None and right_key is not None:
+        if left_key < right_key:
+            yield LEFT, left_key
+            left_key = next(left, None)
+        elif right_key < left_key:
+            yield RIGHT, right_key
+            right_key = next(right, None)
+        else:
+            yield BOTH, left_key
+            left_key, right_key = next(left, None), next(right, None)
+    while left_key is not None:
+        yield LEFT, left_key
+        left_key = next(left, None)
+    while right_key is not None:
+        yield RIGHT, right_key
+        right_key = next(right, None)
+
+
+def diff_fdbs(
+    left_config: Path | str, right_config: Path | str, request: dict, batch_size: int = 10000
+) -> Iterator[tuple[str, dict[str, str]]]:
+    """
+    Compare the fields matching the request in the FDBs of two config files, yielding the keys of each field with the
+    side it is found on, LEFT, RIGHT or BOTH.
+
+    Both FDBs are listed concurrently in processes of their own, as the config of libFDB5 is global to a process, and
+    their sorted listings are joined on the full key of the fields, without loading either listing into the parent.
+    """
+    left = list_sorted(left_config, request, batch_size)
+    right = list_sorted(right_config, request, batch_size)
+    for side, key in merge_join(left, right):
+        yield side, dict(key)
+
+
+@dataclass
+class SyncStats:
+    fields: int = 0
+    bytes: int = 0
+    # Number of fields of the batches which failed to copy.
+    failed: int = 0
+
+
+# FDB handle of a worker process, reused by all the batches it copies.
+_worker_fdb: Any = None
+
+
+def _fdb() -> Any:
+    global _worker_fdb  # pylint: disable=global-statement
+    if _worker_fdb is None:
+        import pyfdb
+
+        _worker_fdb = pyfdb.FDB()
+    return _worker_fdb
+
+
+def _retrieve_fields(fields: list[dict[str, str]]) -> bytes:
+    buffer = io.BytesIO()
+    for field in fields:
+        if not retrieve_to_stream(field, buffer, fdb=_fdb()):
+            raise RuntimeError(f"No data retrieved for {field}")
+    return buffer.getvalue()
+
+
+def _archive_data(data: bytes) -> int:
+    fdb = _fdb()
+    fdb.archive(data)
+    fdb.flush()
+    return len(data)
+
+
+def sync_fields(
+    fields: Iterable[dict[str, str]],
+    source_config: Path | str,
+    target_config: Path | str,
+    workers: int = 4,
+    batch_size: int = 100,
+) -> SyncStats:
+    """
+    Copy the fields, given by their keys, from the FDB of the source config to the FDB of the target config.
+
+    Batches of fields are retrieved by a pool of processes using the source config and archived by a pool of processes
+    using the target config. At most two batches per worker are retrieved or archived at any time, so memory is
+    bounded however many fields are copied, and the fields are consumed as they are needed, eg. as they are found
+    missing by `diff_fdbs`. If a pool breaks, eg. a worker is killed, the fields not copied yet are counted as failed.
+    """
+
+    stats = SyncStats()
+    fields = iter(fields)
+    batches = iter(lambda: list(islice(fields, batch_size)), [])
+    pending: dict[Future, tuple[str, int]] = {}
+    broken = False
+
+    with config_executor(source_config, workers) as retrievers, config_executor(target_config, workers) as archivers:
+
+        def submit(executor: Executor, stage: str, func: Callable[[Any], Any], arg: Any, count: int) -> None:
+            nonlocal broken
+            try:
+                pending[executor.submit(func, arg)] = (stage, count)
+            except BrokenProcessPool as e:
+                _logger.error("Failed to %s a batch of %d fields: %s", stage, count, e)
+                stats.failed += count
+                broken = True
+
+        def submit_batches() -> None:
+            while not broken and len(pending) < 2 * workers and (batch := next(batches, None)):
+                submit(retrievers, 'retrieve', _retrieve_fields, batch, len(batch))
+
+        submit_batches()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, count = pending.pop(future)
+                error = future.exception()
+                if error is not None:
+                    _logger.error("Failed to %s a batch of %d fields: %s", stage, count, error)
+                    stats.failed += count
+                elif stage == 'retrieve':
+                    submit(archivers, 'archive', _archive_data, future.result(), count)
+                else:
+                    stats.fields += count
+                    stats.bytes += future.result()
+            submit_batches()
+
+    if broken:
+        stats.failed += sum(1 for _ in fields)
+    return stats
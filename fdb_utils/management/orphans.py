@@ -0,0 +1,121 @@
+"""This module provides a scan of an FDB root for unclean databases, with files not owned by their catalogue."""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from fdb_utils.fs_utils import _entry_size, get_directory_size
+from fdb_utils.schema import Schema, load_schema
+
+# Files of the catalogue of a database, always owned by it.
+CATALOGUE_FILES = ('toc', 'schema')
+SUB_TOC_PREFIX = 'toc.'
+# Lock files created on purpose by fdb-lock, to stop an operation on a database, eg. during maintenance.
+CONTROL_LOCKS = ('archive.lock', 'retrieve.lock', 'list.lock', 'wipe.lock')
+
+
+@dataclass
+class DatabaseScan:
+    """
+    Files of a database directory which are not owned by its catalogue, and leftover lock files.
+
+    A directory without TOC, or whose name does not match the schema, has no catalogue entry and all of it is
+    reclaimable. The control locks of fdb-lock are kept apart, as they do not make a database unclean.
+    """
+
+    name: str
+    key: dict[str, str] | None
+    has_toc: bool
+    size: int
+    # Bytes of each file or directory not referenced by the TOC or a sub-TOC, eg. data files of a failed archive.
+    orphaned: dict[str, int] = field(default_factory=dict)
+    locks: list[str] = field(default_factory=list)
+    control_locks: list[str] = field(default_factory=list)
+
+    @property
+    def owned(self) -> bool:
+        return self.has_toc and self.key is not None
+
+    @property
+    def clean(self) -> bool:
+        return self.owned and not self.orphaned and not self.locks
+
+    @property
+    def reclaimable(self) -> int:
+        return sum(self.orphaned.values()) if self.owned else self.size
+
+    def __str__(self) -> str:
+        if not self.has_toc:
+            return f"{self.name}: no TOC, {self.size} bytes reclaimable"
+        if self.key is None:
+            return f"{self.name}: does not match the schema, {self.size} bytes reclaimable"
+        issues = []
+        if self.orphaned:
+            issues.append(f"{len(self.orphaned)} orphaned files ({self.reclaimable} bytes): {sorted(self.orphaned)}")
+        if self.locks:
+            issues.append(f"lock files {sorted(self.locks)}")
+        if self.control_locks:
+            issues.append(f"locked for {', '.join(name.removesuffix('.lock') for name in sorted(self.control_locks))}")
+        return f"{self.name}: {', '.join(issues) if issues else 'clean'}"
+
+
+def _referenced_names(path: Path, names: set[str]) -> set[str]:
+    """
+    Return the names of the files referenced by the TOC of a database, or by the sub-TOCs it references.
+
+    The TOC records store the names of the index files, the data files of each index and the sub-TOCs as strings, so
+    they are found by searching the records for the names of the files of the directory, without decoding them.
+    """
+    referenced: set[str] = set()
+    tocs = ['toc']
+    while tocs:
+        with open(path / tocs.pop(), 'rb') as f:
+            records = f.read()
+        for name in names - referenced:
+            if name.encode() in records:
+                referenced.add(name)
+                if name.startswith(SUB_TOC_PREFIX):
+                    tocs.append(name)
+    return referenced
+
+
+def scan_database(path: Path, schema: Schema) -> DatabaseScan:
+    """Find the files of a database directory which are not owned by its catalogue, and its leftover lock files."""
+    with os.scandir(path) as it:
+        entries = {entry.name: entry for entry in it}
+
+    key = schema.parse_database_name(path.name)
+    if 'toc' not in entries or key is None:
+        return DatabaseScan(path.name, key, 'toc' in entries, get_directory_size(path))
+
+    scan = DatabaseScan(path.name, key, True, 0)
+    names = {name for name in entries if name not in CATALOGUE_FILES and not name.endswith('.lock')}
+    referenced = _referenced_names(path, names)
+    for name, entry in entries.items():
+        size = _entry_size(entry)
+        scan.size += size
+        if name in CONTROL_LOCKS:
+            scan.control_locks.append(name)
+        elif name.endswith('.lock'):
+            scan.locks.append(name)
+        elif name in names and name not in referenced:
+            scan.orphaned[name] = size
+    return scan
+
+
+def scan_root(fdb_root: Path | str, schema: Schema | None = None, max_workers: int = 8) -> list[DatabaseScan]:
+    """
+    Scan the database directories of the FDB root, at most max_workers at a time, for files not owned by them.
+
+    If no schema is given, the copy stored in the databases under the root is used.
+    """
+    fdb_root = Path(fdb_root)
+    if schema is None:
+        schema = load_schema(fdb_root)
+
+    with os.scandir(fdb_root) as it:
+        paths = sorted(Path(entry.path) for entry in it if entry.is_dir(follow_symlinks=False))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(lambda path: scan_database(path, schema), paths))
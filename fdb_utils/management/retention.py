@@ -0,0 +1,162 @@
+"""This module provides a retention engine which plans and runs the deletion of forecasts from FDB."""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from fdb_utils.fs_utils import SizeByKey, get_size_by_key
+from fdb_utils.management.dedup import DedupIndex
+from fdb_utils.management.wipe import forget_forecast, wipe_forecast
+from fdb_utils.user.describe import get_archived_forecasts_by_model
+
+_logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RetentionPolicy:
+    """The forecasts of a model to keep in FDB. Limits which are unset are not applied."""
+
+    # Keep only the most recent runs.
+    keep_last: int | None = None
+    # Wipe runs which started longer ago than this.
+    max_age: timedelta | None = None
+    # Wipe the oldest runs until the forecasts of the model take up at most this many bytes.
+    max_bytes: float | None = None
+    # Never wipe the oldest runs, eg. statically archived data.
+    protect_oldest: int = 0
+
+
+@dataclass(frozen=True)
+class WipeTarget:
+    model: str
+    forecast: datetime
+    reason: str
+
+
+def forecast_sizes_from(size_by_key: SizeByKey) -> dict[tuple[str, datetime], int]:
+    """Map the bytes used by each forecast under the FDB root to its model and forecast date and time."""
+    return {
+        (model, datetime.strptime(f"{date}:{time}", "%Y%m%d:%H%M")): size
+        for (model, date, time), size in size_by_key.per_forecast().items()
+        if date and time
+    }
+
+
+def plan_retention(
+    catalogue: dict[str, list[datetime]],
+    policies: dict[str, RetentionPolicy],
+    now: datetime,
+    forecast_sizes: dict[tuple[str, datetime], int] | None = None,
+) -> list[WipeTarget]:
+    """
+    Compute the forecasts to wipe from a snapshot of the catalogue, mapping each model to its archived forecasts.
+
+    Models without a policy are left untouched, as are forecasts archived without a model, whose wipe would match
+    the forecasts of every model. The sizes of the forecasts are only required for policies setting max_bytes.
+    """
+
+    plan = []
+
+    for model, forecasts in catalogue.items():
+        policy = policies.get(model)
+        if policy is None:
+            continue
+        if not model:
+            _logger.warning("Not wiping the %d forecasts archived without a model", len(forecasts))
+            continue
+
+        ordered = sorted(forecasts)
+        protected = ordered[:policy.protect_oldest]
+        kept = ordered[policy.protect_oldest:]
+
+        if policy.max_age is not None:
+            oldest_allowed = now - policy.max_age
+            plan += [WipeTarget(model, fc, f"older than {policy.max_age}") for fc in kept if fc < oldest_allowed]
+            kept = [fc for fc in kept if fc >= oldest_allowed]
+
+        if policy.keep_last is not None and len(kept) > policy.keep_last:
+            num_wiped = len(kept) - policy.keep_last
+            plan += [WipeTarget(model, fc, f"not in last {policy.keep_last} runs") for fc in kept[:num_wiped]]
+            kept = kept[num_wiped:]
+
+        if policy.max_bytes is not None:
+            if forecast_sizes is None:
+                raise ValueError(f"Forecast sizes are required to apply max_bytes to {model}.")
+            model_bytes = sum(forecast_sizes.get((model, fc), 0) for fc in protected + kept)
+            while kept and model_bytes > policy.max_bytes:
+                fc = kept.pop(0)
+                model_bytes -= forecast_sizes.get((model, fc), 0)
+                plan.append(WipeTarget(model, fc, f"larger than {policy.max_bytes:.0f} bytes"))
+
+    return plan
+
+
+def apply_retention(
+    plan: list[WipeTarget], dry_run: bool = False, max_workers: int = 4, dedup_index: Path | str | None = None
+) -> None:
+    """
+    Wipe the forecasts of the plan, running at most max_workers wipes at once.
+
+    The forecasts wiped are then removed from the dedup index of `archive_files`, if given, so that they are archived
+    again.
+    """
+
+    if dry_run:
+        for target in plan:
+            _logger.info("Would delete forecast %s of %s: %s", target.forecast, target.model, target.reason)
+        return
+
+    def wipe(target: WipeTarget) -> Exception | None:
+        try:
+            wipe_forecast(target.forecast, target.model)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            _logger.error("Failed to delete forecast %s of %s: %s", target.forecast, target.model, e)
+            return e
+        return None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        errors = list(executor.map(wipe, plan))
+
+    if dedup_index is not None:
+        # The index is only updated here, as it is not safe to write from several threads.
+        with DedupIndex(dedup_index) as dedup:
+            for target, error in zip(plan, errors):
+                if error is None:
+                    forget_forecast(dedup, target.forecast, target.model)
+
+    failed = [target for target, error in zip(plan, errors) if error is not None]
+    if failed:
+        raise RuntimeError(f"Failed to delete {len(failed)} of {len(plan)} forecasts: {failed}")
+
+
+def run_retention(
+    policy: RetentionPolicy,
+    model: str = "",
+    fdb_root: Path | str | None = None,
+    dry_run: bool = False,
+    max_workers: int = 4,
+    dedup_index: Path | str | None = None,
+) -> list[WipeTarget]:
+    """
+    Apply the retention policy to the given model, or to each model archived in FDB.
+
+    FDB is listed once and the plan is computed from this snapshot. The root directory of FDB is required to apply
+    max_bytes.
+    """
+
+    catalogue = get_archived_forecasts_by_model()
+    policies = {m: policy for m in catalogue if not model or m == model}
+
+    forecast_sizes = None
+    if policy.max_bytes is not None:
+        if fdb_root is None:
+            raise ValueError("The FDB root directory is required to apply a size limit.")
+        forecast_sizes = forecast_sizes_from(get_size_by_key(fdb_root))
+
+    # Forecast date and times in FDB are in UTC.
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    plan = plan_retention(catalogue, policies, now, forecast_sizes)
+    apply_retention(plan, dry_run=dry_run, max_workers=max_workers, dedup_index=dedup_index)
+    return plan
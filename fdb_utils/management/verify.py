@@ -0,0 +1,149 @@
+"""This module provides a check of the integrity of the data files of the databases of a local FDB."""
+
+import logging
+import mmap
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from fdb_utils.grib_utils import grib_message_bounds
+
+_logger = logging.getLogger(__name__)
+
+# Errors reported per database, a corrupt database would otherwise report one error per field.
+MAX_ERRORS = 100
+
+
+@dataclass
+class DatabaseReport:
+    """Result of the check of a database, with the errors found in its data files and index entries."""
+
+    path: Path
+    files: int = 0
+    messages: int = 0
+    bytes: int = 0
+    # Number of index entries checked against the data files.
+    entries: int = 0
+    errors: list[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def add_error(self, error: str) -> None:
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(error)
+
+    def __str__(self) -> str:
+        summary = (
+            f"{self.path.name}: {self.messages} messages ({self.bytes} bytes) in {self.files} data files, "
+            f"{self.entries} index entries"
+        )
+        if self.ok:
+            return f"OK {summary}"
+        return f"FAILED {summary}, {len(self.errors)} errors:\n  " + "\n  ".join(self.errors)
+
+
+def check_data_file(path: Path) -> tuple[set[tuple[int, int]], int, str | None]:
+    """
+    Check the framing of the GRIB messages of a data file, from their lengths and end markers, without decoding them.
+
+    FDB appends the messages to its data files back to back, so any bytes between or after the messages, eg. a hole
+    of zeros left by a failed write, are an error as well. Returns the (offset, length) of each message found, the
+    number of bytes they span, and the first error found in the file, if any.
+    """
+    messages: set[tuple[int, int]] = set()
+    size = 0
+    error = None
+    file_size = os.path.getsize(path)
+    if not file_size:
+        return messages, size, error
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        # The files are read front to back, let the kernel read ahead.
+        mm.madvise(mmap.MADV_SEQUENTIAL)
+        offset = 0
+        try:
+            for start, end in grib_message_bounds(mm):
+                if start != offset and error is None:
+                    error = f"{start - offset} bytes at offset {offset} are not part of a GRIB message"
+                messages.add((start, end - start))
+                size += end - start
+                offset = end
+        except ValueError as e:
+            return messages, size, error or str(e)
+    if offset != file_size and error is None:
+        error = f"{file_size - offset} bytes at offset {offset} are not part of a GRIB message"
+    return messages, size, error
+
+
+def verify_database(path: Path, db_key: dict[str, str] | None = None) -> DatabaseReport:
+    """
+    Check the data files of a database, and that each entry of its indexes points to a complete GRIB message.
+
+    The index entries are listed with the key of the database, and are not checked if no key is given.
+    """
+    report = DatabaseReport(path)
+    data_files: dict[str, set[tuple[int, int]]] = {}
+
+    with os.scandir(path) as it:
+        data_paths = sorted(Path(entry.path) for entry in it if entry.name.endswith('.data'))
+
+    for data_path in data_paths:
+        messages, size, error = check_data_file(data_path)
+        data_files[str(data_path)] = messages
+        report.files += 1
+        report.messages += len(messages)
+        report.bytes += size
+        if error is not None:
+            report.add_error(f"{data_path.name}: {error}")
+
+    if db_key is None:
+        return report
+
+    import pyfdb
+
+    for el in pyfdb.list(db_key, False, True):
+        report.entries += 1
+        location = f"{Path(el['path']).name} at offset {el['offset']}"
+        if el['path'] not in data_files:
+            if not os.path.exists(el['path']):
+                report.add_error(f"Index entry {el['keys']} points to the missing data file {location}")
+                continue
+            # Data files outside of the database directory, eg. of a sub-TOC, are checked as they are found.
+            messages, _, error = check_data_file(Path(el['path']))
+            data_files[el['path']] = messages
+            if error is not None:
+                report.add_error(f"{el['path']}: {error}")
+        if (el['offset'], el['length']) not in data_files[el['path']]:
+            report.add_error(
+                f"Index entry {el['keys']} points to {location}, which is not a complete GRIB message of "
+                f"{el['length']} bytes"
+            )
+    return report
+
+
+def verify_databases(
+    databases: list[tuple[Path, dict[str, str] | None]], workers: int | None = None
+) -> list[DatabaseReport]:
+    """
+    Check the databases, given by their path and key, concurrently with a pool of processes, one database each.
+
+    Returns the report of each database, in order. A database which cannot be checked at all is reported with the
+    error raised.
+    """
+    reports = []
+    # Processes are spawned, not forked, so that no FDB handle of the parent is inherited.
+    with ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count(), mp_context=multiprocessing.get_context('spawn')
+    ) as executor:
+        futures = [executor.submit(verify_database, path, db_key) for path, db_key in databases]
+        for (path, _), future in zip(databases, futures):
+            error = future.exception()
+            if error is not None:
+                _logger.error("Failed to check database %s: %s", path, error)
+                reports.append(DatabaseReport(path, errors=[f"Failed to check the database: {error}"]))
+            else:
+                reports.append(future.result())
+    return reports
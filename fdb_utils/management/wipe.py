@@ -6,10 +6,14 @@ import subprocess
 from datetime import datetime
 from pathlib import Path
 
+from fdb_utils.management.dedup import DedupIndex
+
 _logger = logging.getLogger(__name__)
 
 
-def wipe_fdb(forecasts: list[datetime], exception: int = 0, model: str = "") -> None:
+def wipe_fdb(
+    forecasts: list[datetime], exception: int = 0, model: str = "", dedup_index: Path | str | None = None
+) -> None:
     """
     Delete oldest forecast stored in FDB.
     To ignore statically archived data (the oldest forecast), set exception = 1 else 0
@@ -25,8 +29,19 @@ def wipe_fdb(forecasts: list[datetime], exception: int = 0, model: str = "") ->
 
     forecasts.sort()
 
-    to_delete_date = forecasts[exception].strftime("%Y%m%d")
-    to_delete_time = forecasts[exception].strftime("%H%M")
+    wipe_forecast(forecasts[exception], model, dedup_index)
+
+
+def wipe_forecast(forecast: datetime, model: str = "", dedup_index: Path | str | None = None) -> None:
+    """
+    Delete a single forecast stored in FDB, optionally only for the given model.
+
+    The messages of the forecast are also removed from the dedup index of `archive_files`, if given, so that they are
+    archived again.
+    """
+
+    to_delete_date = forecast.strftime("%Y%m%d")
+    to_delete_time = forecast.strftime("%H%M")
     wipe_filter = f"date={to_delete_date},time={to_delete_time}"
     if model:
         wipe_filter += f",model={model}"
@@ -44,3 +59,18 @@ def wipe_fdb(forecasts: list[datetime], exception: int = 0, model: str = "") ->
         [fdb_wipe_exe, "--doit", "--unsafe-wipe-all", "--minimum-keys=", wipe_filter],
         check=True,
     )
+
+    if dedup_index is not None:
+        with DedupIndex(dedup_index) as dedup:
+            forget_forecast(dedup, forecast, model)
+
+
+def forget_forecast(dedup: DedupIndex, forecast: datetime, model: str = "") -> int:
+    """Remove the messages of a wiped forecast, optionally only of the given model, from the dedup index."""
+
+    values = {'date': forecast.strftime("%Y%m%d"), 'time': forecast.strftime("%H%M")}
+    if model:
+        values['model'] = model
+    removed = dedup.remove(**values)
+    _logger.info("Removed %d messages of forecast %s from the dedup index %s", removed, forecast, dedup.path)
+    return removed
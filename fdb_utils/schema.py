@@ -0,0 +1,198 @@
+"""This module provides a parser for FDB schema files."""
+
+import os
+import re
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from pathlib import Path
+
+_TOKEN_RE = re.compile(r"\[|\]|,|;|[^\s\[\],;]+")
+# Types of the keys listed by FDB, as declared by the default schema.
+DEFAULT_TYPES: dict[str, str] = {
+    'param': 'Param',
+    'step': 'Step',
+    'date': 'Date',
+    'levelist': 'Double',
+    'expver': 'Expver',
+    'time': 'Time',
+    'number': 'Integer',
+}
+
+_KEY_RE = re.compile(
+    r"(?P<name>[\w.]+)(?:\?(?P<default>[^=:]*))?(?P<removed>-)?(?:=(?P<values>[^:]*))?(?::(?P<type>\w+))?"
+)
+
+
+@dataclass
+class SchemaKey:
+    name: str
+    optional: bool = False
+    default: str = ""
+    removed: bool = False
+    # Values the key must take for the rule to match, any value matches if empty.
+    values: tuple[str, ...] = ()
+    # Type declared in the context of the rule, overriding the global type.
+    type: str = ""
+
+    def matches(self, value: str) -> bool:
+        return not self.values or value in self.values
+
+
+@dataclass
+class Rule:
+    keys: list[SchemaKey]
+    rules: list["Rule"] = field(default_factory=list)
+
+    @property
+    def names(self) -> list[str]:
+        return [k.name for k in self.keys]
+
+
+@dataclass
+class Schema:
+    """
+    Types and rules of an FDB schema.
+
+    The keys of the first level of the rules name the database directories under the FDB root, the keys of the second
+    level name the data and index files and the keys of the third level are the index keys.
+    """
+
+    types: dict[str, str]
+    rules: list[Rule]
+
+    @classmethod
+    def from_string(cls, text: str) -> "Schema":
+        tokens = _TOKEN_RE.findall(re.sub(r"#.*", "", text))
+        types: dict[str, str] = {}
+        rules: list[Rule] = []
+        pos = 0
+        while pos < len(tokens):
+            if tokens[pos] == '[':
+                rule, pos = _parse_rule(tokens, pos)
+                rules.append(rule)
+            else:
+                # Global type declaration, eg. 'param: Param;'.
+                end = tokens.index(';', pos)
+                name, _, key_type = "".join(tokens[pos:end]).partition(':')
+                types[name] = key_type
+                pos = end + 1
+        return cls(types, rules)
+
+    @classmethod
+    def from_file(cls, path: Path | str) -> "Schema":
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_string(f.read())
+
+    def key_type(self, name: str) -> str:
+        return self.types.get(name, "")
+
+    @property
+    def database_keys(self) -> list[str]:
+        """The keys of the first level of the first rule, used when archiving."""
+        return self.rules[0].names if self.rules else []
+
+    @property
+    def index_keys(self) -> list[str]:
+        """The keys of the second level of the first rule, naming the indexes of a database."""
+        return list(dict.fromkeys(k for rule in self.rules[0].rules for k in rule.names)) if self.rules else []
+
+    @property
+    def datum_keys(self) -> list[str]:
+        """The keys of the third level of the first rule, identifying a message within an index."""
+        if not self.rules:
+            return []
+        return list(dict.fromkeys(k for index in self.rules[0].rules for rule in index.rules for k in rule.names))
+
+    def parse_database_name(self, name: str) -> dict[str, str] | None:
+        """Map the name of a database directory back to its key, or return None if no rule matches."""
+        match = match_rules(self.rules, name)
+        return match[1] if match else None
+
+    def match_database_name(self, name: str) -> tuple[Rule, dict[str, str]] | None:
+        """Return the first level rule matching the name of a database directory, and the key of the database."""
+        return match_rules(self.rules, name)
+
+    def level_of(self, name: str) -> int:
+        """Return the first level of the rules, starting at 1, at which the key is defined, or 0 if it is unknown."""
+        rules = self.rules
+        for level in (1, 2, 3):
+            if any(name in rule.names for rule in rules):
+                return level
+            rules = [sub_rule for rule in rules for sub_rule in rule.rules]
+        return 0
+
+
+def match_rules(rules: list[Rule], name: str) -> tuple[Rule, dict[str, str]] | None:
+    """Match the values of a file or directory name, separated by ':', against the keys of the rules."""
+    values = name.split(':')
+    for rule in rules:
+        if len(rule.keys) == len(values) and all(k.matches(v) for k, v in zip(rule.keys, values)):
+            return rule, dict(zip(rule.names, values))
+    return None
+
+
+def _parse_rule(tokens: list[str], pos: int) -> tuple[Rule, int]:
+    """Parse the rule starting with the '[' at tokens[pos], returning it and the position after its ']'."""
+    rule = Rule(keys=[])
+    pos += 1
+    while tokens[pos] != ']':
+        if tokens[pos] == '[':
+            sub_rule, pos = _parse_rule(tokens, pos)
+            rule.rules.append(sub_rule)
+        elif tokens[pos] == ',':
+            pos += 1
+        else:
+            rule.keys.append(_parse_key(tokens[pos]))
+            pos += 1
+    return rule, pos + 1
+
+
+def _parse_key(token: str) -> SchemaKey:
+    match = _KEY_RE.fullmatch(token)
+    if match is None:
+        raise ValueError(f"Invalid key in FDB schema: {token}")
+    return SchemaKey(
+        name=match['name'],
+        optional=match['default'] is not None,
+        default=match['default'] or "",
+        removed=match['removed'] is not None,
+        values=tuple(match['values'].split('/')) if match['values'] else (),
+        type=match['type'] or "",
+    )
+
+
+def load_schema(fdb_root: Path | str) -> Schema:
+    """Load the schema from the copy FDB keeps in each database directory under the root."""
+    with os.scandir(fdb_root) as it:
+        for entry in it:
+            schema_path = Path(entry.path) / 'schema'
+            if entry.is_dir() and schema_path.exists():
+                return Schema.from_file(schema_path)
+    raise RuntimeError(f"No database with a schema found under FDB root {fdb_root}")
+
+
+def _decode_double(value: str) -> int | float:
+    number = float(value)
+    return int(number) if number.is_integer() else number
+
+
+def decode_values(key_type: str, values: Iterable[str]) -> set[str | int | float]:
+    """
+    Convert the raw values of a key listed by FDB according to the type of the key in the schema.
+
+    Integer values are converted to int and Double values to int if they are integral and float otherwise. Values of
+    other types, eg. Date or Step, are kept as strings as FDB formats them canonically.
+    """
+    if key_type == 'Integer':
+        return set(map(int, values))
+    if key_type == 'Double':
+        return set(map(_decode_double, values))
+    return set(values)
+
+
+def sorted_values(values: Iterable[str | int | float]) -> list[str | int | float]:
+    """Sort decoded values by value, eg. levelist 2 before 10, or as strings if they mix numbers and strings."""
+    try:
+        return sorted(values)
+    except TypeError:
+        return sorted(values, key=str)
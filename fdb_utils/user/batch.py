@@ -0,0 +1,188 @@
+"""This module provides the listing of many filter requests in one process, sharing the scans of FDB between them."""
+
+import json
+import logging
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+from typing import TextIO
+
+from fdb_utils.schema import DEFAULT_TYPES, decode_values, sorted_values
+from fdb_utils.user.catalogue import TocCatalogue
+from fdb_utils.user.describe import list_entries
+from fdb_utils.user.request import normalize_value, parse_filter, request_size
+
+_logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BatchRequest:
+    """A request of a batch, with the keys to list the distinct values of, all keys if empty."""
+
+    id: str
+    request: dict[str, str | list[str]] = field(default_factory=dict)
+    keys: list[str] = field(default_factory=list)
+    # Error found when parsing the request, it is then not listed.
+    error: str = ''
+
+
+@dataclass
+class BatchResult:
+    id: str
+    values: dict[str, set[str]] = field(default_factory=dict)
+    entries: int = 0
+    error: str = ''
+
+
+def read_batch(
+    lines: Iterable[str], key_types: dict[str, str] | None = None, max_request_size: int | None = None
+) -> list[BatchRequest]:
+    """
+    Read the requests of a batch, one JSON object per line, eg. {"id": "eps", "filter": "date=...", "show": "step"}.
+
+    The filter has the syntax of the --filter option of the CLI, and show is a comma separated string or a list of
+    keys. The id defaults to the line number. Invalid requests, and requests expanding to more combinations of values
+    than max_request_size, are returned with an error instead of failing the whole batch.
+    """
+
+    requests = []
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        batch_request = BatchRequest(id=str(number))
+        try:
+            obj = json.loads(line)
+            if not isinstance(obj, dict):
+                raise ValueError("A request must be a JSON object")
+            batch_request.id = str(obj.get('id', number))
+            if not obj.get('filter'):
+                raise ValueError("A request must have a filter")
+            if not isinstance(obj['filter'], str):
+                raise ValueError("The filter must be a string")
+            batch_request.request = parse_filter(obj['filter'], key_types)
+            show = obj.get('show', [])
+            if isinstance(show, str):
+                show = show.split(',') if show else []
+            if not isinstance(show, list) or not all(isinstance(k, str) for k in show):
+                raise ValueError("show must be a comma separated string or a list of keys")
+            batch_request.keys = show
+            if max_request_size is not None and (size := request_size(batch_request.request)) > max_request_size:
+                raise ValueError(f"The filter expands to {size} combinations of values, more than {max_request_size}")
+        except ValueError as e:
+            batch_request.error = f"Invalid request on line {number}: {e}"
+        requests.append(batch_request)
+    return requests
+
+
+def _values(value: str | list[str]) -> list[str]:
+    return value if isinstance(value, list) else [value]
+
+
+def _merge(request: dict, other: dict) -> dict:
+    return {k: list(dict.fromkeys([*_values(v), *_values(other[k])])) for k, v in request.items()}
+
+
+def merge_requests(requests: list[dict[str, str | list[str]]]) -> list[tuple[dict[str, list[str]], list[int]]]:
+    """
+    Merge requests into shared scans, returning each scan request with the positions of the requests it answers.
+
+    Requests filtering on the same keys are merged as long as the merged request expands to no more combinations of
+    values than the requests on their own, eg. requests differing only in the values of one key. Merging requests
+    differing in several keys would list the combinations of values none of them asked for.
+    """
+
+    scans: list[tuple[dict[str, list[str]], list[int], int]] = []
+    for position, request in enumerate(requests):
+        size = request_size(request)
+        for i, (scan, positions, scan_size) in enumerate(scans):
+            if scan.keys() != request.keys():
+                continue
+            merged = _merge(scan, request)
+            if request_size(merged) <= scan_size + size:
+                scans[i] = (merged, positions + [position], scan_size + size)
+                break
+        else:
+            scans.append(({k: _values(v) for k, v in request.items()}, [position], size))
+    return [(scan, positions) for scan, positions, _ in scans]
+
+
+class _Matcher:
+    """Match listed entries against a request, comparing values as FDB formats them, eg. time '6' and '0600'."""
+
+    def __init__(self, request: dict[str, str | list[str]], key_types: dict[str, str]) -> None:
+        self.key_types = key_types
+        self.values = {k: {normalize_value(key_types.get(k, ''), v) for v in _values(v)} for k, v in request.items()}
+
+    def matches(self, keys: dict[str, str]) -> bool:
+        return all(
+            k in keys and normalize_value(self.key_types.get(k, ''), keys[k]) in values
+            for k, values in self.values.items()
+        )
+
+
+def run_batch(
+    requests: list[BatchRequest], catalogue: TocCatalogue | None = None
+) -> Iterator[tuple[int, BatchResult]]:
+    """
+    List the distinct values of the keys of each request, yielding the position of each request with its result.
+
+    Requests are merged into shared scans with `merge_requests`, and the entries of each scan are matched against the
+    requests it answers. Results are yielded as the scans complete, failed scans with the error for each request.
+    """
+
+    key_types = catalogue.schema.types if catalogue is not None else DEFAULT_TYPES
+    valid = [i for i, r in enumerate(requests) if not r.error]
+    for i, r in enumerate(requests):
+        if r.error:
+            yield i, BatchResult(r.id, error=r.error)
+
+    scans = merge_requests([requests[i].request for i in valid])
+    _logger.debug("Listing %d requests in %d scans", len(valid), len(scans))
+
+    for scan, positions in scans:
+        scan_requests = [requests[valid[p]] for p in positions]
+        results = [BatchResult(r.id, values={k: set() for k in r.keys}) for r in scan_requests]
+        # A single request is listed as is, there is nothing to match its entries against.
+        matchers = [_Matcher(r.request, key_types) for r in scan_requests] if len(scan_requests) > 1 else []
+        # The listing is only as deep as required by all requests, a request without keys lists all keys.
+        keys: list[str] = []
+        if all(r.keys for r in scan_requests):
+            keys = list(dict.fromkeys(k for r in scan_requests for k in r.keys))
+        try:
+            for el in list_entries(*keys, catalogue=catalogue, **scan):
+                entry_keys = el['keys']
+                for j, result in enumerate(results):
+                    if matchers and not matchers[j].matches(entry_keys):
+                        continue
+                    result.entries += 1
+                    for k in scan_requests[j].keys or entry_keys:
+                        if k in entry_keys:
+                            result.values.setdefault(k, set()).add(entry_keys[k])
+        except (RuntimeError, ValueError) as e:
+            _logger.debug("Failed to list %s: %s", scan, e)
+            results = [BatchResult(r.id, error=str(e)) for r in scan_requests]
+
+        for p, result in zip(positions, results):
+            yield valid[p], result
+
+
+def write_batch_results(
+    results: Iterable[tuple[int, BatchResult]], stream: TextIO, key_types: dict[str, str] | None = None
+) -> int:
+    """
+    Write one JSON object per line and request to the stream, in the order of the requests. Returns the number of
+    failed requests.
+    """
+
+    key_types = DEFAULT_TYPES if key_types is None else key_types
+    by_position = dict(results)
+    failed = 0
+    for position in sorted(by_position):
+        result = by_position[position]
+        if result.error:
+            failed += 1
+            stream.write(json.dumps({'id': result.id, 'error': result.error}) + '\n')
+            continue
+        values = {k: sorted_values(decode_values(key_types.get(k, ''), values)) for k, values in result.values.items()}
+        stream.write(json.dumps({'id': result.id, 'entries': result.entries, 'values': values}) + '\n')
+    stream.flush()
+    return failed
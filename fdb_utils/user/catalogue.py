@@ -0,0 +1,164 @@
+"""This module provides a read-only listing backend for a local FDB with the TOC engine."""
+
+import os
+import time
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+
+from fdb_utils.env import fdb_roots, fdb_schema_path, load_fdb_config
+from fdb_utils.schema import Rule, Schema, match_rules
+
+
+def canonical_value(key_type: str, value: str) -> str:
+    """Convert a request value to the form FDB uses in the names of its files, eg. time '6' -> '0600'."""
+    if not value.isdigit():
+        return value
+    if key_type == 'Time':
+        return f"{value}00".zfill(4) if len(value) <= 2 else value.zfill(4)
+    if key_type == 'Integer':
+        return str(int(value))
+    return value
+
+
+class DatabaseIndex:
+    """
+    Index of the database directories under an FDB root by the values of their first level keys.
+
+    The root is only scanned again when its modification time changes, which happens when databases are created or
+    wiped, and only the names of new directories are parsed.
+    """
+
+    # Modification times this close to the scan may hide a later change within the resolution of the filesystem.
+    MTIME_RESOLUTION_NS = 1_000_000_000
+
+    def __init__(self, root: Path, schema: Schema) -> None:
+        self.root = root
+        self.schema = schema
+        self._mtime_ns: int | None = None
+        self._databases: dict[str, tuple[Rule, dict[str, str]]] = {}
+        self._names_by_value: dict[str, dict[str, set[str]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._databases)
+
+    def refresh(self) -> None:
+        scan_start_ns = time.time_ns()
+        mtime_ns = os.stat(self.root).st_mtime_ns
+        if mtime_ns == self._mtime_ns:
+            return
+
+        with os.scandir(self.root) as it:
+            names = {entry.name for entry in it if entry.is_dir()}
+
+        for name in self._databases.keys() - names:
+            _, key = self._databases.pop(name)
+            for k, v in key.items():
+                self._names_by_value[k][v].discard(name)
+
+        for name in names - self._databases.keys():
+            match = self.schema.match_database_name(name)
+            if match is None:
+                continue
+            self._databases[name] = match
+            for k, v in match[1].items():
+                self._names_by_value.setdefault(k, {}).setdefault(v, set()).add(name)
+
+        self._mtime_ns = mtime_ns if scan_start_ns - mtime_ns > self.MTIME_RESOLUTION_NS else None
+
+    def lookup(self, request_values: dict[str, set[str]]) -> Iterator[tuple[Path, Rule, dict[str, str]]]:
+        """Yield the path, rule and key of the databases matching the request values of their keys."""
+        self.refresh()
+
+        candidates: set[str] | None = None
+        for k in sorted(request_values.keys() & self._names_by_value.keys()):
+            by_value = self._names_by_value[k]
+            names = set().union(*(by_value.get(v, set()) for v in request_values[k]))
+            candidates = names if candidates is None else candidates & names
+            if not candidates:
+                return
+
+        for name in sorted(self._databases if candidates is None else candidates):
+            rule, key = self._databases[name]
+            if all(key[k] in values for k, values in request_values.items() if k in key):
+                yield self.root / name, rule, key
+
+
+class TocCatalogue:
+    """
+    Read-only listing of a local FDB with the TOC engine.
+
+    The database directories are named after the values of the first level keys of the schema, and the index files
+    are prefixed with the values of the second level keys. Listings of these keys are answered from the names of the
+    directories and files alone. Deeper listings only open the databases matching the request, each with the request
+    pinned to the full key of the database. The databases are found through an index of the database directories
+    of each root, kept up to date as databases are created and wiped.
+    """
+
+    def __init__(self, roots: list[Path], schema: Schema) -> None:
+        self.roots = roots
+        self.schema = schema
+        self._indexes = [DatabaseIndex(root, schema) for root in roots]
+
+    @classmethod
+    def from_config(cls) -> "TocCatalogue":
+        config = load_fdb_config()
+        return cls(fdb_roots(config), Schema.from_file(fdb_schema_path(config)))
+
+    def depth(self, keys: Iterable[str]) -> int:
+        """Return the level of the schema to list to know the values of all the keys."""
+        return max((self.schema.level_of(k) or 3 for k in keys), default=3)
+
+    def _request_values(self, request: dict) -> dict[str, set[str]]:
+        values = {}
+        for key, value in request.items():
+            key_values = value if isinstance(value, (list, tuple, set)) else str(value).split('/')
+            values[key] = {canonical_value(self.schema.key_type(key), str(v)) for v in key_values}
+        return values
+
+    @staticmethod
+    def _matches(key: dict[str, str], request_values: dict[str, set[str]]) -> bool:
+        return all(key[k] in values for k, values in request_values.items() if k in key)
+
+    def _database_entries(self, request_values: dict[str, set[str]]) -> Iterator[tuple[Path, Rule, dict[str, str]]]:
+        for index in self._indexes:
+            yield from index.lookup(request_values)
+
+    def databases(self, request: dict | None = None) -> list[tuple[Path, dict[str, str]]]:
+        """Return the path and key of the databases matching the first level keys of the request."""
+        request_values = self._request_values(request or {})
+        return [(path, key) for path, _, key in self._database_entries(request_values)]
+
+    def _index_keys(self, path: Path, rule: Rule) -> set[tuple[tuple[str, str], ...]]:
+        keys = set()
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.name.endswith('.index'):
+                    match = match_rules(rule.rules, entry.name.split('.', 1)[0])
+                    if match is not None:
+                        keys.add(tuple(match[1].items()))
+        return keys
+
+    def list(self, request: dict | None = None, depth: int = 3) -> Iterator[dict]:
+        """
+        List the entries matching the request, in the form returned by `pyfdb.list` with keys.
+
+        Entries of the first (databases) and second (indexes) level only contain the keys of these levels.
+        """
+        request = request or {}
+        request_values = self._request_values(request)
+
+        if depth >= 3:
+            import pyfdb
+
+            for _, db_key in self.databases(request):
+                yield from pyfdb.list(request | db_key, True, True)
+            return
+
+        for path, rule, db_key in self._database_entries(request_values):
+            if depth == 1:
+                yield {'keys': db_key}
+                continue
+            for index_key in self._index_keys(path, rule):
+                key = db_key | dict(index_key)
+                if self._matches(key, request_values):
+                    yield {'keys': key}
@@ -0,0 +1,190 @@
+"""This module provides a check of the completeness of the data archived to FDB against an expected hypercube."""
+
+import logging
+import math
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+
+from fdb_utils.schema import DEFAULT_TYPES
+from fdb_utils.user.catalogue import TocCatalogue
+from fdb_utils.user.describe import list_entries
+from fdb_utils.user.request import normalize_value
+
+_logger = logging.getLogger(__name__)
+
+
+def compress_ranges(values: Iterable[int]) -> list[tuple[int, int]]:
+    """Encode sorted integers as a list of inclusive (first, last) runs, eg. [0, 1, 2, 5] -> [(0, 2), (5, 5)]."""
+    ranges: list[tuple[int, int]] = []
+    for value in values:
+        if ranges and ranges[-1][1] == value - 1:
+            ranges[-1] = (ranges[-1][0], value)
+        else:
+            ranges.append((value, value))
+    return ranges
+
+
+# Ranges of positions along each axis of a hypercube, the cells of a block being their cartesian product.
+Block = tuple[tuple[tuple[int, int], ...], ...]
+
+
+def compress_cells(cells: list[tuple[int, ...]]) -> list[Block]:
+    """
+    Encode sorted cells of a hypercube, given by their position along each axis, as blocks of ranges of positions.
+
+    The cells are grouped by their position along the first axis, and the positions sharing the same cells along the
+    other axes, compressed recursively, are merged into ranges. Eg. the steps 3 to 5 missing for members 1 to 10 are
+    encoded as the single block ((1, 10),), ((3, 5),).
+    """
+    if not cells:
+        return []
+    if len(cells[0]) == 1:
+        return [(tuple(compress_ranges(cell[0] for cell in cells)),)]
+
+    tails: dict[int, list[tuple[int, ...]]] = {}
+    for cell in cells:
+        tails.setdefault(cell[0], []).append(cell[1:])
+
+    heads_by_blocks: dict[tuple[Block, ...], list[int]] = {}
+    for head, head_tails in tails.items():
+        heads_by_blocks.setdefault(tuple(compress_cells(head_tails)), []).append(head)
+
+    return [
+        (tuple(compress_ranges(heads)), *block) for blocks, heads in heads_by_blocks.items() for block in blocks
+    ]
+
+
+@dataclass
+class Hypercube:
+    """Expected values of each key, in order, eg. {'number': ['0', ..., '10'], 'step': ['0', ..., '33']}."""
+
+    axes: dict[str, list[str]]
+
+    @property
+    def shape(self) -> tuple[int, ...]:
+        return tuple(len(values) for values in self.axes.values())
+
+    @property
+    def size(self) -> int:
+        return math.prod(self.shape)
+
+    def flat_index(self, position: tuple[int, ...]) -> int:
+        index = 0
+        for axis_position, length in zip(position, self.shape):
+            index = index * length + axis_position
+        return index
+
+    def position(self, index: int) -> tuple[int, ...]:
+        position = []
+        for length in reversed(self.shape):
+            index, axis_position = divmod(index, length)
+            position.append(axis_position)
+        return tuple(reversed(position))
+
+
+@dataclass
+class MissingBlock:
+    """Block of missing cells, given by ranges of the expected values of each key."""
+
+    ranges: dict[str, list[tuple[str, str]]]
+    size: int
+
+    def __str__(self) -> str:
+        return " ".join(
+            f"{key}={','.join(first if first == last else f'{first}-{last}' for first, last in ranges)}"
+            for key, ranges in self.ranges.items()
+        )
+
+
+@dataclass
+class Completeness:
+    """Cells of a hypercube found in FDB, by their index in the flattened hypercube."""
+
+    cube: Hypercube
+    present: set[int] = field(default_factory=set)
+
+    @property
+    def missing(self) -> list[int]:
+        """Sorted indexes of the missing cells, the difference between the expected and the present cells."""
+        return sorted(set(range(self.cube.size)).difference(self.present))
+
+    @property
+    def complete(self) -> bool:
+        return len(self.present) == self.cube.size
+
+    def missing_blocks(self) -> list[MissingBlock]:
+        """Return the missing cells compressed into blocks of ranges of values, with `compress_cells`."""
+        values = list(self.cube.axes.values())
+        blocks = []
+        for block in compress_cells([self.cube.position(index) for index in self.missing]):
+            ranges = {
+                key: [(values[axis][first], values[axis][last]) for first, last in axis_ranges]
+                for axis, (key, axis_ranges) in enumerate(zip(self.cube.axes, block))
+            }
+            size = math.prod(sum(last - first + 1 for first, last in axis_ranges) for axis_ranges in block)
+            blocks.append(MissingBlock(ranges, size))
+        return blocks
+
+    def missing_request(self) -> dict[str, list[str]]:
+        """Return the smallest request of the values of each key covering all missing cells."""
+        positions: list[set[int]] = [set() for _ in self.cube.axes]
+        for index in self.missing:
+            for axis, axis_position in enumerate(self.cube.position(index)):
+                positions[axis].add(axis_position)
+        return {
+            key: [values[p] for p in sorted(axis_positions)]
+            for (key, values), axis_positions in zip(self.cube.axes.items(), positions)
+        }
+
+
+def _unique_values(key_type: str, values: list[str]) -> list[str]:
+    # Values normalizing alike, eg. time '6' and '0600', are a single cell of the hypercube.
+    unique: dict[str | int | float, str] = {}
+    for value in values:
+        unique.setdefault(normalize_value(key_type, value), value)
+    return list(unique.values())
+
+
+def check_completeness(
+    expected: dict[str, str | list[str]],
+    catalogue: TocCatalogue | None = None,
+    status: Completeness | None = None,
+    **filter_by_values: str | list[str],
+) -> Completeness:
+    """
+    Check which cells of the expected hypercube, eg. param x levelist x step x number, are archived to FDB.
+
+    The cells are searched for with a single listing filtered by the values, eg. date and time, and the expected
+    values of each key. With the status of a previous check, only the cells still missing are searched for, with the
+    values of each key which still have missing cells.
+    """
+
+    key_types = catalogue.schema.types if catalogue is not None else DEFAULT_TYPES
+    if status is None:
+        axes = {
+            key: _unique_values(key_types.get(key, ''), values if isinstance(values, list) else [values])
+            for key, values in expected.items()
+        }
+        status = Completeness(Hypercube(axes))
+    elif status.complete:
+        return status
+
+    request = status.missing_request() if status.present else status.cube.axes
+    positions = {
+        key: {normalize_value(key_types.get(key, ''), value): i for i, value in enumerate(values)}
+        for key, values in status.cube.axes.items()
+    }
+    _logger.debug("Searching for %d missing cells with %s", status.cube.size - len(status.present), request)
+
+    for el in list_entries(*status.cube.axes, catalogue=catalogue, **(filter_by_values | request)):
+        keys = el['keys']
+        position = []
+        for key, key_positions in positions.items():
+            axis_position = key_positions.get(normalize_value(key_types.get(key, ''), keys.get(key, '')))
+            if axis_position is None:
+                break
+            position.append(axis_position)
+        else:
+            status.present.add(status.cube.flat_index(tuple(position)))
+
+    return status
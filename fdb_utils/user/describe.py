@@ -1,7 +1,19 @@
 """This module provides a function for descriing data within FDB."""
 
 import logging
+import os
+import subprocess
+import threading
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from itertools import islice
+from pathlib import Path
+
+from fdb_utils.fanout import fan_out
+from fdb_utils.schema import DEFAULT_TYPES, decode_values
+from fdb_utils.user.catalogue import TocCatalogue
+from fdb_utils.user.stats import KeyStats, collect_stats
 
 _logger = logging.getLogger(__name__)
 
@@ -13,7 +25,127 @@ def _validate_filter(filter_by_values: dict) -> None:
             raise RuntimeError(f"Key {k} must be one of '{', '.join(SCHEMA_KEYS)}'")
 
 
-def list_all_values(*filter_keys: str, **filter_by_values: str) -> dict[str, set[str | int]]:
+def collect_distinct_values(
+    entries: Iterable[dict], keys: Iterable[str] = (), batch_size: int = 10000
+) -> dict[str, set[str]]:
+    """
+    Collect the distinct raw values of the keys of listed entries, or of all their keys if none are given.
+
+    Entries are consumed in batches, and the values of each key are gathered column by column over the batch. The
+    result is empty if there are no entries.
+    """
+    keys = tuple(keys)
+    raw_values: dict[str, set[str]] = {}
+    it = iter(entries)
+    while batch := [el['keys'] for el in islice(it, batch_size)]:
+        if not raw_values:
+            raw_values = {key: set() for key in keys}
+        if keys:
+            for key in keys:
+                raw_values[key].update(k[key] for k in batch if key in k)
+        else:
+            for key in dict.fromkeys(key for k in batch for key in k):
+                raw_values.setdefault(key, set()).update(k[key] for k in batch if key in k)
+    return raw_values
+
+
+def list_entries(
+    *filter_keys: str, catalogue: TocCatalogue | None = None, **filter_by_values: str | list[str]
+) -> Iterator[dict]:
+    """
+    Iterate over the entries in FDB matching the filter values, in the form returned by `pyfdb.list` with keys.
+
+    With a catalogue and filter keys, the listing only goes as deep in the schema as required by the keys.
+    """
+
+    import pyfdb
+
+    if not filter_by_values:
+        request = {}
+    else:
+        _validate_filter(filter_by_values)
+        request = filter_by_values
+
+    if catalogue is None:
+        return pyfdb.list(request, True, True)
+
+    depth = catalogue.depth([*filter_keys, *request]) if filter_keys else 3
+    return catalogue.list(request, depth)
+
+
+def merge_values(results: Iterable[dict[str, set]]) -> dict[str, set]:
+    """Merge the distinct values of the keys returned by several queries, keeping the order of the keys."""
+    merged: dict[str, set] = {}
+    for result in results:
+        for key, values in result.items():
+            merged.setdefault(key, set()).update(values)
+    return merged
+
+
+def collect_distinct_values_parallel(
+    request: dict, databases: Iterable[dict[str, str]], keys: Iterable[str] = (), workers: int = 4
+) -> dict[str, set[str]]:
+    """
+    Collect the distinct raw values of the keys of the entries matching the request, listing each database separately.
+
+    The databases, given by their keys, are listed concurrently by a pool of threads, each with its own FDB handle.
+    The distinct values of each database are collected by the thread listing it and merged as they complete.
+    """
+
+    import pyfdb
+
+    keys = tuple(keys)
+    local = threading.local()
+
+    def list_database(db_key: dict[str, str]) -> dict[str, set[str]]:
+        if not hasattr(local, 'fdb'):
+            local.fdb = pyfdb.FDB()
+        return collect_distinct_values(local.fdb.list(request | db_key, True, True), keys)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return merge_values(executor.map(list_database, databases))
+
+
+def get_all_values(
+    *filter_keys: str, catalogue: TocCatalogue | None = None, workers: int = 1, **filter_by_values: str | list[str]
+) -> dict[str, set[str | int | float]]:
+    """
+    Return the distinct values of the keys in FDB, filtered by values, as `list_all_values` without printing them.
+
+    With several workers, the databases matching the filter are found first and then listed concurrently.
+    """
+
+    key_types = catalogue.schema.types if catalogue is not None else DEFAULT_TYPES
+
+    # Listings of the first and second level keys only read names from the catalogue, there is nothing to split.
+    names_only = catalogue is not None and filter_keys and catalogue.depth([*filter_keys, *filter_by_values]) < 3
+
+    if workers > 1 and not names_only:
+        if filter_by_values:
+            _validate_filter(filter_by_values)
+        if catalogue is not None:
+            databases = [db_key for _, db_key in catalogue.databases(filter_by_values)]
+        else:
+            databases = list_databases(filter_by_values)
+        raw_values = collect_distinct_values_parallel(filter_by_values, databases, filter_keys, workers)
+    else:
+        entries = list_entries(*filter_keys, catalogue=catalogue, **filter_by_values)
+        raw_values = collect_distinct_values(entries, filter_keys)
+
+    return {key: decode_values(key_types.get(key, ''), values) for key, values in raw_values.items()}
+
+
+def _check_configs(configs: Iterable[str] | None, catalogue: TocCatalogue | None) -> list[str]:
+    configs = list(configs or [])
+    if configs and catalogue is not None:
+        raise ValueError("A catalogue reads a single FDB, it cannot be combined with several FDB configs.")
+    return configs
+
+
+def list_all_values(
+    *filter_keys: str, catalogue: TocCatalogue | None = None, configs: Iterable[str] | None = None, workers: int = 1,
+    **filter_by_values: str | list[str]
+) -> dict[str, set[str | int | float]]:
     """
     Print and return values from FDB, filtered by specified keys and values.
 
@@ -27,9 +159,18 @@ def list_all_values(*filter_keys: str, **filter_by_values: str) -> dict[str, set
     filter_keys : str
         Argument list of schema dimensions to filter the results by. 
         If no keys are provided, all keys are included.
-    filter_by_values : str
+    filter_by_values : str | list[str]
         Keyword arguments specifying key-value pairs to filter the results.
+        A list of values matches any of them.
         If no filter values are provided, all entries are included.
+    catalogue : TocCatalogue, optional
+        Read-only listing backend for a local FDB. Only the databases matching the request are opened, and listings
+        of first and second level keys are answered without opening any database.
+    configs : list[str], optional
+        FDB config files. If given, the FDB of each config is queried concurrently in a process of its own, instead
+        of the FDB of the environment, and the values found in all of them are merged.
+    workers : int, optional
+        Number of databases listed concurrently. By default the databases are listed one after the other.
 
     Returns:
     --------
@@ -43,35 +184,24 @@ def list_all_values(*filter_keys: str, **filter_by_values: str) -> dict[str, set
 
     """
 
-    import pyfdb
+    configs = _check_configs(configs, catalogue)
 
     filter_values_msg = f" for {filter_by_values}" if filter_by_values else ''
+    configs_msg = f" of {len(configs)} FDB configs" if configs else ''
 
     if filter_keys:
-        print(f"Keys/Values of {', '.join(filter_keys)} in FDB{filter_values_msg}:")
+        print(f"Keys/Values of {', '.join(filter_keys)} in FDB{configs_msg}{filter_values_msg}:")
     else:
-        print(f"Keys/Values in FDB{filter_values_msg}:")
+        print(f"Keys/Values in FDB{configs_msg}{filter_values_msg}:")
 
-    if not filter_by_values:
-        request = {}
+    if configs:
+        result = merge_values(
+            fan_out(
+                get_all_values, configs, *filter_keys, max_workers=None, workers=workers, **filter_by_values
+            ).values()
+        )
     else:
-        _validate_filter(filter_by_values)
-        request = filter_by_values
-
-    result: dict[str, set[str | int]] = {}
-
-    for el in pyfdb.list(request, True, True):
-        if not filter_keys:
-            for key in el['keys']:
-                if not key in result:
-                    result[key] = set()
-                result[key].add(el['keys'][key] if key not in ('number, levelist') else int(el['keys'][key]))
-        else:
-            for key in filter_keys:
-                if not key in result:
-                    result[key] = set()
-                if key in el['keys']:
-                    result[key].add(el['keys'][key] if key not in ('number, levelist') else int(el['keys'][key]))
+        result = get_all_values(*filter_keys, catalogue=catalogue, workers=workers, **filter_by_values)
 
     for requested_key in filter_keys:
         if requested_key not in result:
@@ -88,29 +218,145 @@ def list_all_values(*filter_keys: str, **filter_by_values: str) -> dict[str, set
     return result
 
 
+def get_counts(
+    *filter_keys: str, pairs: Iterable[tuple[str, str]] = (), approximate: bool = False,
+    catalogue: TocCatalogue | None = None, **filter_by_values: str | list[str]
+) -> KeyStats:
+    """Count the entries in FDB for each value of the keys and pairs of keys, as `count_values` without printing."""
+
+    pairs = tuple(pairs)
+    keys = tuple(dict.fromkeys([*filter_keys, *(k for pair in pairs for k in pair)])) if filter_keys else ()
+    entries = list_entries(*keys, catalogue=catalogue, **filter_by_values)
+
+    return collect_stats(entries, filter_keys, pairs, approximate=approximate)
+
+
+def count_values(
+    *filter_keys: str, pairs: Iterable[tuple[str, str]] = (), approximate: bool = False,
+    catalogue: TocCatalogue | None = None, configs: Iterable[str] | None = None, **filter_by_values: str | list[str]
+) -> KeyStats:
+    """
+    Print and return the number of entries in FDB for each value of the keys and pairs of keys, in a single pass.
+
+    With approximate, the distinct values of each key and pair of keys, and the distinct entries, are only counted
+    approximately with HyperLogLog sketches, so that full archive scans use a bounded amount of memory. With configs,
+    the FDB of each config file is counted concurrently in a process of its own and the counts are merged.
+
+    Example:
+    --------
+    >>> count_values('step', 'param', pairs=[('step', 'param')], date='20240202')
+
+    """
+
+    configs = _check_configs(configs, catalogue)
+
+    filter_values_msg = f" for {filter_by_values}" if filter_by_values else ''
+    configs_msg = f" of {len(configs)} FDB configs" if configs else ''
+    print(f"Counts in FDB{configs_msg}{filter_values_msg}:")
+
+    if configs:
+        stats = KeyStats(approximate=approximate)
+        for config_stats in fan_out(
+            get_counts, configs, *filter_keys, max_workers=None, pairs=tuple(pairs), approximate=approximate,
+            **filter_by_values
+        ).values():
+            stats.merge(config_stats)
+    else:
+        stats = get_counts(
+            *filter_keys, pairs=pairs, approximate=approximate, catalogue=catalogue, **filter_by_values
+        )
+
+    if not stats.entries:
+        print('No metadata found matching your request.')
+        print('')
+        return stats
+
+    if stats.fields is not None:
+        print(f'entries: {stats.entries} (~{len(stats.fields)} distinct)')
+    else:
+        print(f'entries: {stats.entries}')
+
+    for key in stats.keys:
+        if approximate:
+            print(f'{key}: ~{stats.cardinality(key)} values')
+            continue
+        print(f'{key}: {stats.cardinality(key)} values')
+        for value, count in sorted(stats.values[key].items()):
+            print(f'  {value}: {count}')
+
+    for pair in stats.key_pairs:
+        if approximate:
+            print(f'{pair[0]}/{pair[1]}: ~{stats.cardinality(pair)} combinations')
+            continue
+        print(f'{pair[0]}/{pair[1]}: {stats.cardinality(pair)} combinations')
+        for (a, b), count in sorted(stats.pairs[pair].items()):
+            print(f'  {a}/{b}: {count}')
+
+    print('')
+    return stats
+
+
+def _format_request(request: dict) -> str:
+    """Format a request as expected by the FDB command line tools, eg. 'date=20240202,number=1/2'."""
+    return ','.join(f"{k}={'/'.join(v) if isinstance(v, (list, tuple)) else v}" for k, v in request.items())
+
+
+def _parse_porcelain_key(line: str) -> dict[str, str]:
+    """Parse a line of `fdb-list --porcelain` output, eg. '{date=20240202,time=0300}{levtype=sfc}'."""
+    return dict(
+        pair.split('=', 1)
+        for level in line.strip().strip('{}').split('}{')
+        for pair in level.split(',')
+        if pair
+    )
+
+
+def list_databases(request: dict | None = None) -> list[dict[str, str]]:
+    """
+    List the keys of the databases in FDB matching the request.
+
+    Only the first level of the schema is listed, so the indexes of the databases are not read.
+    """
+
+    # Depth limited listing is not available in the Python API so use the CLI.
+    fdb_list_exe = f"{os.environ['FDB5_HOME']}/bin/fdb-list"
+
+    if not Path(fdb_list_exe).exists():
+        raise RuntimeError(f"fdb list executable does not exist: {fdb_list_exe}")
+
+    command = [fdb_list_exe, '--depth=1', '--porcelain', '--minimum-keys=']
+    command.append(_format_request(request) if request else '--all')
+
+    output = subprocess.run(command, stdout=subprocess.PIPE, check=True)
+
+    return [
+        _parse_porcelain_key(line)
+        for line in output.stdout.decode('utf-8').splitlines()
+        if line.startswith('{')
+    ]
+
+
+def _parse_forecast_datetimes(datetime_keys: set[tuple[str, str]]) -> dict[tuple[str, str], datetime]:
+    # fromisoformat parses the basic ISO format of the FDB date and time keys much faster than strptime.
+    return {(date, time): datetime.fromisoformat(f"{date}T{time}") for date, time in datetime_keys}
+
 
 def get_archived_forecasts(request: dict | None = None) -> list[datetime]:
     """Check the forecast date and times which are currently archived in FDB."""
 
-    import pyfdb
+    datetime_keys = {(db['date'], db['time']) for db in list_databases(request)}
+
+    return sorted(_parse_forecast_datetimes(datetime_keys).values())
 
-    # reduce the size of the request so that it takes less time.
-    if not request:
-        request = {
-            'levtype': 'sfc',
-            'step': '0',
-            'number': '1'
-        }
 
-    datetime_keys = {
-        f"{el['keys']['date']}:{el['keys']['time']}"
-        for el in pyfdb.list(request, True, True)
-    }
+def get_archived_forecasts_by_model(request: dict | None = None) -> dict[str, list[datetime]]:
+    """Check the forecast date and times of each model which are currently archived in FDB, using a single listing."""
 
-    fc_datetimes = []
+    forecast_keys = {(db.get('model', ''), db['date'], db['time']) for db in list_databases(request)}
+    fc_datetimes = _parse_forecast_datetimes({(date, time) for _, date, time in forecast_keys})
 
-    for datetime_key in datetime_keys:
-        dt = datetime.strptime(datetime_key, "%Y%m%d:%H%M")
-        fc_datetimes.append(dt)
+    by_model: dict[str, list[datetime]] = {}
+    for model, date, time in forecast_keys:
+        by_model.setdefault(model, []).append(fc_datetimes[(date, time)])
 
-    return sorted(fc_datetimes)
+    return {model: sorted(forecasts) for model, forecasts in sorted(by_model.items())}
@@ -0,0 +1,164 @@
+"""This module provides writers streaming the results of FDB listings in machine-readable formats."""
+
+import csv
+import json
+import tempfile
+from collections.abc import Iterable
+from typing import TextIO
+
+from fdb_utils.schema import DEFAULT_TYPES, decode_values, sorted_values
+
+FORMATS = ('text', 'json', 'ndjson', 'csv', 'columnar')
+
+
+class EntryWriter:
+    """
+    Write listed entries to a stream as they arrive, without keeping them in memory.
+
+    Formats:
+    - text: one 'key=value,...' line per entry.
+    - json: a JSON array of entries.
+    - ndjson: one JSON object per line and entry.
+    - csv: a header with the given keys, then one row per entry. Without keys, the header is the union of the keys of
+      all entries, eg. levelist only found in the entries of model levels, so the rows are spooled to a temporary file
+      until the listing is complete.
+    - columnar: one JSON object per line and batch of entries, mapping each key to the column of its values.
+    """
+
+    def __init__(self, stream: TextIO, fmt: str, keys: Iterable[str] = (), batch_size: int = 10000) -> None:
+        if fmt not in FORMATS:
+            raise ValueError(f"Format {fmt} must be one of '{', '.join(FORMATS)}'")
+        self.stream = stream
+        self.fmt = fmt
+        self.keys = list(keys)
+        self.batch_size = batch_size
+        self.count = 0
+        self._csv_writer: csv.DictWriter | None = None
+        self._batch: list[dict[str, str]] = []
+        self._columns: dict[str, None] = {}
+        self._spool: TextIO | None = None
+
+    def write(self, keys: dict[str, str]) -> None:
+        if self.keys:
+            keys = {k: keys.get(k, '') for k in self.keys}
+
+        if self.fmt == 'text':
+            self.stream.write(','.join(f'{k}={v}' for k, v in keys.items()) + '\n')
+        elif self.fmt == 'json':
+            self.stream.write(('[\n' if not self.count else ',\n') + json.dumps(keys))
+        elif self.fmt == 'ndjson':
+            self.stream.write(json.dumps(keys) + '\n')
+        elif self.fmt == 'csv' and self.keys:
+            if self._csv_writer is None:
+                self._csv_writer = csv.DictWriter(self.stream, fieldnames=self.keys)
+                self._csv_writer.writeheader()
+            self._csv_writer.writerow(keys)
+        elif self.fmt == 'csv':
+            if self._spool is None:
+                self._spool = tempfile.TemporaryFile('w+', encoding='utf-8')  # pylint: disable=consider-using-with
+            self._columns.update(dict.fromkeys(keys))
+            self._spool.write(json.dumps(keys) + '\n')
+        else:
+            self._batch.append(keys)
+            if len(self._batch) >= self.batch_size:
+                self._write_batch()
+
+        self.count += 1
+
+    def _write_batch(self) -> None:
+        columns: dict[str, list[str]] = {}
+        for keys in self._batch:
+            for k in keys:
+                columns.setdefault(k, [])
+        for keys in self._batch:
+            for k, column in columns.items():
+                column.append(keys.get(k, ''))
+        self.stream.write(json.dumps(columns) + '\n')
+        self._batch = []
+
+    def _write_spooled_rows(self) -> None:
+        writer = csv.DictWriter(self.stream, fieldnames=list(self._columns))
+        writer.writeheader()
+        if self._spool is None:
+            return
+        with self._spool:
+            self._spool.seek(0)
+            for line in self._spool:
+                writer.writerow(json.loads(line))
+        self._spool = None
+
+    def close(self) -> None:
+        if self.fmt == 'json':
+            self.stream.write('[]\n' if not self.count else '\n]\n')
+        elif self.fmt == 'columnar' and self._batch:
+            self._write_batch()
+        elif self.fmt == 'csv' and not self.keys:
+            self._write_spooled_rows()
+        self.stream.flush()
+
+
+class DistinctValueWriter:
+    """
+    Write the distinct values of each key of listed entries to a stream.
+
+    With the ndjson and csv formats each value is written as soon as it is first seen. With the text, json and
+    columnar formats, the sorted values of each key are written once the listing is complete. Only the distinct values
+    are kept in memory.
+    """
+
+    def __init__(self, stream: TextIO, fmt: str, keys: Iterable[str] = (),
+                 key_types: dict[str, str] | None = None) -> None:
+        if fmt not in FORMATS:
+            raise ValueError(f"Format {fmt} must be one of '{', '.join(FORMATS)}'")
+        self.stream = stream
+        self.fmt = fmt
+        self.keys = list(keys)
+        self.key_types = DEFAULT_TYPES if key_types is None else key_types
+        self.values: dict[str, set[str]] = {k: set() for k in self.keys}
+        self._csv_writer = csv.writer(stream) if fmt == 'csv' else None
+        if self._csv_writer is not None:
+            self._csv_writer.writerow(['key', 'value'])
+
+    def write(self, keys: dict[str, str]) -> None:
+        for k in self.keys or keys:
+            if k not in keys:
+                continue
+            values = self.values.setdefault(k, set())
+            if keys[k] in values:
+                continue
+            values.add(keys[k])
+            value = next(iter(decode_values(self.key_types.get(k, ''), [keys[k]])))
+            if self.fmt == 'ndjson':
+                self.stream.write(json.dumps({'key': k, 'value': value}) + '\n')
+            elif self._csv_writer is not None:
+                self._csv_writer.writerow([k, value])
+
+    def close(self) -> None:
+        result = {
+            k: sorted_values(decode_values(self.key_types.get(k, ''), values)) for k, values in self.values.items()
+        }
+        if self.fmt == 'text':
+            for k, values in result.items():
+                self.stream.write(f"{k}: {', '.join(str(v) for v in values)}\n")
+        elif self.fmt in ('json', 'columnar'):
+            self.stream.write(json.dumps(result) + '\n')
+        self.stream.flush()
+
+
+def write_listing(
+    entries: Iterable[dict], stream: TextIO, fmt: str, keys: Iterable[str] = (), distinct: bool = True,
+    key_types: dict[str, str] | None = None
+) -> int:
+    """Stream the keys of the listed entries, or their distinct values, to the stream. Returns the number of entries."""
+    writer: EntryWriter | DistinctValueWriter
+    if distinct:
+        writer = DistinctValueWriter(stream, fmt, keys, key_types)
+    else:
+        writer = EntryWriter(stream, fmt, keys)
+
+    count = 0
+    for el in entries:
+        writer.write(el['keys'])
+        count += 1
+    writer.close()
+    return count
@@ -0,0 +1,92 @@
+"""This module provides the parsing of MARS-style filters into requests FDB can narrow listings with."""
+
+import functools
+import math
+from datetime import datetime, timedelta
+
+from fdb_utils.schema import DEFAULT_TYPES, decode_values
+from fdb_utils.user.catalogue import canonical_value
+
+
+def _expand_range(key_type: str, start: str, end: str, by: str | None) -> list[str]:
+    if key_type == 'Date':
+        first = datetime.strptime(start, '%Y%m%d')
+        last = datetime.strptime(end, '%Y%m%d')
+        step = timedelta(days=int(by or 1))
+        fmt = '%Y%m%d'
+    elif key_type == 'Time':
+        first = datetime.strptime(canonical_value(key_type, start), '%H%M')
+        last = datetime.strptime(canonical_value(key_type, end), '%H%M')
+        step = timedelta(hours=int(by or 1))
+        fmt = '%H%M'
+    else:
+        if not (start.lstrip('-').isdigit() and end.lstrip('-').isdigit() and (by is None or by.isdigit())):
+            raise ValueError(f"Range {start}/to/{end} must be of integers, dates or times")
+        return [str(v) for v in range(int(start), int(end) + 1, int(by or 1))]
+
+    if step <= timedelta(0):
+        raise ValueError(f"Increment of range {start}/to/{end} must be positive, got {by}")
+
+    values = []
+    value = first
+    while value <= last:
+        values.append(value.strftime(fmt))
+        value += step
+    return values
+
+
+def parse_values(key: str, text: str, key_types: dict[str, str] | None = None) -> str | list[str]:
+    """
+    Parse the values of a key in a filter, eg. '1', '1/2/3', '0/to/48' or '20240601/to/20240607/by/2'.
+
+    Ranges of dates are expanded by days, ranges of times by hours and other ranges by integer increments, 1 unless
+    given with 'by'. A single value is returned as is, several values as a list.
+    """
+    key_type = (DEFAULT_TYPES if key_types is None else key_types).get(key, '')
+    parts = text.split('/')
+    if '' in parts:
+        raise ValueError(f"Invalid values of {key}: {text}")
+
+    values: list[str] = []
+    pos = 0
+    while pos < len(parts):
+        if pos + 2 < len(parts) and parts[pos + 1].lower() == 'to':
+            by = None
+            end = pos + 3
+            if end + 1 < len(parts) and parts[end].lower() == 'by':
+                by = parts[end + 1]
+                end += 2
+            values += _expand_range(key_type, parts[pos], parts[pos + 2], by)
+            pos = end
+        elif parts[pos].lower() in ('to', 'by'):
+            raise ValueError(f"Invalid range of {key}: {text}")
+        else:
+            values.append(parts[pos])
+            pos += 1
+
+    values = list(dict.fromkeys(values))
+    return values[0] if len(values) == 1 else values
+
+
+def parse_filter(text: str, key_types: dict[str, str] | None = None) -> dict[str, str | list[str]]:
+    """Parse a filter of comma separated 'key=values' pairs, eg. 'date=20240601/to/20240607,number=1/2/3'."""
+    request: dict[str, str | list[str]] = {}
+    if not text:
+        return request
+    for pair in text.split(','):
+        key, sep, values = pair.partition('=')
+        if not sep or not key or not values:
+            raise ValueError(f"Filter {pair} must be of the form 'key=values'")
+        request[key] = parse_values(key, values, key_types)
+    return request
+
+
+def request_size(request: dict[str, str | list[str]]) -> int:
+    """Return the number of combinations of values in the request, which FDB expands the request into."""
+    return math.prod(len(v) if isinstance(v, list) else 1 for v in request.values())
+
+
+@functools.lru_cache(maxsize=65536)
+def normalize_value(key_type: str, value: str) -> str | int | float:
+    """Return a value of a filter or of a listing in a form comparable between both, eg. time '6' and '0600'."""
+    return next(iter(decode_values(key_type, [canonical_value(key_type, value)])))
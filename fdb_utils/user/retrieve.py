@@ -0,0 +1,143 @@
+"""This module provides functions for retrieving data from FDB in fixed-size chunks."""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, BinaryIO
+
+from fdb_utils.user.describe import get_all_values
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 16 * 1024 ** 2
+
+
+class DataReader:
+    """
+    Stream of the data retrieved from FDB for a request, read directly into buffers supplied by the caller.
+
+    Unlike `pyfdb.retrieve`, which allocates a new bytearray on each read, `readinto` hands the buffer to libFDB5 so
+    the data is copied once, from FDB into the buffer.
+    """
+
+    def __init__(self, request: dict, fdb: Any = None) -> None:
+        import pyfdb
+
+        if fdb is None:
+            fdb = pyfdb.FDB()
+
+        self._lib = pyfdb.lib
+        self._ffi = pyfdb.ffi
+        dataread = self._ffi.new("fdb_datareader_t **")
+        self._lib.fdb_new_datareader(dataread)
+        self._dataread = self._ffi.gc(dataread[0], self._lib.fdb_delete_datareader)
+
+        fdb_request = pyfdb.Request(request)
+        fdb_request.expand()
+        self._lib.fdb_retrieve(fdb.ctype, fdb_request.ctype, self._dataread)
+        self._lib.fdb_datareader_open(self._dataread, self._ffi.NULL)
+
+    def readinto(self, buffer: memoryview | bytearray) -> int:
+        """Read at most len(buffer) bytes into the buffer, returning the number of bytes read, 0 at the end."""
+        if not buffer:
+            return 0
+        read = self._ffi.new("long*")
+        self._lib.fdb_datareader_read(self._dataread, self._ffi.from_buffer(buffer), len(buffer), read)
+        return read[0]
+
+    def close(self) -> None:
+        self._lib.fdb_datareader_close(self._dataread)
+
+    def __enter__(self) -> "DataReader":
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.close()
+
+
+def retrieve_into(request: dict, buffer: memoryview | bytearray, fdb: Any = None) -> int:
+    """
+    Retrieve the data matching the request into the buffer, returning the number of bytes retrieved.
+
+    Raises RuntimeError if the data does not fit into the buffer.
+    """
+    view = memoryview(buffer).cast('B')
+    total = 0
+    with DataReader(request, fdb) as reader:
+        while total < len(view) and (read := reader.readinto(view[total:])):
+            total += read
+        if total == len(view) and reader.readinto(bytearray(1)):
+            raise RuntimeError(f"Data retrieved for {request} does not fit into a buffer of {len(view)} bytes")
+    return total
+
+
+def retrieve_to_stream(
+    request: dict, stream: BinaryIO, chunk_size: int = DEFAULT_CHUNK_SIZE, fdb: Any = None
+) -> int:
+    """
+    Retrieve the data matching the request into the stream, eg. a file, returning the number of bytes written.
+
+    The data is read in chunks into a single buffer of chunk_size bytes, so at most one chunk is held in memory.
+    """
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    total = 0
+    with DataReader(request, fdb) as reader:
+        while read := reader.readinto(view):
+            written = 0
+            while written < read:
+                written += stream.write(view[written:read])
+            total += read
+    return total
+
+
+def retrieve_to_file(request: dict, path: Path | str, chunk_size: int = DEFAULT_CHUNK_SIZE, fdb: Any = None) -> int:
+    """Retrieve the data matching the request into a file, returning the number of bytes written."""
+    # Unbuffered, as the chunks are written whole and a buffer would only copy them once more.
+    with open(path, 'wb', buffering=0) as f:
+        return retrieve_to_stream(request, f, chunk_size, fdb)
+
+
+def split_path(path: Path, key: str, value: str) -> Path:
+    """Return the path of the part of a split retrieval, eg. 'fc.grib' -> 'fc_number_1.grib'."""
+    return path.with_name(f"{path.stem}_{key}_{value}{path.suffix}")
+
+
+def retrieve_split(
+    request: dict,
+    path: Path | str,
+    split_by: str,
+    workers: int = 4,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> dict[Path, int]:
+    """
+    Retrieve the data matching the request into one file per value of a key, eg. per member or step, concurrently.
+
+    The values of the key are taken from the request, or listed from FDB if the request does not set them. Each part
+    is retrieved by a thread of its own with its own FDB handle, into the path with the key and value appended to its
+    name. Returns the number of bytes written to each file.
+    """
+
+    path = Path(path)
+
+    values = request.get(split_by)
+    if values is None:
+        values = sorted(str(v) for v in get_all_values(split_by, **request).get(split_by, set()))
+    elif not isinstance(values, (list, tuple)):
+        values = [values]
+
+    import pyfdb
+
+    local = threading.local()
+
+    def retrieve_part(value: str) -> tuple[Path, int]:
+        if not hasattr(local, 'fdb'):
+            local.fdb = pyfdb.FDB()
+        part_path = split_path(path, split_by, value)
+        size = retrieve_to_file(request | {split_by: value}, part_path, chunk_size, local.fdb)
+        _logger.info("Retrieved %d bytes into %s", size, part_path)
+        return part_path, size
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(executor.map(retrieve_part, [str(v) for v in values]))
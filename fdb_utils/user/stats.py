@@ -0,0 +1,147 @@
+"""This module provides counts and cardinality estimates of the keys of entries listed from FDB."""
+
+import hashlib
+import math
+from collections import Counter
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+
+
+class HyperLogLog:
+    """
+    Sketch estimating the number of distinct values added to it in a fixed amount of memory.
+
+    The sketch keeps 2**precision one byte registers, for a standard error of about 1.04 / sqrt(2**precision), ie.
+    0.8% with the default precision of 14 and 16 KiB of registers. Sketches with the same precision can be merged.
+    """
+
+    def __init__(self, precision: int = 14) -> None:
+        if not 4 <= precision <= 18:
+            raise ValueError(f"HyperLogLog precision must be between 4 and 18, got {precision}")
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, value: str) -> None:
+        h = int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+        index = h >> (64 - self.precision)
+        # Position of the first set bit of the remaining bits, counting from 1.
+        rank = (64 - self.precision) - (h & ((1 << (64 - self.precision)) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog") -> None:
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches of different precisions")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def __len__(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / math.fsum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities.
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
+
+
+@dataclass
+class KeyStats:
+    """
+    Counts of the entries listed from FDB.
+
+    In exact mode, the number of entries is counted for each value of each key and for each combination of values of
+    each pair of keys. In approximate mode, only the number of distinct values of each key and pair of keys, and of
+    distinct entries, is estimated, so the memory used does not depend on the size of the listing.
+    """
+
+    approximate: bool = False
+    precision: int = 14
+    entries: int = 0
+    values: dict[str, Counter] = field(default_factory=dict)
+    pairs: dict[tuple[str, str], Counter] = field(default_factory=dict)
+    sketches: dict[str, HyperLogLog] = field(default_factory=dict)
+    pair_sketches: dict[tuple[str, str], HyperLogLog] = field(default_factory=dict)
+    fields: HyperLogLog | None = None
+
+    def add(self, keys: dict[str, str], names: Iterable[str] = (), pairs: Iterable[tuple[str, str]] = ()) -> None:
+        """Count an entry, for the given keys (or all its keys) and pairs of keys."""
+        self.entries += 1
+        names = [k for k in names if k in keys] if names else list(keys)
+        pairs = [(a, b) for a, b in pairs if a in keys and b in keys]
+
+        if not self.approximate:
+            for k in names:
+                self.values.setdefault(k, Counter())[keys[k]] += 1
+            for a, b in pairs:
+                self.pairs.setdefault((a, b), Counter())[(keys[a], keys[b])] += 1
+            return
+
+        for k in names:
+            self._sketch(self.sketches, k).add(keys[k])
+        for a, b in pairs:
+            self._sketch(self.pair_sketches, (a, b)).add(f"{keys[a]}\0{keys[b]}")
+        if self.fields is None:
+            self.fields = HyperLogLog(self.precision)
+        self.fields.add(','.join(f"{k}={v}" for k, v in sorted(keys.items())))
+
+    def merge(self, other: "KeyStats") -> None:
+        """Add the counts of another listing, eg. of another FDB, made in the same mode."""
+        if other.approximate != self.approximate:
+            raise ValueError("Cannot merge exact and approximate counts")
+        self.entries += other.entries
+        for k, counter in other.values.items():
+            self.values.setdefault(k, Counter()).update(counter)
+        for pair, counter in other.pairs.items():
+            self.pairs.setdefault(pair, Counter()).update(counter)
+        for k, sketch in other.sketches.items():
+            self._sketch(self.sketches, k).merge(sketch)
+        for pair, sketch in other.pair_sketches.items():
+            self._sketch(self.pair_sketches, pair).merge(sketch)
+        if other.fields is not None:
+            if self.fields is None:
+                self.fields = HyperLogLog(self.precision)
+            self.fields.merge(other.fields)
+
+    def _sketch(self, sketches: dict, name: str | tuple[str, str]) -> HyperLogLog:
+        if name not in sketches:
+            sketches[name] = HyperLogLog(self.precision)
+        return sketches[name]
+
+    def cardinality(self, name: str | tuple[str, str]) -> int:
+        """Return the (estimated in approximate mode) number of distinct values of a key or pair of keys."""
+        if isinstance(name, tuple):
+            return len(self.pair_sketches[name]) if self.approximate else len(self.pairs[name])
+        return len(self.sketches[name]) if self.approximate else len(self.values[name])
+
+    @property
+    def keys(self) -> list[str]:
+        return list(self.sketches if self.approximate else self.values)
+
+    @property
+    def key_pairs(self) -> list[tuple[str, str]]:
+        return list(self.pair_sketches if self.approximate else self.pairs)
+
+
+def parse_pairs(names: Iterable[str]) -> list[tuple[str, str]]:
+    """Parse pairs of keys of the form 'step:param'."""
+    pairs = []
+    for name in names:
+        a, sep, b = name.partition(':')
+        if not sep or not a or not b:
+            raise ValueError(f"Pair of keys {name} must be of the form 'key:key'")
+        pairs.append((a, b))
+    return pairs
+
+
+def collect_stats(
+    entries: Iterable[dict], keys: Iterable[str] = (), pairs: Iterable[tuple[str, str]] = (),
+    approximate: bool = False, precision: int = 14
+) -> KeyStats:
+    """Count the listed entries in a single pass, per value of each key and pair of keys."""
+    keys = tuple(keys)
+    pairs = tuple(pairs)
+    stats = KeyStats(approximate=approximate, precision=precision)
+    for el in entries:
+        stats.add(el['keys'], keys, pairs)
+    return stats
@@ -0,0 +1,210 @@
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from fdb_utils.grib_utils import GribMessage
+from fdb_utils.management.archive import (
+    ArchiveReport,
+    ArchiveStats,
+    archive_files,
+    archive_files_parallel,
+    contiguous_runs,
+    group_messages,
+    grouping_keys,
+)
+from fdb_utils.management.dedup import DedupIndex
+from fdb_utils.management.retention import WipeTarget, apply_retention
+from fdb_utils.management.wipe import wipe_forecast
+from fdb_utils.schema import Schema
+from test.test_fdb_management import _generate_file_to_upload, _modify_grib_file
+from test.conftest import fdb
+
+
+def _messages(path: Path, numbers: list[str], length: int = 4) -> list[GribMessage]:
+    return [
+        GribMessage(path, i * length, length, {'number': number, 'levtype': 'sfc'})
+        for i, number in enumerate(numbers)
+    ]
+
+
+def test_grouping_keys():
+    schema = Schema.from_string("[ date, time, number [ levtype [ param, step ]] [ levtype, levelist [ param ]]]")
+    assert grouping_keys(schema) == ['date', 'time', 'number', 'levtype', 'levelist']
+
+
+def test_group_messages():
+    messages = _messages(Path('a.grib'), ['1', '2', '1', '2', '2'])
+    groups = group_messages(messages, ['number', 'levtype'])
+    assert list(groups) == [('1', 'sfc'), ('2', 'sfc')]
+    assert [m.offset for m in groups[('2', 'sfc')]] == [4, 12, 16]
+
+    assert contiguous_runs(groups[('2', 'sfc')]) == [(Path('a.grib'), 4, 8), (Path('a.grib'), 12, 20)]
+
+
+def test_archive_files_grouped(tmp_path):
+    path = tmp_path / 'mixed.grib'
+    path.write_bytes(b'AAAABBBBaaaabbbbBBBB')
+    messages = _messages(path, ['1', '2', '1', '2', '2'])
+
+    fdb = MagicMock()
+    archived = []
+    fdb.archive.side_effect = lambda data: archived.append(bytes(data))
+
+    with patch("fdb_utils.management.archive.scan_grib_messages", return_value=messages):
+        stats = archive_files([path], fdb=fdb, keys=['number'])
+
+    assert archived == [b'AAAAaaaa', b'BBBBbbbbBBBB']
+    assert (stats.messages, stats.bytes, stats.groups, stats.batches) == (5, 20, 2, 2)
+    fdb.flush.assert_called_once()
+
+    archived.clear()
+    with patch("fdb_utils.management.archive.scan_grib_messages", return_value=messages):
+        stats = archive_files([path], fdb=fdb, keys=['number'], max_batch_bytes=8)
+
+    assert archived == [b'AAAAaaaa', b'BBBBbbbb', b'BBBB']
+    assert stats.batches == 3
+
+
+def test_archive_files_dedup(tmp_path):
+    path = tmp_path / 'mixed.grib'
+    path.write_bytes(b'AAAABBBBaaaa')
+    messages = [
+        GribMessage(path, i * 4, 4, {'number': number, 'step': step})
+        for i, (number, step) in enumerate([('1', '0'), ('2', '0'), ('1', '1')])
+    ]
+    index = tmp_path / 'dedup'
+
+    fdb = MagicMock()
+    archived = []
+    fdb.archive.side_effect = lambda data: archived.append(bytes(data))
+
+    def archive(**kwargs):
+        archived.clear()
+        with patch("fdb_utils.management.archive.scan_grib_messages", return_value=messages):
+            return archive_files([path], fdb=fdb, keys=['number'], dedup_index=index, dedup_keys=['step'], **kwargs)
+
+    stats = archive()
+    assert archived == [b'AAAAaaaa', b'BBBB']
+    assert (stats.messages, stats.skipped) == (3, 0)
+
+    # The retry skips all messages, apart from the one which changed since.
+    path.write_bytes(b'AAAABBBBcccc')
+    stats = archive()
+    assert archived == [b'cccc']
+    assert (stats.messages, stats.skipped, stats.groups) == (1, 2, 1)
+
+    with DedupIndex(index) as dedup:
+        assert len(dedup) == 3
+        assert dedup.remove(number='1') == 2
+    stats = archive()
+    assert archived == [b'AAAAcccc']
+
+
+@patch("fdb_utils.management.wipe.subprocess.run")
+def test_archive_files_dedup_after_wipe(mock_subprocess_run, tmp_path, monkeypatch):
+    (tmp_path / 'bin').mkdir()
+    (tmp_path / 'bin' / 'fdb-wipe').touch()
+    monkeypatch.setenv("FDB5_HOME", str(tmp_path))
+
+    path = tmp_path / 'runs.grib'
+    path.write_bytes(b'AAAABBBBCCCC')
+    messages = [
+        GribMessage(path, i * 4, 4, {'date': '20240601', 'time': time, 'model': model, 'number': '1'})
+        for i, (time, model) in enumerate([('0', 'icon-ch1-eps'), ('600', 'icon-ch1-eps'), ('600', 'icon-ch2-eps')])
+    ]
+    index = tmp_path / 'dedup'
+
+    fdb = MagicMock()
+    archived = []
+    fdb.archive.side_effect = lambda data: archived.append(bytes(data))
+
+    def archive():
+        archived.clear()
+        with patch("fdb_utils.management.archive.scan_grib_messages", return_value=messages):
+            archive_files([path], fdb=fdb, keys=['time', 'model'], dedup_index=index, dedup_keys=['number'])
+
+    archive()
+    archive()
+    assert not archived
+
+    # Only the messages of the wiped forecast are archived again.
+    wipe_forecast(datetime(2024, 6, 1, 6), 'icon-ch1-eps', dedup_index=index)
+    mock_subprocess_run.assert_called_once()
+    archive()
+    assert archived == [b'BBBB']
+
+    apply_retention([WipeTarget('icon-ch2-eps', datetime(2024, 6, 1, 6), 'test')], dedup_index=index)
+    archive()
+    assert archived == [b'CCCC']
+
+
+def test_dedup_index_not_committed_on_failure(tmp_path):
+    path = tmp_path / 'one.grib'
+    path.write_bytes(b'AAAA')
+    messages = [GribMessage(path, 0, 4, {'number': '1'})]
+
+    fdb = MagicMock()
+    fdb.flush.side_effect = RuntimeError("Disk full")
+    with patch("fdb_utils.management.archive.scan_grib_messages", return_value=messages):
+        with pytest.raises(RuntimeError):
+            archive_files([path], fdb=fdb, keys=['number'], dedup_index=tmp_path / 'dedup', dedup_keys=[])
+
+    with DedupIndex(tmp_path / 'dedup') as dedup:
+        assert len(dedup) == 0
+
+
+def test_archive_files(tmp_path, data_dir, fdb):
+
+    file_to_upload_1, _, _ = _generate_file_to_upload(tmp_path, data_dir, random=True)
+    file_to_upload_2, _, _ = _generate_file_to_upload(tmp_path, data_dir, random=True)
+
+    _modify_grib_file(file_to_upload_1, date='20240202', time='300', number=1, step=0)
+    _modify_grib_file(file_to_upload_2, date='20240202', time='300', number=2, step=0)
+
+    stats = archive_files([file_to_upload_1, file_to_upload_2], fdb=fdb)
+
+    assert stats.files == 2
+    assert stats.bytes == file_to_upload_1.stat().st_size + file_to_upload_2.stat().st_size
+    numbers = {el['keys']['number'] for el in fdb.list({'date': '20240202', 'time': '0300'}, True, True)}
+    assert numbers == {'1', '2'}
+
+
+def test_archive_report():
+    stats = ArchiveStats(files=2, messages=4, bytes=1024 ** 2, groups=2, batches=2)
+    stats.add(ArchiveStats(messages=4, bytes=1024 ** 2, groups=2, batches=2))
+    assert (stats.files, stats.messages, stats.bytes) == (2, 8, 2 * 1024 ** 2)
+
+    report = ArchiveReport(stats, seconds=2.0, databases=3, failed={('20240202', '1'): 'Disk full'})
+    assert report.throughput == 1024 ** 2
+    assert str(report) == (
+        "Archived 8 messages (2.0 MiB) of 2 files to 2 of 3 databases in 2.0s (1.0 MiB/s), "
+        "failed for 1 databases: {('20240202', '1'): 'Disk full'}"
+    )
+
+
+def test_archive_files_parallel_unreadable_file(tmp_path):
+    missing = tmp_path / 'missing.grib'
+    report = archive_files_parallel([missing], workers=1, keys=['number'], database_keys=['number'])
+
+    assert list(report.failed_files) == [str(missing)]
+    assert report.databases == 0
+    assert "failed to read 1 files" in str(report)
+
+
+def test_archive_files_parallel(tmp_path, data_dir, fdb):
+
+    files = []
+    for number in (1, 2, 3):
+        file_to_upload, _, _ = _generate_file_to_upload(tmp_path, data_dir, random=True)
+        _modify_grib_file(file_to_upload, date='20240202', time='300', number=number, step=0)
+        files.append(file_to_upload)
+
+    report = archive_files_parallel(files, workers=2)
+
+    assert not report.failed
+    assert report.databases == 3
+    assert report.stats.bytes == sum(f.stat().st_size for f in files)
+    numbers = {el['keys']['number'] for el in fdb.list({'date': '20240202', 'time': '0300'}, True, True)}
+    assert numbers == {'1', '2', '3'}
@@ -0,0 +1,86 @@
+import io
+from unittest.mock import patch
+
+from fdb_utils.user.batch import BatchRequest, merge_requests, read_batch, run_batch, write_batch_results
+
+
+def test_read_batch():
+    lines = [
+        '{"id": "eps", "filter": "date=20240601,step=0/to/2", "show": "number,step"}',
+        '',
+        '{"filter": "date=20240601", "show": ["param"]}',
+        '{"filter": "date=20240601/to/20240610,step=0/to/48"}',
+        '{"id": "no filter"}',
+        'not json',
+        '{"filter": "date=20240601", "show": 5}',
+        '{"filter": 5}',
+    ]
+    requests = read_batch(lines, max_request_size=100)
+
+    assert requests[0] == BatchRequest('eps', {'date': '20240601', 'step': ['0', '1', '2']}, ['number', 'step'])
+    assert requests[1] == BatchRequest('3', {'date': '20240601'}, ['param'])
+    assert requests[2].error == (
+        "Invalid request on line 4: The filter expands to 490 combinations of values, more than 100"
+    )
+    assert requests[3].error == "Invalid request on line 5: A request must have a filter"
+    assert requests[3].id == 'no filter'
+    assert requests[4].error.startswith("Invalid request on line 6: Expecting value")
+    # Requests of the wrong types do not abort the batch.
+    assert requests[5].error == "Invalid request on line 7: show must be a comma separated string or a list of keys"
+    assert requests[6].error == "Invalid request on line 8: The filter must be a string"
+
+
+def test_merge_requests():
+    requests = [
+        {'date': '20240601', 'time': '0000', 'step': '0'},
+        {'date': '20240601', 'time': '0000', 'step': ['1', '2']},
+        # Merging would list time 0600 of step 0 to 2 and time 0000 of step 3, which were not requested.
+        {'date': '20240601', 'time': '0600', 'step': '3'},
+        {'date': '20240601', 'step': '3'},
+        {'date': '20240601', 'time': '0000', 'step': '0'},
+    ]
+    assert merge_requests(requests) == [
+        ({'date': ['20240601'], 'time': ['0000'], 'step': ['0', '1', '2']}, [0, 1, 4]),
+        ({'date': ['20240601'], 'time': ['0600'], 'step': ['3']}, [2]),
+        ({'date': ['20240601'], 'step': ['3']}, [3]),
+    ]
+
+
+def _entry(**keys: str) -> dict:
+    return {'keys': keys}
+
+
+def test_run_batch():
+    requests = [
+        BatchRequest('a', {'date': '20240601', 'time': '0', 'step': '0'}, ['number']),
+        BatchRequest('b', {'date': '20240601', 'time': '0', 'step': ['1', '2']}, ['number', 'step']),
+        BatchRequest('c', error="Invalid request"),
+    ]
+    entries = [
+        _entry(date='20240601', time='0000', number='1', step='0'),
+        _entry(date='20240601', time='0000', number='2', step='0'),
+        _entry(date='20240601', time='0000', number='1', step='2'),
+        _entry(date='20240601', time='0000', number='10', step='0'),
+    ]
+
+    with patch("fdb_utils.user.batch.list_entries", return_value=iter(entries)) as list_entries:
+        results = list(run_batch(requests))
+
+    # Both requests are answered by a single scan.
+    list_entries.assert_called_once_with(
+        'number', 'step', catalogue=None, date=['20240601'], time=['0'], step=['0', '1', '2']
+    )
+
+    stream = io.StringIO()
+    assert write_batch_results(results, stream) == 1
+    assert stream.getvalue().splitlines() == [
+        '{"id": "a", "entries": 3, "values": {"number": [1, 2, 10]}}',
+        '{"id": "b", "entries": 1, "values": {"number": [1], "step": ["2"]}}',
+        '{"id": "c", "error": "Invalid request"}',
+    ]
+
+
+def test_run_batch_failed_scan():
+    requests = [BatchRequest('a', {'class': 'od'}, ['number'])]
+    results = list(run_batch(requests))
+    assert results[0][1].error.startswith("Key class must be one of")
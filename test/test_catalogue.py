@@ -0,0 +1,105 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from fdb_utils.env import fdb_roots, fdb_schema_path
+from fdb_utils.schema import Schema
+from fdb_utils.user.catalogue import DatabaseIndex, TocCatalogue, canonical_value
+from test.conftest import test_dir
+
+
+@pytest.fixture
+def catalogue(tmp_path: Path, test_dir: Path) -> TocCatalogue:
+    """Catalogue of a fake FDB root, with the database directories and index files FDB would create."""
+
+    databases = {
+        '20240202:0300:enfo:od:0001:icon-ch1-eps:pf:1': ('sfc', 'ml'),
+        '20240202:0300:enfo:od:0001:icon-ch1-eps:pf:2': ('sfc',),
+        '20240202:0600:enfo:od:0001:icon-ch1-eps:pf:1': ('pl',),
+        '20240202:0600:enfo:od:0001:icon-ch2-eps:pf:1': ('sfc',),
+    }
+    for name, levtypes in databases.items():
+        (tmp_path / name).mkdir()
+        (tmp_path / name / 'toc').write_bytes(b'')
+        for levtype in levtypes:
+            for i in range(2):
+                (tmp_path / name / f'{levtype}.20240202.030000.host.{i}.index').write_bytes(b'')
+                (tmp_path / name / f'{levtype}.20240202.030000.host.{i}.data').write_bytes(b'')
+    (tmp_path / 'lost+found').mkdir()
+
+    return TocCatalogue([tmp_path], Schema.from_file(test_dir / 'resource' / 'schema'))
+
+
+def test_canonical_value():
+    assert canonical_value('Time', '6') == '0600'
+    assert canonical_value('Time', '300') == '0300'
+    assert canonical_value('Time', '0300') == '0300'
+    assert canonical_value('Integer', '01') == '1'
+    assert canonical_value('Param', '500001') == '500001'
+
+
+def test_catalogue_databases(catalogue):
+
+    assert len(catalogue.databases()) == 4
+
+    databases = catalogue.databases({'model': 'icon-ch1-eps', 'time': '3', 'number': ['2', '3']})
+    assert [key['number'] for _, key in databases] == ['2']
+    assert databases[0][0].name == '20240202:0300:enfo:od:0001:icon-ch1-eps:pf:2'
+
+
+def test_catalogue_list_names(catalogue):
+
+    assert catalogue.depth(['date', 'number']) == 1
+    assert catalogue.depth(['number', 'levtype']) == 2
+    assert catalogue.depth(['step']) == 3
+
+    databases = list(catalogue.list({'model': 'icon-ch1-eps'}, depth=1))
+    assert len(databases) == 3
+    assert all(set(entry['keys']) == set(catalogue.schema.database_keys) for entry in databases)
+
+    indexes = list(catalogue.list({'model': 'icon-ch1-eps', 'levtype': 'sfc/ml'}, depth=2))
+    assert sorted((entry['keys']['number'], entry['keys']['levtype']) for entry in indexes) == [
+        ('1', 'ml'), ('1', 'sfc'), ('2', 'sfc')
+    ]
+
+
+def test_fdb_roots(monkeypatch):
+
+    monkeypatch.delenv('FDB5_CONFIG_FILE', raising=False)
+    monkeypatch.setenv('FDB5_CONFIG', (
+        '{type: local, engine: toc, schema: /fdb/schema, '
+        'spaces: [{handler: Default, roots: [{path: /fdb/root1}, {path: /fdb/root2}]}]}'
+    ))
+
+    assert fdb_roots() == [Path('/fdb/root1'), Path('/fdb/root2')]
+    assert fdb_schema_path() == Path('/fdb/schema')
+
+    with pytest.raises(RuntimeError):
+        fdb_roots({'type': 'remote'})
+
+
+def test_database_index_refresh(tmp_path, test_dir):
+
+    schema = Schema.from_file(test_dir / 'resource' / 'schema')
+    index = DatabaseIndex(tmp_path, schema)
+    name = '20240202:{time}:enfo:od:0001:icon-ch1-eps:pf:{number}'
+
+    for number in range(3):
+        (tmp_path / name.format(time='0300', number=number)).mkdir()
+    os.utime(tmp_path, ns=(1_000_000_000, 1_000_000_000))
+
+    matches = list(index.lookup({'number': {'1', '2'}, 'time': {'0300'}}))
+    assert [key['number'] for _, _, key in matches] == ['1', '2']
+    assert len(index) == 3
+
+    # The root is not scanned again while its modification time is unchanged.
+    (tmp_path / name.format(time='0600', number=0)).mkdir()
+    os.utime(tmp_path, ns=(1_000_000_000, 1_000_000_000))
+    assert not list(index.lookup({'time': {'0600'}}))
+
+    (tmp_path / name.format(time='0300', number=0)).rmdir()
+    os.utime(tmp_path, ns=(2_000_000_000, 2_000_000_000))
+    assert len(list(index.lookup({'time': {'0600'}}))) == 1
+    assert not list(index.lookup({'time': {'0300'}, 'number': {'0'}}))
+    assert len(index) == 3
@@ -1,4 +1,5 @@
 import datetime as dt
+import shutil
 
 import matplotlib.pyplot as plt
 import pytest
@@ -232,3 +233,162 @@ def test_historical_archive_status(list_values, tmp_path, data_dir):
         "2502010900",
         "2502010600",
     ]
+
+
+def test_get_overtaken_files():
+    status_dict = {
+        "suf1": [[1, 0, 1, 0], [0, 0, 0, 0]],
+        "suf2": [[0, 0, 1], [1, 1, 1]],
+    }
+    assert cas.get_overtaken_files(status_dict) == [
+        "_FXINP_lfrf0001000_000suf1",
+        "_FXINP_lfrf0000000_000suf2",
+        "_FXINP_lfrf0001000_000suf2",
+    ]
+
+
+def test_current_run_time():
+    icon_1 = cas.COLLECTIONS["icon-ch1-eps"]
+
+    run_time = dt.datetime.fromisoformat("2025-01-01T03:00Z")
+    assert cas.current_run_time(icon_1, run_time) == run_time
+    assert cas.current_run_time(icon_1, run_time + dt.timedelta(hours=2)) == run_time
+
+
+@patch("fdb_utils.ci.check_archive_status.list_all_values")
+def test_update_archive_status_queries_missing(list_values):
+    list_values.return_value = {"step": {"1", "3"}}
+
+    archive_status = {p.file_suffix: cas.empty_param_status("icon-ch1-eps", p) for p in cas.PARAMS}
+    for param_status in archive_status.values():
+        for steps_status in param_status:
+            steps_status[:] = [1] * len(steps_status)
+    archive_status["p"][4][1:4] = [0, 0, 0]
+
+    cas.update_archive_status(
+        "icon-ch1-eps", dt.datetime.fromisoformat("2025-02-02T03:00Z"), archive_status
+    )
+
+    # Only the member with missing steps is queried, narrowed to the missing steps.
+    list_values.assert_called_once()
+    filter_values = list_values.call_args.kwargs
+    assert filter_values["number"] == "4"
+    assert filter_values["step"] == ["1", "2", "3"]
+    assert filter_values["param"] == "500006"
+    assert archive_status["p"][4][:5] == [1, 1, 0, 1, 1]
+
+
+@patch("fdb_utils.ci.check_archive_status.sleep")
+@patch("fdb_utils.ci.check_archive_status.list_all_values")
+def test_watch_archive_status_complete(list_values, mock_sleep):
+    # Nothing is archived on the first poll, everything on the second.
+    list_all_steps = return_steps({})
+    list_values.side_effect = lambda *keys, **values: (
+        list_all_steps(*keys, **values) if mock_sleep.called else {}
+    )
+
+    forecast_time = dt.datetime.fromisoformat("2025-02-02T03:00Z")
+    deadline = dt.datetime.now(dt.timezone.utc) + dt.timedelta(hours=1)
+    archive_status = cas.watch_archive_status(
+        "icon-ch1-eps", forecast_time, deadline, dt.timedelta(minutes=5)
+    )
+
+    assert cas.summary_status(archive_status) == cas.ForecastStatus.COMPLETE
+    mock_sleep.assert_called_once_with(300)
+    assert list_values.call_count == 2 * 11 * len(cas.PARAMS)
+
+
+@patch("fdb_utils.ci.check_archive_status.sleep")
+@patch("fdb_utils.ci.check_archive_status.list_all_values")
+def test_watch_archive_status_deadline(list_values, mock_sleep):
+    list_values.side_effect = return_steps({("500001", "20250202", "0300"): {"1": [0]}})
+
+    forecast_time = dt.datetime.fromisoformat("2025-02-02T03:00Z")
+    deadline = dt.datetime.now(dt.timezone.utc)
+    archive_status = cas.watch_archive_status(
+        "icon-ch1-eps", forecast_time, deadline, dt.timedelta(minutes=5)
+    )
+
+    assert cas.summary_status(archive_status) == cas.ForecastStatus.INCOMPLETE
+    assert archive_status[""][1][0] == 0
+    mock_sleep.assert_not_called()
+
+
+def test_compress_ranges():
+    assert cas.compress_ranges([]) == []
+    assert cas.compress_ranges([0, 1, 2, 5, 7, 8]) == [(0, 2), (5, 5), (7, 8)]
+    assert cas.format_ranges([(0, 2), (5, 5), (7, 8)]) == "0-2,5,7-8"
+
+
+def test_failure_report():
+    success_dict = {
+        "c": [[0], [0], [0], [1]],
+        "p": [[1, 0, 0, 1], [1, 0, 0, 1], [1, 1, 1, 0]],
+        "": [[1, 1], [1, 1]],
+    }
+    report = cas.FailureReport.from_status(success_dict)
+
+    assert len(report) == 8
+    assert str(report) == (
+        "suffix 'c' members 0-2 steps 0; "
+        "suffix 'p' members 0-1 steps 1-2; "
+        "suffix 'p' members 2 steps 3"
+    )
+    assert list(report.filenames()) == cas.get_failed_files(success_dict)
+    assert not cas.FailureReport.from_status({"": [[1, 1], [1, 1]]})
+
+
+def test_failure_report_full_forecast():
+    collection = cas.COLLECTIONS["icon-ch2-eps"]
+    archive_status = {
+        p.file_suffix: cas.empty_param_status(collection.model, p) for p in cas.PARAMS
+    }
+    report = cas.FailureReport.from_status(archive_status)
+
+    assert len(report) == 21 * 121 * 2 + 21
+    assert len(report.failed) == len(cas.PARAMS)
+    assert "suffix 'p' members 0-20 steps 0-120" in str(report)
+
+
+def test_merge_archive_status():
+    realtime = {"c": [[1], [0]], "p": [[1, 0, 0], [0, 0, 0]]}
+    archive = {"c": [[0], [1]], "p": [[0, 1, 0], [0, 0, 1]]}
+    assert cas.merge_archive_status([realtime, archive]) == {
+        "c": [[1], [1]],
+        "p": [[1, 1, 0], [0, 0, 1]],
+    }
+    # The status of each FDB is left untouched.
+    assert realtime["p"] == [[1, 0, 0], [0, 0, 0]]
+
+
+def test_parse_fx_filename():
+    assert cas.parse_fx_filename(cas.fx_filename("p", 20, 49)) == ("p", 20, 49)
+    assert cas.parse_fx_filename("_FXINP_lfrf00010000_003") == ("", 3, 1)
+    assert cas.parse_fx_filename("_FXINP_lfrf00010000_003c") == ("c", 3, 1)
+    assert cas.parse_fx_filename("_FXINP_lfrf00010000_003.tmp") is None
+    assert cas.parse_fx_filename("lfff00000000") is None
+
+
+def test_local_status_diff(tmp_path, data_dir):
+    # Member 0 is produced for steps 0-2, with step 2 truncated, member 1 only for step 0.
+    for member, step in ((0, 0), (0, 1), (0, 2), (1, 0)):
+        shutil.copy(data_dir / "test.grib", tmp_path / cas.fx_filename("", member, step))
+    with open(tmp_path / cas.fx_filename("", 0, 2), "r+b") as f:
+        f.truncate(1000)
+    (tmp_path / "unrelated.txt").write_text("")
+
+    local_status = cas.get_local_status("icon-ch1-eps", tmp_path)
+    assert local_status[""][0][:4] == [1, 1, 0, 0]
+    assert local_status[""][1][:2] == [1, 0]
+    assert not any(local_status["c"][0]) and not any(local_status["p"][0])
+    assert cas.get_local_status("icon-ch1-eps", tmp_path, check_grib=False)[""][0][:3] == [1, 1, 1]
+
+    archive_status = {suffix: [[0] * len(steps) for steps in status] for suffix, status in local_status.items()}
+    archive_status[""][0][0] = 1
+
+    status_diff = cas.diff_status(local_status, archive_status)
+    assert list(status_diff.archiving.filenames()) == [
+        cas.fx_filename("", 0, 1),
+        cas.fx_filename("", 1, 0),
+    ]
+    assert cas.fx_filename("", 0, 2) in status_diff.upstream.filenames()
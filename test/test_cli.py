@@ -1,3 +1,5 @@
+from unittest.mock import patch
+
 from typer.testing import CliRunner
 
 import pytest
@@ -39,3 +41,66 @@ def test_list_show(fdb):
     assert "step: Key not found" in result.stdout
     assert "date: Key not found" in result.stdout
     assert "No metadata found matching your request." in result.stdout
+
+def test_list_filter_range_abort():
+    result = runner.invoke(
+        app, ["list", "--filter", "date=20240601/to/20240607,step=0/to/48", "--max-request-size", "100"], input='N'
+    )
+    assert result.exit_code == 1
+    assert "The filter expands to 343 combinations of values." in result.stdout
+
+def test_list_filter_invalid():
+    result = runner.invoke(app, ["list", "--filter", "step=0/to"])
+    assert result.exit_code == 2
+
+def test_list_format_invalid():
+    result = runner.invoke(app, ["list", "--filter", "step=0", "--format", "parquet"])
+    assert result.exit_code == 2
+
+def test_count_pairs_invalid():
+    result = runner.invoke(app, ["count", "--filter", "step=0", "--pairs", "step"])
+    assert result.exit_code == 2
+
+def test_list_batch_conflicting_options(tmp_path):
+    batch = tmp_path / "batch.ndjson"
+    batch.write_text('{"filter": "step=0"}\n')
+    result = runner.invoke(app, ["list", "--batch", str(batch), "--format", "csv"])
+    assert result.exit_code == 2
+
+def test_completeness_invalid():
+    result = runner.invoke(app, ["completeness", "--filter", "date=20240606", "--expect", "step=0/to"])
+    assert result.exit_code == 2
+    assert "--expect" in result.output
+
+@patch("fdb_utils.main.retrieve_to_file", return_value=0)
+def test_retrieve_nothing(mock_retrieve_to_file, tmp_path):
+    output = tmp_path / "out.grib"
+    output.touch()
+    result = runner.invoke(app, ["retrieve", "--filter", "date=20240606,step=0", "--output", str(output)])
+    assert result.exit_code == 1
+    assert not output.exists()
+
+@patch("fdb_utils.main.retrieve_split")
+def test_retrieve_split_nothing(mock_retrieve_split, tmp_path):
+    output = tmp_path / "out.grib"
+    mock_retrieve_split.return_value = {tmp_path / "out_number_1.grib": 8, tmp_path / "out_number_2.grib": 0}
+    result = runner.invoke(
+        app, ["retrieve", "--filter", "date=20240606,number=1/2", "--output", str(output), "--split-by", "number"]
+    )
+    assert result.exit_code == 1
+
+    mock_retrieve_split.return_value = {tmp_path / "out_number_1.grib": 8}
+    result = runner.invoke(
+        app, ["retrieve", "--filter", "date=20240606,number=1", "--output", str(output), "--split-by", "number"]
+    )
+    assert result.exit_code == 0
+
+def test_list_config_invalid(tmp_path):
+    config = tmp_path / "config.yaml"
+    result = runner.invoke(app, ["count", "--filter", "step=0", "--config", str(config)])
+    assert result.exit_code == 2
+
+    config.touch()
+    result = runner.invoke(app, ["list", "--filter", "step=0", "--toc", "--config", str(config)])
+    assert result.exit_code == 2
+    assert "--toc" in result.output
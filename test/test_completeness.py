@@ -0,0 +1,74 @@
+from unittest.mock import patch
+
+from fdb_utils.user.completeness import Completeness, Hypercube, check_completeness, compress_cells
+
+
+def test_compress_cells():
+    # Steps 1 to 2 missing for members 0 to 2 and 4, step 3 missing for member 3 only.
+    cells = [(m, s) for m in (0, 1, 2, 4) for s in (1, 2)] + [(3, 3)]
+    assert sorted(compress_cells(sorted(cells))) == [
+        (((0, 2), (4, 4)), ((1, 2),)),
+        (((3, 3),), ((3, 3),)),
+    ]
+    assert not compress_cells([])
+
+
+def test_hypercube():
+    cube = Hypercube({'param': ['T', 'U'], 'step': ['0', '1', '2']})
+    assert cube.size == 6
+    assert cube.flat_index((1, 2)) == 5
+    assert cube.position(5) == (1, 2)
+
+
+def test_missing_blocks():
+    cube = Hypercube({'param': ['T', 'U', 'V'], 'number': ['0', '1'], 'step': ['0', '1', '2', '3']})
+    status = Completeness(cube, {cube.flat_index((p, n, s)) for p in range(3) for n in range(2) for s in range(4)})
+    for position in [(0, 0, 2), (0, 0, 3), (0, 1, 2), (0, 1, 3), (2, 1, 0)]:
+        status.present.remove(cube.flat_index(position))
+
+    assert not status.complete
+    assert [str(block) for block in status.missing_blocks()] == [
+        "param=T number=0-1 step=2-3",
+        "param=V number=1 step=0",
+    ]
+    assert [block.size for block in status.missing_blocks()] == [4, 1]
+    assert status.missing_request() == {'param': ['T', 'V'], 'number': ['0', '1'], 'step': ['0', '2', '3']}
+
+
+def _entry(**keys: str) -> dict:
+    return {'keys': keys}
+
+
+def test_check_completeness():
+    expected = {'param': ['T', 'U'], 'step': ['0', '1', '2']}
+    entries = [
+        _entry(date='20240601', time='0000', param='T', step=str(step)) for step in range(3)
+    ] + [_entry(date='20240601', time='0000', param='U', step='1'), _entry(param='V', step='0')]
+
+    with patch("fdb_utils.user.completeness.list_entries", return_value=iter(entries)) as list_entries:
+        status = check_completeness(expected, date='20240601', time='0')
+
+    list_entries.assert_called_once_with(
+        'param', 'step', catalogue=None, date='20240601', time='0', param=['T', 'U'], step=['0', '1', '2']
+    )
+    assert len(status.present) == 4
+    assert [str(block) for block in status.missing_blocks()] == ["param=U step=0,2"]
+
+    # Only the missing cells are searched for again.
+    with patch("fdb_utils.user.completeness.list_entries", return_value=iter(entries[4:])) as list_entries:
+        status = check_completeness(expected, status=status, date='20240601', time='0')
+
+    list_entries.assert_called_once_with(
+        'param', 'step', catalogue=None, date='20240601', time='0', param=['U'], step=['0', '2']
+    )
+    assert len(status.present) == 4
+
+
+def test_check_completeness_equivalent_values():
+    entries = [_entry(time='0000', step='0'), _entry(time='0600', step='0')]
+
+    with patch("fdb_utils.user.completeness.list_entries", return_value=iter(entries)):
+        status = check_completeness({'time': ['6', '0600', '0'], 'step': '0'}, date='20240601')
+
+    assert status.cube.axes == {'time': ['6', '0'], 'step': ['0']}
+    assert status.complete
@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+from fdb_utils.fanout import config_executor, fan_out
+
+
+def _config_file(suffix: str) -> str:
+    return os.environ['FDB5_CONFIG_FILE'] + suffix
+
+
+def _fail() -> None:
+    if os.environ['FDB5_CONFIG_FILE'].endswith('b.yaml'):
+        raise ValueError("Cannot read FDB")
+
+
+def test_fan_out(tmp_path):
+    configs = [tmp_path / 'a.yaml', tmp_path / 'b.yaml']
+    for config in configs:
+        config.write_text('type: local\n')
+
+    results = fan_out(_config_file, configs, '!')
+    assert results == {str(config): f'{config}!' for config in configs}
+
+    with pytest.raises(RuntimeError, match='1 of 2 FDB configs'):
+        fan_out(_fail, configs)
+
+    with pytest.raises(RuntimeError, match='does not exist'):
+        fan_out(_config_file, [tmp_path / 'c.yaml'], '!')
+
+
+def _config() -> str:
+    return os.environ['FDB5_CONFIG_FILE']
+
+
+def test_config_executor(tmp_path):
+    config = tmp_path / 'a.yaml'
+    config.write_text('type: local\n')
+
+    with config_executor(config, max_workers=2) as executor:
+        assert {executor.submit(_config).result() for _ in range(4)} == {str(config)}
+
+    with pytest.raises(RuntimeError, match='does not exist'):
+        config_executor(tmp_path / 'b.yaml', max_workers=1)
@@ -1,8 +1,18 @@
+import subprocess
 from datetime import datetime
+from unittest.mock import patch
 
 import pytest
 
-from fdb_utils.user.describe import list_all_values, get_archived_forecasts
+from fdb_utils.user.catalogue import TocCatalogue
+from fdb_utils.user.describe import (
+    collect_distinct_values,
+    count_values,
+    list_all_values,
+    list_databases,
+    get_archived_forecasts,
+    get_archived_forecasts_by_model,
+)
 from test.test_fdb_management import _generate_file_to_upload, _modify_grib_file
 from test.conftest import fdb
 
@@ -30,6 +40,41 @@ def test_list_all_values(tmp_path, data_dir, fdb):
     assert list_all_values('step', date='20240202')['step'] == {'0','1'}
     assert list_all_values('number', date='20240202')['number'] == {5}
 
+    catalogue = TocCatalogue.from_config()
+    assert list_all_values('time', catalogue=catalogue)['time'] == {'0300', '0600'}
+    assert list_all_values('step', catalogue=catalogue)['step'] == {'0','1','2','3'}
+    assert list_all_values('step', catalogue=catalogue, date='20240202')['step'] == {'0','1'}
+    assert list_all_values('number', catalogue=catalogue, date='20240202')['number'] == {5}
+
+    assert list_all_values('step', workers=4)['step'] == {'0','1','2','3'}
+    assert list_all_values('number', workers=4, date='20240202')['number'] == {5}
+    assert list_all_values('step', catalogue=catalogue, workers=4, date='20240203')['step'] == {'2','3'}
+
+
+def test_count_values(tmp_path, data_dir, fdb):
+
+    file_to_upload_1, _, _ = _generate_file_to_upload(tmp_path, data_dir, random=True)
+    file_to_upload_2, _, _ = _generate_file_to_upload(tmp_path, data_dir, random=True)
+    file_to_upload_3, _, _ = _generate_file_to_upload(tmp_path, data_dir, random=True)
+
+    _modify_grib_file(file_to_upload_1, date='20240202', time='300', number=5, step=0)
+    _modify_grib_file(file_to_upload_2, date='20240202', time='300', number=5, step=1)
+    _modify_grib_file(file_to_upload_3, date='20240202', time='300', number=1, step=1)
+
+    for file in (file_to_upload_1, file_to_upload_2, file_to_upload_3):
+        with open(file, "rb") as f:
+            fdb.archive(f.read())
+
+    fdb.flush()
+
+    stats = count_values('step', pairs=[('number', 'step')], date='20240202')
+    assert stats.entries == 3
+    assert stats.values['step'] == {'0': 1, '1': 2}
+    assert stats.cardinality(('number', 'step')) == 3
+
+    stats = count_values('step', approximate=True, date='20240202')
+    assert stats.cardinality('step') == 2
+
 
 def test_get_archived_forecasts(data_dir, tmp_path, fdb):
 
@@ -60,4 +105,68 @@ def test_get_archived_forecasts(data_dir, tmp_path, fdb):
 
     result = get_archived_forecasts( {'levtype': 'sfc'} )
 
-    assert result == [datetime(2024, 2, 2, 3), datetime(2024, 2, 2, 6), datetime(2024, 3, 2, 9)]
\ No newline at end of file
+    assert result == [datetime(2024, 2, 2, 3), datetime(2024, 2, 2, 6), datetime(2024, 3, 2, 9)]
+
+
+def test_get_archived_forecasts_by_model(data_dir, tmp_path, fdb):
+
+    file_to_upload_1, _, _ = _generate_file_to_upload(tmp_path, data_dir, random=True)
+    file_to_upload_2, _, _ = _generate_file_to_upload(tmp_path, data_dir, random=True)
+
+    _modify_grib_file(file_to_upload_1, date='20240202', time='300')
+    _modify_grib_file(file_to_upload_2, date='20240202', time='600')
+
+    for file in (file_to_upload_1, file_to_upload_2):
+        with open(file, "rb") as f:
+            fdb.archive(f.read())
+
+    fdb.flush()
+
+    result = get_archived_forecasts_by_model( {'levtype': 'sfc'} )
+
+    assert list(result.values()) == [[datetime(2024, 2, 2, 3), datetime(2024, 2, 2, 6)]]
+
+
+@patch("fdb_utils.user.describe.subprocess.run")
+def test_list_databases(mock_subprocess_run, tmp_path, monkeypatch):
+
+    (tmp_path / "bin").mkdir()
+    (tmp_path / "bin" / "fdb-list").write_text("fake fdb-list executable content")
+    monkeypatch.setenv("FDB5_HOME", str(tmp_path))
+
+    mock_subprocess_run.return_value = subprocess.CompletedProcess([], 0, stdout=(
+        b"{date=20240202,time=0300,model=icon-ch1-eps,number=1}\n"
+        b"{date=20240202,time=0300,model=icon-ch2-eps,number=1}\n"
+        b"{date=20240201,time=2100,model=icon-ch1-eps,number=1}\n"
+    ))
+
+    databases = list_databases({'model': 'icon-ch1-eps', 'number': ['1', '2']})
+
+    assert mock_subprocess_run.call_args.args[0][1:] == [
+        '--depth=1', '--porcelain', '--minimum-keys=', 'model=icon-ch1-eps,number=1/2'
+    ]
+    assert databases[0] == {'date': '20240202', 'time': '0300', 'model': 'icon-ch1-eps', 'number': '1'}
+
+    assert get_archived_forecasts() == [datetime(2024, 2, 1, 21), datetime(2024, 2, 2, 3)]
+    assert mock_subprocess_run.call_args.args[0][-1] == '--all'
+
+    assert get_archived_forecasts_by_model() == {
+        'icon-ch1-eps': [datetime(2024, 2, 1, 21), datetime(2024, 2, 2, 3)],
+        'icon-ch2-eps': [datetime(2024, 2, 2, 3)],
+    }
+
+
+def test_collect_distinct_values():
+
+    entries = [
+        {'keys': {'date': '20240202', 'number': '1', 'step': str(step), 'levelist': '200'}}
+        for step in range(5)
+    ] + [{'keys': {'date': '20240203', 'number': '2', 'step': '0'}}]
+
+    assert collect_distinct_values([]) == {}
+    assert collect_distinct_values(entries, ['number', 'foo'], batch_size=2) == {'number': {'1', '2'}, 'foo': set()}
+
+    result = collect_distinct_values(entries, batch_size=4)
+    assert list(result) == ['date', 'number', 'step', 'levelist']
+    assert result['step'] == {'0', '1', '2', '3', '4'}
+    assert result['levelist'] == {'200'}
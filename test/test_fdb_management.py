@@ -1,7 +1,7 @@
 import os
 import shutil
 import string
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
 from secrets import choice
 from test.conftest import data_dir, fdb, test_dir
@@ -10,6 +10,14 @@ from unittest.mock import patch
 import eccodes
 import pytest
 
+from fdb_utils.management.retention import (
+    RetentionPolicy,
+    WipeTarget,
+    apply_retention,
+    forecast_sizes_from,
+    plan_retention,
+)
+from fdb_utils.fs_utils import SizeByKey
 from fdb_utils.management.wipe import wipe_fdb
 
 
@@ -63,6 +71,74 @@ def test_wipe_fdb_model(mock_subprocess_run, mock_fdb_wipe_exe):
     )
 
 
+def test_plan_retention_keep_last_and_max_age():
+    forecasts = [datetime(2023, 1, 1, h) for h in (0, 6, 12, 18)]
+    catalogue = {"icon-ch1-eps": forecasts, "icon-ch2-eps": forecasts}
+    policies = {
+        "icon-ch1-eps": RetentionPolicy(keep_last=2, protect_oldest=1),
+        "icon-ch2-eps": RetentionPolicy(max_age=timedelta(hours=10)),
+    }
+
+    plan = plan_retention(catalogue, policies, datetime(2023, 1, 1, 20))
+
+    assert [(t.model, t.forecast) for t in plan] == [
+        ("icon-ch1-eps", datetime(2023, 1, 1, 6)),
+        ("icon-ch2-eps", datetime(2023, 1, 1, 0)),
+        ("icon-ch2-eps", datetime(2023, 1, 1, 6)),
+    ]
+
+
+def test_plan_retention_without_model():
+    forecasts = [datetime(2023, 1, 1, h) for h in (0, 6)]
+    # Wiping a forecast without a model would wipe the forecasts of all models at its date and time.
+    catalogue = {"": forecasts, "icon-ch1-eps": forecasts}
+    policies = {model: RetentionPolicy(keep_last=1) for model in catalogue}
+
+    plan = plan_retention(catalogue, policies, datetime(2023, 1, 2))
+
+    assert [(t.model, t.forecast) for t in plan] == [("icon-ch1-eps", datetime(2023, 1, 1, 0))]
+
+
+def test_plan_retention_max_bytes():
+    forecasts = [datetime(2023, 1, 1, h) for h in (0, 6, 12, 18)]
+    catalogue = {"icon-ch1-eps": forecasts}
+    size_by_key = SizeByKey(
+        databases={f"2023010100:{h:02}00:icon-ch1-eps": 100 for h in (0, 6, 12, 18)},
+        keys={
+            f"2023010100:{h:02}00:icon-ch1-eps": {"date": "20230101", "time": f"{h:02}00", "model": "icon-ch1-eps"}
+            for h in (0, 6, 12, 18)
+        },
+    )
+    sizes = forecast_sizes_from(size_by_key)
+    assert sizes == {("icon-ch1-eps", fc): 100 for fc in forecasts}
+
+    policies = {"icon-ch1-eps": RetentionPolicy(max_bytes=250)}
+    plan = plan_retention(catalogue, policies, datetime(2023, 1, 2), sizes)
+    assert [t.forecast for t in plan] == forecasts[:2]
+
+    with pytest.raises(ValueError):
+        plan_retention(catalogue, policies, datetime(2023, 1, 2))
+
+
+@patch("fdb_utils.management.retention.wipe_forecast")
+def test_apply_retention(mock_wipe_forecast):
+    plan = [
+        WipeTarget("icon-ch1-eps", datetime(2023, 1, 1, 0), "test"),
+        WipeTarget("icon-ch1-eps", datetime(2023, 1, 1, 6), "test"),
+    ]
+
+    apply_retention(plan, dry_run=True)
+    mock_wipe_forecast.assert_not_called()
+
+    apply_retention(plan, max_workers=2)
+    assert mock_wipe_forecast.call_count == 2
+
+    mock_wipe_forecast.side_effect = RuntimeError("wipe failed")
+    with pytest.raises(RuntimeError) as e:
+        apply_retention(plan)
+    assert "Failed to delete 2 of 2 forecasts" in str(e.value)
+
+
 def test_fdb_definitions(tmp_path: Path, data_dir: Path, fdb):
 
     total_records = 0
@@ -1,11 +1,13 @@
 import os
+import shutil
 from pathlib import Path
 import glob
 
 import pytest
 
-from fdb_utils.fs_utils import is_directory_larger_than, get_directory_size
-from test.conftest import data_dir
+from fdb_utils.fs_utils import is_directory_larger_than, get_directory_size, get_size_by_key
+from fdb_utils.schema import Schema
+from test.conftest import data_dir, test_dir
 
 def test_is_directory_larger_than(mocker):
 
@@ -36,3 +38,34 @@ def test_get_directory_size(data_dir):
     result = get_directory_size(data_dir)
     assert expected == result
 
+
+
+def test_get_size_by_key(tmp_path, test_dir):
+
+    databases = {
+        '20240202:0300:enfo:od:0001:icon-ch1-eps:pf:1': 100,
+        '20240202:0300:enfo:od:0001:icon-ch1-eps:pf:2': 200,
+        '20240202:0600:enfo:od:0001:icon-ch1-eps:pf:1': 300,
+        '20240202:0600:enfo:od:0001:icon-ch2-eps:pf:1': 400,
+    }
+    for name, size in databases.items():
+        (tmp_path / name).mkdir()
+        (tmp_path / name / 'sfc.data').write_bytes(b'0' * size)
+    (tmp_path / 'lost+found').mkdir()
+    (tmp_path / 'lost+found' / 'file').write_bytes(b'0' * 10)
+
+    schema = Schema.from_file(test_dir / 'resource' / 'schema')
+    result = get_size_by_key(tmp_path, schema, max_workers=2)
+
+    assert result.total == 1010
+    assert result.unmatched == {'lost+found': 10}
+    assert result.per_model() == {'icon-ch1-eps': 600, 'icon-ch2-eps': 400}
+    assert result.per_forecast() == {
+        ('icon-ch1-eps', '20240202', '0300'): 300,
+        ('icon-ch1-eps', '20240202', '0600'): 300,
+        ('icon-ch2-eps', '20240202', '0600'): 400,
+    }
+
+    # Without a schema, the copy in the database directories is used.
+    shutil.copy(test_dir / 'resource' / 'schema', tmp_path / '20240202:0300:enfo:od:0001:icon-ch1-eps:pf:1')
+    assert get_size_by_key(tmp_path).per_model()['icon-ch2-eps'] == 400
@@ -1,4 +1,12 @@
-from fdb_utils.grib_utils import extract_metadata_from_grib_file
+import pytest
+
+from fdb_utils.grib_utils import (
+    extract_metadata_from_grib_file,
+    grib_message_bounds,
+    grib_message_length,
+    is_complete_grib_file,
+    split_grib_messages,
+)
 from test.conftest import data_dir
 
 def test_extract_metadata_from_grib_file(data_dir):
@@ -15,3 +23,72 @@ def test_extract_metadata_from_grib_file(data_dir):
     }
 
     assert expected == result
+
+
+def test_is_complete_grib_file(tmp_path, data_dir):
+    assert is_complete_grib_file(data_dir / "test.grib")
+
+    data = (data_dir / "test.grib").read_bytes()
+    assert grib_message_length(data[:16]) <= len(data)
+
+    truncated = tmp_path / "truncated.grib"
+    truncated.write_bytes(data[:-1])
+    assert not is_complete_grib_file(truncated)
+
+    empty = tmp_path / "empty.grib"
+    empty.write_bytes(b"")
+    assert not is_complete_grib_file(empty)
+
+    with pytest.raises(ValueError):
+        grib_message_length(b"BUFR" + bytes(12))
+
+
+def test_grib1_large_message_length(tmp_path):
+    # A GRIB1 message of 70000 units of 120 bytes, less its 20 bytes section 4 length, plus the end marker.
+    length = 70000 * 120 - 20 + 4
+    section_1 = (28).to_bytes(3, 'big') + bytes(25)
+    section_4 = (20).to_bytes(3, 'big')
+    header = b"GRIB" + (0x800000 | 70000).to_bytes(3, 'big') + b"\x01" + section_1 + section_4
+    data = header + bytes(length - len(header) - 4) + b"7777"
+
+    assert length > 8 * 1024 ** 2
+    assert grib_message_length(data) == length
+    assert list(grib_message_bounds(data + data)) == [(0, length), (length, 2 * length)]
+
+    large = tmp_path / "large.grib"
+    large.write_bytes(data)
+    assert is_complete_grib_file(large)
+
+    # A length over 8 MiB with a regular section 4 is given as is.
+    regular = header[:-3] + (length - 36).to_bytes(3, 'big')
+    assert grib_message_length(regular) == 0x800000 | 70000
+
+
+def test_split_grib_messages(tmp_path, data_dir):
+    data = (data_dir / "test.grib").read_bytes()
+    bounds = list(grib_message_bounds(data))
+    assert bounds[0][0] == 0 and bounds[-1][1] == len(data)
+
+    # Messages are found across padding between them.
+    padded = tmp_path / "padded.grib"
+    padded.write_bytes(data + b"\0" * 8 + data)
+    messages = [bytes(message) for message in split_grib_messages(padded)]
+    assert len(messages) == 2 * len(bounds)
+    assert b"".join(messages) == data + data
+
+    # A message is released once the next one is requested.
+    split = split_grib_messages(padded)
+    first = next(split)
+    next(split)
+    with pytest.raises(ValueError):
+        bytes(first)
+    split.close()
+
+    truncated = tmp_path / "truncated.grib"
+    truncated.write_bytes(data[:-10])
+    with pytest.raises(ValueError):
+        list(split_grib_messages(truncated))
+
+    empty = tmp_path / "empty.grib"
+    empty.write_bytes(b"")
+    assert not list(split_grib_messages(empty))
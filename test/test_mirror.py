@@ -0,0 +1,83 @@
+import queue
+import random
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from fdb_utils.management.mirror import (
+    BOTH,
+    LEFT,
+    RIGHT,
+    _list_sorted_into,
+    external_sort,
+    field_key,
+    list_sorted,
+    merge_join,
+    sync_fields,
+)
+
+
+def _keys(*steps: str) -> list[tuple]:
+    return [field_key({'step': step, 'date': '20240601'}) for step in steps]
+
+
+def test_merge_join():
+    joined = list(merge_join(_keys('0', '1', '3', '4'), _keys('1', '2', '4', '5')))
+
+    assert [(side, dict(key)['step']) for side, key in joined] == [
+        (LEFT, '0'), (BOTH, '1'), (RIGHT, '2'), (LEFT, '3'), (BOTH, '4'), (RIGHT, '5')
+    ]
+    assert list(merge_join([], _keys('0'))) == [(RIGHT, _keys('0')[0])]
+    assert not list(merge_join([], []))
+
+
+def test_field_key():
+    assert field_key({'step': '0', 'date': '20240601'}) == (('date', '20240601'), ('step', '0'))
+
+
+def test_external_sort():
+    keys = _keys(*(str(step) for step in random.sample(range(100), 100)))
+
+    for run_size in (7, 100, 1000):
+        assert list(external_sort(keys, run_size=run_size, block_size=3)) == sorted(keys)
+    assert not list(external_sort([], run_size=7, block_size=3))
+
+
+def test_list_sorted_into():
+    fields = [{'keys': {'step': str(step), 'date': '20240601'}} for step in (3, 0, 2, 1, 4)]
+    pyfdb = MagicMock()
+    pyfdb.list.return_value = iter(fields)
+    results: queue.Queue = queue.Queue()
+
+    with patch.dict('sys.modules', {'pyfdb': pyfdb}):
+        _list_sorted_into({'date': '20240601'}, results, batch_size=2, run_size=2)
+
+    batches = [results.get_nowait() for _ in range(results.qsize())]
+    assert batches == [_keys('0', '1'), _keys('2', '3'), _keys('4'), None]
+
+
+def test_list_sorted_missing_config(tmp_path):
+    with pytest.raises(RuntimeError, match='does not exist'):
+        list_sorted(tmp_path / 'missing.yaml', {})
+
+
+def _done(result) -> Future:
+    future: Future = Future()
+    future.set_result(result)
+    return future
+
+
+def test_sync_fields_broken_pool():
+    retrievers, archivers = MagicMock(), MagicMock()
+    retrievers.__enter__.return_value, archivers.__enter__.return_value = retrievers, archivers
+    retrievers.submit.side_effect = lambda *_: _done(b'GRIB')
+    # The first batch is archived, then an archive worker dies.
+    archivers.submit.side_effect = [_done(4), BrokenProcessPool("A process in the pool was terminated")]
+    fields = [{'step': str(step)} for step in range(10)]
+
+    with patch("fdb_utils.management.mirror.config_executor", side_effect=[retrievers, archivers]):
+        stats = sync_fields(fields, 'source.yaml', 'target.yaml', workers=1, batch_size=2)
+
+    assert (stats.fields, stats.bytes, stats.failed) == (2, 4, 8)
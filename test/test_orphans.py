@@ -0,0 +1,56 @@
+from fdb_utils.management.orphans import scan_database, scan_root
+from fdb_utils.schema import Schema
+
+SCHEMA = Schema.from_string("[ date, time, number [ levtype [ param, step ]]]")
+
+
+def _database(root, name, files: dict[str, bytes]):
+    database = root / name
+    database.mkdir(parents=True)
+    for file_name, data in files.items():
+        (database / file_name).write_bytes(data)
+    return database
+
+
+def test_scan_database(tmp_path):
+    database = _database(tmp_path, '20240202:0000:1', {
+        'toc': b'\x00+sfc.1.index\x00*sfc.2.data\x00toc.3\x00',
+        'toc.3': b'\x00+sfc.4.index\x00*sfc.5.data\x00',
+        'schema': b'',
+        'sfc.1.index': b'i',
+        'sfc.2.data': b'dd',
+        'sfc.4.index': b'i',
+        'sfc.5.data': b'dd',
+        'sfc.6.data': b'orphan',
+        'toc.7': b'\x00+sfc.8.index\x00',
+        'sfc.8.index': b'iii',
+        'archive.lock': b'',
+        'toc.lock': b'',
+    })
+
+    scan = scan_database(database, SCHEMA)
+    assert scan.key == {'date': '20240202', 'time': '0000', 'number': '1'}
+    # Files only referenced by a sub-TOC which is not referenced itself are orphaned too.
+    assert scan.orphaned == {'sfc.6.data': 6, 'toc.7': 14, 'sfc.8.index': 3}
+    assert scan.locks == ['toc.lock']
+    assert scan.control_locks == ['archive.lock']
+    assert scan.reclaimable == 23
+    assert not scan.clean
+
+
+def test_scan_root(tmp_path):
+    _database(tmp_path, '20240202:0000:1', {'toc': b'*sfc.1.data', 'schema': b'', 'sfc.1.data': b'dd'})
+    _database(tmp_path, '20240202:0000:2', {'schema': b'', 'sfc.1.data': b'dd'})
+    _database(tmp_path, '20240202:0000:3', {'toc': b'', 'schema': b'', 'archive.lock': b'', 'wipe.lock': b''})
+    _database(tmp_path, 'unknown', {'toc': b'', 'x': b'xyz'})
+
+    scans = scan_root(tmp_path, SCHEMA, max_workers=2)
+    assert [(scan.name, scan.clean, scan.reclaimable) for scan in scans] == [
+        ('20240202:0000:1', True, 0),
+        ('20240202:0000:2', False, 2),
+        ('20240202:0000:3', True, 0),
+        ('unknown', False, 3),
+    ]
+    assert str(scans[1]) == "20240202:0000:2: no TOC, 2 bytes reclaimable"
+    assert str(scans[2]) == "20240202:0000:3: locked for archive, wipe"
+    assert str(scans[3]) == "unknown: does not match the schema, 3 bytes reclaimable"
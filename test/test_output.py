@@ -0,0 +1,92 @@
+import io
+import json
+
+import pytest
+
+from fdb_utils.user.output import DistinctValueWriter, EntryWriter, write_listing
+
+ENTRIES = [
+    {'keys': {'date': '20240202', 'number': '1', 'step': '0'}},
+    {'keys': {'date': '20240202', 'number': '1', 'step': '1'}},
+    {'keys': {'date': '20240202', 'number': '10', 'step': '0'}},
+]
+
+
+def test_write_entries_ndjson():
+    stream = io.StringIO()
+    assert write_listing(ENTRIES, stream, 'ndjson', distinct=False) == 3
+    assert [json.loads(line) for line in stream.getvalue().splitlines()] == [el['keys'] for el in ENTRIES]
+
+
+def test_write_entries_json():
+    stream = io.StringIO()
+    write_listing(ENTRIES, stream, 'json', keys=['step'], distinct=False)
+    assert json.loads(stream.getvalue()) == [{'step': '0'}, {'step': '1'}, {'step': '0'}]
+
+    stream = io.StringIO()
+    write_listing([], stream, 'json', distinct=False)
+    assert json.loads(stream.getvalue()) == []
+
+
+def test_write_entries_csv():
+    stream = io.StringIO()
+    write_listing(ENTRIES, stream, 'csv', keys=['number', 'step'], distinct=False)
+    assert stream.getvalue().splitlines() == ['number,step', '1,0', '1,1', '10,0']
+
+
+def test_write_entries_csv_mixed_levtypes():
+    entries = [
+        {'keys': {'levtype': 'sfc', 'param': '167', 'step': '0'}},
+        {'keys': {'levtype': 'ml', 'levelist': '10', 'param': '130', 'step': '0'}},
+        {'keys': {'levtype': 'ml', 'levelist': '2', 'param': '130', 'step': '0'}},
+    ]
+    stream = io.StringIO()
+    write_listing(entries, stream, 'csv', distinct=False)
+    # The levelist column is only found in the later entries.
+    assert stream.getvalue().splitlines() == [
+        'levtype,param,step,levelist', 'sfc,167,0,', 'ml,130,0,10', 'ml,130,0,2'
+    ]
+
+    stream = io.StringIO()
+    write_listing([], stream, 'csv', distinct=False)
+    assert stream.getvalue().splitlines() == ['']
+
+
+def test_write_entries_columnar():
+    stream = io.StringIO()
+    writer = EntryWriter(stream, 'columnar', batch_size=2)
+    for el in ENTRIES:
+        writer.write(el['keys'])
+    # The first batch is written as soon as it is full.
+    assert len(stream.getvalue().splitlines()) == 1
+    writer.close()
+
+    batches = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert batches[0]['step'] == ['0', '1']
+    assert batches[1] == {'date': ['20240202'], 'number': ['10'], 'step': ['0']}
+
+
+def test_write_distinct_values():
+    stream = io.StringIO()
+    writer = DistinctValueWriter(stream, 'ndjson', keys=['number', 'step'])
+    writer.write(ENTRIES[0]['keys'])
+    # Values are written as soon as they are first seen.
+    assert [json.loads(line) for line in stream.getvalue().splitlines()] == [
+        {'key': 'number', 'value': 1}, {'key': 'step', 'value': '0'}
+    ]
+
+    stream = io.StringIO()
+    write_listing(ENTRIES, stream, 'json', keys=['number', 'step'])
+    assert json.loads(stream.getvalue()) == {'number': [1, 10], 'step': ['0', '1']}
+
+    stream = io.StringIO()
+    write_listing(ENTRIES, stream, 'text', keys=['number'])
+    assert stream.getvalue() == 'number: 1, 10\n'
+
+    # Numbers are sorted by value, not as strings.
+    stream = io.StringIO()
+    write_listing([{'keys': {'levelist': v}} for v in ('10', '2', '2.5')], stream, 'text')
+    assert stream.getvalue() == 'levelist: 2, 2.5, 10\n'
+
+    with pytest.raises(ValueError):
+        DistinctValueWriter(stream, 'parquet')
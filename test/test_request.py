@@ -0,0 +1,31 @@
+import pytest
+
+from fdb_utils.user.request import parse_filter, parse_values, request_size
+
+
+def test_parse_values():
+    assert parse_values('number', '1') == '1'
+    assert parse_values('number', '1/2/3') == ['1', '2', '3']
+    assert parse_values('step', '0/to/48/by/12') == ['0', '12', '24', '36', '48']
+    assert parse_values('step', '0/to/2/6') == ['0', '1', '2', '6']
+    assert parse_values('date', '20240630/to/20240702') == ['20240630', '20240701', '20240702']
+    assert parse_values('date', '20240601/to/20240607/by/3') == ['20240601', '20240604', '20240607']
+    assert parse_values('time', '0/to/1200/by/6') == ['0000', '0600', '1200']
+    assert parse_values('time', '0/to/6/by/3') == ['0000', '0300', '0600']
+    assert parse_values('levtype', 'sfc/pl') == ['sfc', 'pl']
+
+    for values in ('0/to', '0//1', 'to/3', '0/to/a', '0/to/6/by/-1'):
+        with pytest.raises(ValueError):
+            parse_values('step', values)
+    with pytest.raises(ValueError):
+        parse_values('date', '20240601/to/20240607/by/0')
+
+
+def test_parse_filter():
+    request = parse_filter('date=20240601/to/20240603,time=0600,number=1/2')
+    assert request == {'date': ['20240601', '20240602', '20240603'], 'time': '0600', 'number': ['1', '2']}
+    assert request_size(request) == 6
+    assert request_size(parse_filter('')) == 1
+
+    with pytest.raises(ValueError):
+        parse_filter('date')
@@ -0,0 +1,82 @@
+import io
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from fdb_utils.user.describe import collect_distinct_values
+from fdb_utils.user.retrieve import retrieve_into, retrieve_split, retrieve_to_file, retrieve_to_stream, split_path
+from test.test_fdb_management import _generate_file_to_upload, _modify_grib_file
+from test.conftest import fdb
+
+
+class FakeReader:
+    def __init__(self, data: bytes, max_read: int = 3) -> None:
+        self.data = data
+        self.pos = 0
+        self.max_read = max_read
+        self.reads: list[int] = []
+
+    def readinto(self, buffer) -> int:
+        size = min(len(buffer), self.max_read, len(self.data) - self.pos)
+        buffer[:size] = self.data[self.pos:self.pos + size]
+        self.pos += size
+        self.reads.append(len(buffer))
+        return size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        pass
+
+
+def test_retrieve_to_stream():
+    reader = FakeReader(b'GRIB0123456789', max_read=100)
+    stream = io.BytesIO()
+    with patch("fdb_utils.user.retrieve.DataReader", return_value=reader):
+        assert retrieve_to_stream({}, stream, chunk_size=4) == 14
+    assert stream.getvalue() == b'GRIB0123456789'
+    # The data is read in chunks of the same buffer.
+    assert reader.reads == [4, 4, 4, 4, 4]
+
+
+def test_retrieve_into():
+    buffer = bytearray(16)
+    with patch("fdb_utils.user.retrieve.DataReader", return_value=FakeReader(b'GRIB0123456789')):
+        assert retrieve_into({}, buffer) == 14
+    assert buffer == b'GRIB0123456789\0\0'
+
+    with patch("fdb_utils.user.retrieve.DataReader", return_value=FakeReader(b'GRIB0123456789')):
+        with pytest.raises(RuntimeError):
+            retrieve_into({}, bytearray(10))
+
+
+def test_split_path():
+    assert split_path(Path('/data/fc.grib'), 'number', '3') == Path('/data/fc_number_3.grib')
+
+
+def test_retrieve(tmp_path, data_dir, fdb):
+
+    file_to_upload_1, _, _ = _generate_file_to_upload(tmp_path, data_dir, random=True)
+    file_to_upload_2, _, _ = _generate_file_to_upload(tmp_path, data_dir, random=True)
+
+    _modify_grib_file(file_to_upload_1, date='20240202', time='300', number=1, step=0)
+    _modify_grib_file(file_to_upload_2, date='20240202', time='300', number=2, step=0)
+
+    for file in (file_to_upload_1, file_to_upload_2):
+        with open(file, "rb") as f:
+            fdb.archive(f.read())
+
+    fdb.flush()
+
+    entries = list(fdb.list({'date': '20240202', 'time': '0300'}, True, True))
+    request = {k: sorted(v) for k, v in collect_distinct_values(entries).items()}
+
+    output = tmp_path / 'fc.grib'
+    assert retrieve_to_file(request, output, chunk_size=1024) == sum(el['length'] for el in entries)
+    assert output.read_bytes().startswith(b'GRIB')
+
+    sizes = retrieve_split(request, output, 'number', workers=2)
+    assert set(sizes) == {tmp_path / 'fc_number_1.grib', tmp_path / 'fc_number_2.grib'}
+    assert sum(sizes.values()) == output.stat().st_size
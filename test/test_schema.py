@@ -0,0 +1,44 @@
+from fdb_utils.schema import Schema, decode_values
+from test.conftest import test_dir
+
+
+def test_schema_from_file(test_dir):
+
+    schema = Schema.from_file(test_dir / 'resource' / 'schema')
+
+    assert schema.key_type('number') == 'Integer'
+    assert schema.key_type('levelist') == 'Double'
+    assert schema.key_type('step') == 'Step'
+    assert schema.database_keys == ['date', 'time', 'stream', 'class', 'expver', 'model', 'type', 'number']
+    assert schema.rules[0].rules[0].names == ['levtype']
+    assert schema.rules[0].rules[0].rules[0].names == ['param', 'step', 'levelist']
+    assert schema.rules[0].rules[0].rules[0].keys[2].optional
+
+
+def test_schema_key_modifiers():
+
+    schema = Schema.from_string("""
+        # comment [ ignored ]
+        date: Date;
+        [ class=od/rd, stream, date:ClimateMonth
+            [ levtype, grid- [ param, domain?g ]]]
+    """)
+
+    database_rule = schema.rules[0]
+    assert database_rule.keys[0].values == ('od', 'rd')
+    assert database_rule.keys[2].type == 'ClimateMonth'
+    assert database_rule.rules[0].keys[1].removed
+    assert database_rule.rules[0].rules[0].keys[1].default == 'g'
+
+    assert schema.parse_database_name('od:enfo:20240202') == {'class': 'od', 'stream': 'enfo', 'date': '20240202'}
+    assert schema.parse_database_name('xx:enfo:20240202') is None
+    assert schema.parse_database_name('od:enfo') is None
+
+
+def test_decode_values():
+
+    assert decode_values('Integer', ['01', '2']) == {1, 2}
+    assert decode_values('Double', ['200', '0.5']) == {200, 0.5}
+    assert all(isinstance(v, int) for v in decode_values('Double', ['200', '850']))
+    assert decode_values('Step', ['0', '4m']) == {'0', '4m'}
+    assert decode_values('', ['sfc']) == {'sfc'}
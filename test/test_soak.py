@@ -0,0 +1,84 @@
+import pytest
+import yaml
+
+from fdb_utils.ci.soak import LatencyHistogram, OperationStats, SoakConfig, find_regressions, main, write_fdb_config
+
+
+def test_latency_histogram():
+    histogram = LatencyHistogram()
+    for seconds in [0.00005, 0.001, 0.001, 0.002, 1000.0]:
+        histogram.record(seconds)
+
+    assert len(histogram) == 5
+    assert histogram.quantile(0.2) == LatencyHistogram.bucket_bound(0)
+    assert histogram.quantile(0.5) == pytest.approx(0.0016)
+    assert histogram.quantile(0.8) == pytest.approx(0.0032)
+    # Latencies beyond the last bucket are counted in it.
+    assert histogram.quantile(1.0) == LatencyHistogram.bucket_bound(len(histogram.counts) - 1)
+    assert LatencyHistogram().quantile(0.5) == 0.0
+
+    other = LatencyHistogram()
+    other.record(0.001)
+    histogram.merge(other)
+    assert len(histogram) == 6
+    assert histogram.mean == pytest.approx(1000.00405 / 6)
+
+
+def test_operation_stats():
+    stats = OperationStats()
+    stats.record(0, 0.01, 100)
+    stats.record(2, 0.01, 100)
+
+    other = OperationStats(errors=1)
+    other.record(0, 0.02, 50)
+    stats.merge(other)
+
+    assert stats.operations == [2, 0, 1]
+    assert stats.bytes == [150, 0, 100]
+    summary = stats.summary(seconds=3.0)
+    assert (summary["operations"], summary["errors"]) == (3, 1)
+    assert summary["ops_per_second"] == 1.0
+    assert summary["bytes_per_second"] == pytest.approx(250 / 3)
+
+
+def _summary(p95: float, ops_per_second: float = 10.0, errors: int = 0) -> dict:
+    return {"p95": p95, "ops_per_second": ops_per_second, "errors": errors}
+
+
+def test_find_regressions():
+    report = {
+        "phases": {
+            "archive": {"archive": _summary(0.1)},
+            "read": {"list": _summary(0.1), "describe": _summary(0.1)},
+            "mixed": {"archive": _summary(0.2), "list": _summary(0.8), "describe": _summary(0.1, errors=2)},
+        }
+    }
+    regressions = find_regressions(report)
+    assert regressions == [
+        "2 describe operations failed in phase mixed",
+        "p95 latency of list is 0.8000s while archiving and reading concurrently, 8 times the 0.1000s in phase read",
+    ]
+
+    baseline = {"phases": {"archive": {"archive": _summary(0.025, ops_per_second=40.0)}}}
+    regressions = find_regressions(report, baseline, max_slowdown=3)
+    assert regressions[2:] == [
+        "p95 latency of archive in phase archive is 0.1000s, up from 0.0250s in the baseline",
+        "Throughput of archive in phase archive is 10.0 ops/s, down from 40.0 ops/s in the baseline",
+    ]
+    assert len(find_regressions(report, baseline, max_slowdown=8)) == 1
+
+
+def test_write_fdb_config(tmp_path):
+    config_file = write_fdb_config(tmp_path / 'fdb-root', tmp_path / 'schema')
+
+    assert (tmp_path / 'fdb-root').is_dir()
+    with open(config_file, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    assert config['engine'] == 'toc'
+    assert config['spaces'][0]['roots'][0]['path'] == str(tmp_path / 'fdb-root')
+
+
+def test_main_refuses_previous_root(tmp_path):
+    (tmp_path / "fdb-root" / "20240101:0000").mkdir(parents=True)
+    with pytest.raises(ValueError, match="is not empty"):
+        main(SoakConfig(tmp_path / "template.grib"), schema=tmp_path / "schema", root=tmp_path)
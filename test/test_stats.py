@@ -0,0 +1,74 @@
+import pytest
+
+from fdb_utils.user.stats import HyperLogLog, collect_stats, parse_pairs
+
+ENTRIES = [
+    {'keys': {'date': '20240202', 'param': '500011', 'step': '0'}},
+    {'keys': {'date': '20240202', 'param': '500011', 'step': '1'}},
+    {'keys': {'date': '20240202', 'param': '500014', 'step': '0'}},
+    {'keys': {'date': '20240202', 'param': '500014', 'step': '0'}},
+]
+
+
+def test_hyperloglog():
+    sketch = HyperLogLog(precision=12)
+    for i in range(50000):
+        sketch.add(str(i % 20000))
+    assert len(sketch) == pytest.approx(20000, rel=0.05)
+
+    small = HyperLogLog(precision=12)
+    for i in range(10):
+        small.add(str(i))
+    assert len(small) == 10
+
+    other = HyperLogLog(precision=12)
+    for i in range(20000, 30000):
+        other.add(str(i))
+    sketch.merge(other)
+    assert len(sketch) == pytest.approx(30000, rel=0.05)
+
+    with pytest.raises(ValueError):
+        sketch.merge(HyperLogLog(precision=10))
+
+
+def test_collect_stats():
+    stats = collect_stats(ENTRIES, ['step'], [('step', 'param')])
+    assert stats.entries == 4
+    assert stats.keys == ['step']
+    assert stats.values['step'] == {'0': 3, '1': 1}
+    assert stats.pairs[('step', 'param')] == {('0', '500011'): 1, ('1', '500011'): 1, ('0', '500014'): 2}
+    assert stats.cardinality(('step', 'param')) == 3
+
+    assert collect_stats(ENTRIES).keys == ['date', 'param', 'step']
+
+
+def test_collect_stats_approximate():
+    stats = collect_stats(ENTRIES, ['step', 'param'], [('step', 'param')], approximate=True)
+    assert stats.entries == 4
+    assert not stats.values
+    assert stats.cardinality('step') == 2
+    assert stats.cardinality('param') == 2
+    assert stats.cardinality(('step', 'param')) == 3
+    assert len(stats.fields) == 3
+
+
+def test_parse_pairs():
+    assert parse_pairs(['step:param', 'number:step']) == [('step', 'param'), ('number', 'step')]
+    with pytest.raises(ValueError):
+        parse_pairs(['step'])
+
+
+def test_merge_stats():
+    stats = collect_stats(ENTRIES[:2], ['step'], [('step', 'param')])
+    stats.merge(collect_stats(ENTRIES[2:], ['step'], [('step', 'param')]))
+    assert stats.entries == 4
+    assert stats.values['step'] == {'0': 3, '1': 1}
+    assert stats.cardinality(('step', 'param')) == 3
+
+    stats = collect_stats(ENTRIES[:2], ['step'], approximate=True)
+    stats.merge(collect_stats(ENTRIES[2:], ['step'], approximate=True))
+    assert stats.cardinality('step') == 2
+    assert len(stats.fields) == 3
+
+    with pytest.raises(ValueError):
+        stats.merge(collect_stats(ENTRIES))
@@ -0,0 +1,76 @@
+from unittest.mock import patch
+
+from fdb_utils.grib_utils import grib_message_bounds
+from fdb_utils.management.verify import check_data_file, verify_database, verify_databases
+from test.conftest import data_dir
+
+
+def _database(tmp_path, data: bytes):
+    database = tmp_path / '20240202:0000:1'
+    database.mkdir()
+    (database / 'toc').write_bytes(b'')
+    data_file = database / 'sfc.data'
+    data_file.write_bytes(data)
+    return database, data_file
+
+
+def test_check_data_file(tmp_path, data_dir):
+    data = (data_dir / "test.grib").read_bytes()
+    bounds = list(grib_message_bounds(data))
+    _, data_file = _database(tmp_path, data + data[:-1])
+
+    messages, size, error = check_data_file(data_file)
+    assert len(messages) == 2 * len(bounds) - 1
+    length = bounds[-1][1] - bounds[-1][0]
+    assert size == 2 * len(data) - length
+    assert error == f"GRIB message at offset {len(data) + bounds[-1][0]} is truncated, {length} bytes expected"
+
+
+def test_check_data_file_holes(tmp_path, data_dir):
+    data = (data_dir / "test.grib").read_bytes()
+    bounds = list(grib_message_bounds(data))
+    _, data_file = _database(tmp_path, data + bytes(4096) + data)
+
+    # The messages after the hole are still found, so that the index entries pointing to them are checked.
+    messages, size, error = check_data_file(data_file)
+    assert len(messages) == 2 * len(bounds)
+    assert size == 2 * len(data)
+    assert error == f"4096 bytes at offset {len(data)} are not part of a GRIB message"
+
+    data_file.write_bytes(bytes(4096) + data)
+    assert check_data_file(data_file)[2] == "4096 bytes at offset 0 are not part of a GRIB message"
+
+    data_file.write_bytes(data + bytes(100))
+    assert check_data_file(data_file)[2] == f"100 bytes at offset {len(data)} are not part of a GRIB message"
+
+
+def test_verify_database(tmp_path, data_dir):
+    data = (data_dir / "test.grib").read_bytes()
+    (start, end), *_ = grib_message_bounds(data)
+    database, data_file = _database(tmp_path, data)
+
+    report = verify_database(database)
+    assert report.ok
+    assert (report.files, report.bytes, report.entries) == (1, len(data), 0)
+
+    entries = [
+        {'path': str(data_file), 'offset': start, 'length': end - start, 'keys': {'step': '0'}},
+        {'path': str(data_file), 'offset': start + 1, 'length': end - start, 'keys': {'step': '1'}},
+        {'path': str(database / 'missing.data'), 'offset': 0, 'length': 1, 'keys': {'step': '2'}},
+    ]
+    with patch("pyfdb.list", return_value=iter(entries)):
+        report = verify_database(database, {'date': '20240202'})
+
+    assert report.entries == 3
+    assert report.errors == [
+        f"Index entry {{'step': '1'}} points to sfc.data at offset {start + 1}, which is not a complete GRIB message "
+        f"of {end - start} bytes",
+        "Index entry {'step': '2'} points to the missing data file missing.data at offset 0",
+    ]
+    assert str(report).startswith("FAILED 20240202:0000:1")
+
+
+def test_verify_databases(tmp_path):
+    reports = verify_databases([(tmp_path / 'missing', None)], workers=1)
+    assert not reports[0].ok
+    assert reports[0].errors[0].startswith("Failed to check the database")